@@ -3,10 +3,32 @@ Action Parser for FFT LLM Agent.
 Converts LLM text responses to game inputs.
 """
 import re
+import time
 from dataclasses import dataclass
 from typing import Optional, List, Tuple
 
 
+# Precompiled response patterns (parse_llm_response runs once per LLM reply)
+# One pass over the response finds every "KEY:" label; its value (captured in
+# a lookahead, so labels later on the line are still found) runs to the end
+# of the line, as with a separate search per key
+_FIELD_RE = re.compile(r'\b(ACTION|TARGET|REASON):(?=\s*([^\n]*))', re.IGNORECASE)
+_WORD_RE = re.compile(r'\w+')
+_COORD_RE = re.compile(r'\(?(\d+)\s*,\s*(\d+)\)?')
+_DIRECTION_RE = re.compile(r'left|right|up|down|\d+')
+# A streamed reply is actionable once TARGET is finished or REASON has begun
+_ACTION_LINE_RE = re.compile(r'ACTION:[^\n]*\w', re.IGNORECASE)
+_ACTION_READY_RE = re.compile(r'TARGET:[^\n]*\n|REASON:', re.IGNORECASE)
+
+# Relative direction -> (dx, dy) cursor delta
+_DIR_DELTA = {
+    "left": (-1, 0),
+    "right": (1, 0),
+    "up": (0, -1),
+    "down": (0, 1),
+}
+
+
 @dataclass
 class ParsedAction:
     """Parsed action from LLM response."""
@@ -16,6 +38,23 @@ class ParsedAction:
     reason: Optional[str] = None
 
 
+def _parse_coords(target: str) -> Optional[Tuple[int, int]]:
+    """Parse "5,3" / "(5, 3)" targets, falling back to a regex search."""
+    # Fast path: well-formed numeric targets skip the regex engine
+    if target[:1].isdigit() or target.startswith('('):
+        parts = target.strip('()').split(',')
+        if len(parts) == 2:
+            x, y = parts[0].strip(), parts[1].strip()
+            # Digits only: int() would also take the "-3" / "1_0" the regex rejects
+            if x.isdecimal() and y.isdecimal():
+                return (int(x), int(y))
+    
+    coord_match = _COORD_RE.search(target)
+    if coord_match:
+        return (int(coord_match.group(1)), int(coord_match.group(2)))
+    return None
+
+
 def parse_llm_response(response: str) -> ParsedAction:
     """
     Parse LLM response in format:
@@ -28,32 +67,45 @@ def parse_llm_response(response: str) -> ParsedAction:
     target_coords = None
     reason = None
     
+    # Collect fields in a single scan (first occurrence of each key wins)
+    fields = {}
+    for m in _FIELD_RE.finditer(response):
+        key = m.group(1).upper()
+        if key not in fields:
+            value = m.group(2).strip()
+            # ACTION must start with a word, or a later ACTION: is used
+            if value and (key != "ACTION" or _WORD_RE.match(value)):
+                fields[key] = value
+    
     # Extract ACTION
-    action_match = re.search(r'ACTION:\s*(\w+)', response, re.IGNORECASE)
+    action_match = _WORD_RE.match(fields.get("ACTION", ""))
     if action_match:
-        action = action_match.group(1).lower()
+        action = action_match.group(0).lower()
     
     # Extract TARGET (can be coords or name)
-    target_match = re.search(r'TARGET:\s*(.+?)(?:\n|$)', response, re.IGNORECASE)
-    if target_match:
-        target = target_match.group(1).strip().lower()
+    if "TARGET" in fields:
+        target = fields["TARGET"].lower()
         
         # Try to parse as coordinates
-        coord_match = re.search(r'\(?(\d+)\s*,\s*(\d+)\)?', target)
-        if coord_match:
-            target_coords = (int(coord_match.group(1)), int(coord_match.group(2)))
-        else:
+        target_coords = _parse_coords(target)
+        if target_coords is None:
             # Try to parse relative directions: "right 2", "up", etc.
+            # Single pass: each direction counts once, first number is the amount
             dx, dy = 0, 0
-            if "left" in target: dx -= 1
-            if "right" in target: dx += 1
-            if "up" in target: dy -= 1
-            if "down" in target: dy += 1
+            mult = None
+            seen = set()
+            for tok in _DIRECTION_RE.findall(target):
+                delta = _DIR_DELTA.get(tok)
+                if delta is None:
+                    if mult is None:
+                        mult = int(tok)
+                elif tok not in seen:
+                    seen.add(tok)
+                    dx += delta[0]
+                    dy += delta[1]
             
-            # Check for amount (e.g. "right 2")
-            amount_match = re.search(r'(\d+)', target)
-            if amount_match:
-                mult = int(amount_match.group(1))
+            # Apply amount (e.g. "right 2")
+            if mult is not None:
                 dx *= mult
                 dy *= mult
             
@@ -65,9 +117,7 @@ def parse_llm_response(response: str) -> ParsedAction:
                 # For now, we'll handle this in action_to_inputs by checking current_pos
     
     # Extract REASON
-    reason_match = re.search(r'REASON:\s*(.+?)(?:\n|$)', response, re.IGNORECASE)
-    if reason_match:
-        reason = reason_match.group(1).strip()
+    reason = fields.get("REASON")
     
     return ParsedAction(
         action=action or "wait",
@@ -77,6 +127,12 @@ def parse_llm_response(response: str) -> ParsedAction:
     )
 
 
+def action_fields_complete(partial: str) -> bool:
+    """True once a (possibly still streaming) response has its ACTION and TARGET."""
+    action = _ACTION_LINE_RE.search(partial)
+    return action is not None and _ACTION_READY_RE.search(partial, action.end()) is not None
+
+
 def action_to_inputs(parsed: ParsedAction, current_pos: Tuple[int, int]) -> List[str]:
     """
     Convert parsed action to sequence of button inputs.
@@ -139,12 +195,30 @@ class InputExecutor:
         "act_menu": ["Attack", "Abilities", "Item"],
     }
     
+    # Lowercased battle command -> position in the menu (top = 0)
+    _MENU_INDEX = {name.lower(): i for i, name in enumerate(KNOWN_MENUS["battle_command"])}
+    
     def __init__(self, controller, ocr_engine=None, capture_engine=None):
         self.controller = controller
         self.ocr = ocr_engine
         self.capture = capture_engine
         self.feedback_learner = None  # Set by FFTAgent if learning enabled
         self._current_game_phase = "unknown"
+        
+        # Button name -> controller press function
+        # start/select are looked up lazily: not every controller implements them
+        self._button_dispatch = {
+            "a": controller.press_a,
+            "b": controller.press_b,
+            "x": controller.press_x,
+            "y": controller.press_y,
+            "up": lambda: controller.press_dpad('up'),
+            "down": lambda: controller.press_dpad('down'),
+            "left": lambda: controller.press_dpad('left'),
+            "right": lambda: controller.press_dpad('right'),
+            "start": lambda: controller.press_start(),
+            "select": lambda: controller.press_select(),
+        }
     
     def set_game_phase(self, phase: str):
         """Set current game phase for learning context."""
@@ -162,82 +236,67 @@ class InputExecutor:
         for inp in inputs:
             print(f"[Input] Executing: {inp}")
             
-            # Capture BEFORE state if learning enabled and this is a press command
-            should_learn = self.feedback_learner and inp.startswith("press:")
-            if should_learn:
-                self.feedback_learner.capture_before(self._current_game_phase)
-            
-            if inp.startswith("press:"):
-                button = inp.split(":")[1]
-                if button == "a":
-                    self.controller.press_a()
-                elif button == "b":
-                    self.controller.press_b()
-                elif button == "x":
-                    self.controller.press_x()
-                elif button == "y":
-                    self.controller.press_y()
-                elif button == "up":
-                    self.controller.press_dpad('up')
-                elif button == "down":
-                    self.controller.press_dpad('down')
-                elif button == "left":
-                    self.controller.press_dpad('left')
-                elif button == "right":
-                    self.controller.press_dpad('right')
-                elif button == "start":
-                    self.controller.press_start()
-                elif button == "select":
-                    self.controller.press_select()
-                
-                # Capture AFTER state and learn
-                if should_learn:
-                    import time
-                    time.sleep(0.3)  # Wait for visual update
-                    self.feedback_learner.capture_after_and_learn(button)
-                    
-            elif inp.startswith("move_cursor:"):
-                coords = inp.split(":")[1]
-                dx, dy = map(int, coords.split(","))
-                self.controller.move_cursor(dx, dy)
-                
-            elif inp.startswith("select:"):
-                # Hybrid Menu Navigation
-                # 1. Try to find target in known menus
-                target = inp.split(":")[1].lower()
-                menu_order = [x.lower() for x in self.KNOWN_MENUS["battle_command"]]
-                
-                if target in menu_order:
-                    # Robust navigation: Reset to top, then move down
-                    target_idx = menu_order.index(target)
-                    print(f"  [Menu] Navigating to '{target}' (Index {target_idx})")
-                    
-                    # Reset to top (Press Up 4 times)
-                    for _ in range(4):
-                        self.controller.press_dpad('up')
-                        import time
-                        time.sleep(0.15)
-                    
-                    # Move down to target
-                    for _ in range(target_idx):
-                        self.controller.press_dpad('down')
-                        import time
-                        time.sleep(0.2)
-                        
-                    # Confirm
-                    self.controller.press_a()
-                else:
-                    print(f"  [Menu] Unknown target '{target}', assuming current selection")
-                    self.controller.press_a()
-            
-            elif inp.startswith("wait:"):
-                duration = float(inp.split(":")[1])
-                import time
-                time.sleep(duration)
+            # Dispatch on the command prefix ("press", "move_cursor", ...)
+            kind, _, arg = inp.partition(":")
+            handler = self._HANDLERS.get(kind)
+            if handler:
+                handler(self, arg)
             
             # Small delay between inputs
-            import time
             time.sleep(0.3)
+    
+    def _do_press(self, button: str):
+        """Press a single button, capturing before/after frames if learning."""
+        # Capture BEFORE state if learning enabled
+        should_learn = self.feedback_learner is not None
+        if should_learn:
+            self.feedback_learner.capture_before(self._current_game_phase)
+        
+        press = self._button_dispatch.get(button)
+        if press:
+            press()
+        
+        # Capture AFTER state and learn
+        if should_learn:
+            self.controller.wait_for_inputs()  # Presses are scheduled, not blocking
+            time.sleep(0.3)  # Wait for visual update
+            self.feedback_learner.capture_after_and_learn(button)
+    
+    def _do_move_cursor(self, coords: str):
+        """Move the cursor by a relative "dx,dy" delta."""
+        dx, dy = map(int, coords.split(","))
+        self.controller.move_cursor(dx, dy)
+    
+    def _do_select(self, target: str):
+        """Hybrid menu navigation to a named battle command."""
+        # 1. Try to find target in known menus
+        target = target.lower()
+        target_idx = self._MENU_INDEX.get(target)
+        
+        if target_idx is not None:
+            # Robust navigation: Reset to top, then move down
+            print(f"  [Menu] Navigating to '{target}' (Index {target_idx})")
+            
+            # Reset to top (Up 4 times), move down to target, confirm: queued
+            # as one sequence, so the presses stay evenly spaced
+            self.controller.press_sequence(['up'] * 4 + ['down'] * target_idx + ['a'])
+        else:
+            print(f"  [Menu] Unknown target '{target}', assuming current selection")
+            self.controller.press_a()
+    
+    def _do_wait(self, duration: str):
+        """Sleep for the given number of seconds after the queued presses have played."""
+        # Presses are scheduled, not blocking: time the wait from the last one
+        self.controller.wait_for_inputs()
+        time.sleep(float(duration))
+    
+    # Command prefix -> handler
+    _HANDLERS = {
+        "press": _do_press,
+        "move_cursor": _do_move_cursor,
+        "select": _do_select,
+        "wait": _do_wait,
+    }
 
 
 
@@ -5,18 +5,22 @@ Implements DSU protocol (Cemuhook v1001) to send controller inputs to Eden emula
 Based on: https://cemuhook.sshnuke.net/padudpserver.html
 Protocol: DSUS/DSUC (DS4 USB Server/Client)
 """
+import heapq
+import itertools
+import selectors
 import socket
 import struct
 import time
 import threading
 import zlib
 from dataclasses import dataclass, field
-from typing import Optional
+from typing import List, Optional
 
 
 # Protocol constants
 SERVER_MAGIC = 0x53555344  # "DSUS"
 CLIENT_MAGIC = 0x43555344  # "DSUC"
+CLIENT_MAGIC_BYTES = CLIENT_MAGIC.to_bytes(4, 'little')
 PROTOCOL_VERSION = 1001
 
 # Message types
@@ -24,6 +28,24 @@ TYPE_VERSION = 0x00100000
 TYPE_PORTINFO = 0x00100001
 TYPE_PADDATA = 0x00100002
 
+# CRC field offset within every message header
+CRC_OFFSET = 8
+
+# PadData field offsets within the full 100-byte message (20 header + 80 payload)
+PAD_STATE_OFFSET = 32       # packet_counter, buttons, home, touch, sticks (12 bytes)
+PAD_TIMESTAMP_OFFSET = 68   # motion_timestamp (8 bytes)
+
+# Interval between unsolicited PadData updates (~60 Hz)
+UPDATE_INTERVAL = 0.016
+
+# Precompiled struct layouts (avoids re-parsing format strings per packet)
+_HEADER_S = struct.Struct('<IHHIII')       # magic, version, length, crc, id, type
+_PORT_INFO_S = struct.Struct('<BBBB6sBB')  # id, state, model, connection, mac, battery, active
+_PAD_STATE_S = struct.Struct('<IHBBBBBB')  # counter, buttons, home, touch, lx, ly, rx, ry
+_TIMESTAMP_S = struct.Struct('<Q')
+_CRC_S = struct.Struct('<I')
+_VERSION_S = struct.Struct('<H')
+
 
 @dataclass
 class ControllerState:
@@ -76,28 +98,71 @@ class CemuhookServer:
     SWITCH_DPAD_LEFT = BUTTON_LEFT
     SWITCH_DPAD_RIGHT = BUTTON_RIGHT
     
+    DPAD_BUTTONS = {
+        'up': SWITCH_DPAD_UP,
+        'down': SWITCH_DPAD_DOWN,
+        'left': SWITCH_DPAD_LEFT,
+        'right': SWITCH_DPAD_RIGHT,
+    }
+    
+    # Button names accepted by press_sequence()
+    BUTTON_NAMES = {
+        'a': SWITCH_A,
+        'b': SWITCH_B,
+        'x': SWITCH_X,
+        'y': SWITCH_Y,
+        'plus': SWITCH_PLUS,
+        'minus': SWITCH_MINUS,
+        **DPAD_BUTTONS,
+    }
+    
+    # Cursor taps only need to span a few frames, unlike menu presses
+    CURSOR_TAP_DURATION = 0.08
+    # Released time between consecutive presses so each registers separately
+    PRESS_GAP = 0.05
+    
     def __init__(self, host: str = "127.0.0.1", port: int = 26760):
         self.host = host
         self.port = port
         self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
         self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
         self.sock.bind((host, port))
-        self.sock.setblocking(False)
+        
+        # Wait for requests in the kernel instead of polling a non-blocking socket
+        self._selector = selectors.DefaultSelector()
+        self._selector.register(self.sock, selectors.EVENT_READ)
         
         self.state = ControllerState()
         self.client_addr: Optional[tuple] = None
         self.running = False
         self._thread: Optional[threading.Thread] = None
         self.server_id = 0x12345678
+        
+        # Static PadData message; only counter/buttons/sticks/timestamp/CRC are patched per tick
+        self._pad_msg = self._build_pad_template()
+        # Everything before the pad state is constant (CRC field is 0 in the template),
+        # so its CRC is computed once and each tick only checksums the tail
+        self._pad_crc_prefix = self._compute_crc32(memoryview(self._pad_msg)[:PAD_STATE_OFFSET])
+        self._pad_tail = memoryview(self._pad_msg)[PAD_STATE_OFFSET:]
+        
+        # Scheduled (time, seq, button, pressed) events, applied by the server loop
+        self._input_events: list = []
+        self._input_seq = itertools.count()
+        self._input_lock = threading.Lock()
+        self._inputs_free_at = 0.0    # When the next press may start
+        self._inputs_done_at = 0.0    # When the last scheduled press is released
     
-    def _compute_crc32(self, data: bytes) -> int:
-        """Compute CRC32 checksum."""
-        return zlib.crc32(data) & 0xFFFFFFFF
+    def _compute_crc32(self, data, value: int = 0) -> int:
+        """
+        Compute CRC32 checksum of any bytes-like object (no copy needed).
+        Pass the CRC of preceding bytes as `value` to continue a running checksum.
+        """
+        return zlib.crc32(data, value) & 0xFFFFFFFF
     
     def _build_header(self, msg_type: int, payload_len: int) -> bytes:
         """Build 20-byte DSU header."""
         # Header: magic(4) + version(2) + length(2) + crc(4) + id(4) + type(4)
-        header = struct.pack('<IHHIII',
+        header = _HEADER_S.pack(
             SERVER_MAGIC,      # 4 bytes
             PROTOCOL_VERSION,  # 2 bytes
             payload_len,       # 2 bytes (length of payload, not including header magic/version/length/crc)
@@ -110,7 +175,7 @@ class CemuhookServer:
     def _build_port_info(self) -> bytes:
         """Build PortInfo response (12 bytes)."""
         # PortInfo: id(1) + state(1) + model(1) + connection(1) + mac(6) + battery(1) + active(1)
-        return struct.pack('<BBBB6sBB',
+        return _PORT_INFO_S.pack(
             0,              # Pad ID
             2,              # State: Connected (2)
             3,              # Model: Generic (3)
@@ -120,10 +185,8 @@ class CemuhookServer:
             1,              # Is active
         )
     
-    def _build_pad_data(self) -> bytes:
-        """Build complete PadData message (100 bytes total: 20 header + 80 payload)."""
-        self.state.packet_counter += 1
-        
+    def _build_pad_template(self) -> bytearray:
+        """Build the 100-byte PadData message with all static fields in place."""
         # PortInfo (12 bytes)
         port_info = self._build_port_info()
         
@@ -131,51 +194,50 @@ class CemuhookServer:
         # packet_counter (4) + digital_button (2) + home (1) + touch_hard_press (1) + 
         # sticks (4) + analog_buttons (12) + touch (12) + timestamp (8) + accel (12) + gyro (12)
         # = 4 + 2 + 1 + 1 + 4 + 12 + 12 + 8 + 12 + 12 = 68 bytes (+ 12 port_info = 80 total)
+        # Analog buttons, touch pads and motion are always zero (0.0f is all-zero bytes)
+        payload = port_info + b'\x00' * 68
+        assert len(payload) == 80, f"Payload should be 80 bytes, got {len(payload)}"
         
-        pad_data = struct.pack('<I',  # packet_counter
+        # Build header - payload_length must be sizeof(payload) + sizeof(Type) per DSU spec
+        header = self._build_header(TYPE_PADDATA, len(payload) + 4)
+        return bytearray(header + payload)
+    
+    def _build_pad_data(self) -> memoryview:
+        """
+        Build complete PadData message (100 bytes total: 20 header + 80 payload).
+        Returns a view of the shared message buffer, valid until the next call.
+        """
+        self.state.packet_counter += 1
+        message = self._pad_msg
+        
+        # packet_counter, digital_button, home, touch_hard_press, sticks
+        _PAD_STATE_S.pack_into(message, PAD_STATE_OFFSET,
             self.state.packet_counter,
-        )
-        pad_data += struct.pack('<H',  # digital_button
             self.state.buttons,
-        )
-        pad_data += struct.pack('<BB',  # home, touch_hard_press
             0, 0,
-        )
-        pad_data += struct.pack('<BBBB',  # sticks
             self.state.left_stick_x,
             self.state.left_stick_y,
             self.state.right_stick_x,
             self.state.right_stick_y,
         )
-        pad_data += b'\x00' * 12  # analog_buttons (12 bytes)
-        pad_data += b'\x00' * 12  # touch pads (2 * 6 bytes)
-        pad_data += struct.pack('<Q', int(time.time() * 1000000))  # motion_timestamp (8 bytes)
-        pad_data += struct.pack('<fff', 0.0, 0.0, 0.0)  # accelerometer (12 bytes)
-        pad_data += struct.pack('<fff', 0.0, 0.0, 0.0)  # gyroscope (12 bytes)
-        
-        # Full payload = port_info + pad_data
-        payload = port_info + pad_data
-        assert len(payload) == 80, f"Payload should be 80 bytes, got {len(payload)}"
-        
-        # Build header - payload_length must be sizeof(payload) + sizeof(Type) per DSU spec
-        header = self._build_header(TYPE_PADDATA, len(payload) + 4)
+        # motion_timestamp in microseconds; clients only use deltas, so a monotonic clock is fine
+        _TIMESTAMP_S.pack_into(message, PAD_TIMESTAMP_OFFSET, time.monotonic_ns() // 1000)
         
-        # Combine and compute CRC
-        message = bytearray(header + payload)
+        # CRC is computed over entire message with CRC field set to 0,
+        # continuing from the precomputed CRC of the static prefix
+        crc = self._compute_crc32(self._pad_tail, self._pad_crc_prefix)
+        _CRC_S.pack_into(message, CRC_OFFSET, crc)
         
-        # CRC is computed over entire message with CRC field set to 0
-        crc = self._compute_crc32(bytes(message))
-        struct.pack_into('<I', message, 8, crc)  # CRC is at offset 8
-        
-        return bytes(message)
+        # sendto() accepts any buffer, so hand out a view instead of copying
+        return memoryview(message)
     
     def _build_version_response(self) -> bytes:
         """Build Version response."""
-        payload = struct.pack('<H', PROTOCOL_VERSION)
+        payload = _VERSION_S.pack(PROTOCOL_VERSION)
         header = self._build_header(TYPE_VERSION, len(payload) + 4)
         message = bytearray(header + payload)
-        crc = self._compute_crc32(bytes(message))
-        struct.pack_into('<I', message, 8, crc)
+        crc = self._compute_crc32(message)
+        _CRC_S.pack_into(message, CRC_OFFSET, crc)
         return bytes(message)
     
     def _build_portinfo_response(self) -> bytes:
@@ -183,48 +245,64 @@ class CemuhookServer:
         payload = self._build_port_info()
         header = self._build_header(TYPE_PORTINFO, len(payload) + 4)
         message = bytearray(header + payload)
-        crc = self._compute_crc32(bytes(message))
-        struct.pack_into('<I', message, 8, crc)
+        crc = self._compute_crc32(message)
+        _CRC_S.pack_into(message, CRC_OFFSET, crc)
         return bytes(message)
     
     def _parse_request(self, data: bytes) -> Optional[int]:
         """Parse incoming request and return message type."""
-        if len(data) < 20:
+        # Only magic (bytes 0-4) and message type (bytes 16-20) matter here
+        if len(data) < 20 or data[:4] != CLIENT_MAGIC_BYTES:
             return None
-        magic, version, length, crc, client_id, msg_type = struct.unpack('<IHHIII', data[:20])
-        if magic != CLIENT_MAGIC:
-            return None
-        return msg_type
+        return int.from_bytes(data[16:20], 'little')
     
     def _handle_requests(self):
-        """Handle incoming requests from emulator."""
-        try:
-            data, addr = self.sock.recvfrom(100)
-            self.client_addr = addr
-            
-            msg_type = self._parse_request(data)
-            if msg_type == TYPE_VERSION:
-                print(f"[Cemuhook] Handshake: Version request from {addr}")
-                self.sock.sendto(self._build_version_response(), addr)
-            elif msg_type == TYPE_PORTINFO:
-                print(f"[Cemuhook] Handshake: PortInfo request from {addr}")
-                self.sock.sendto(self._build_portinfo_response(), addr)
-            elif msg_type == TYPE_PADDATA:
-                self.sock.sendto(self._build_pad_data(), addr)
-        except BlockingIOError:
-            pass
+        """Handle a pending request from emulator (socket must be readable)."""
+        data, addr = self.sock.recvfrom(100)
+        self.client_addr = addr
+        
+        msg_type = self._parse_request(data)
+        if msg_type == TYPE_VERSION:
+            print(f"[Cemuhook] Handshake: Version request from {addr}")
+            self.sock.sendto(self._build_version_response(), addr)
+        elif msg_type == TYPE_PORTINFO:
+            print(f"[Cemuhook] Handshake: PortInfo request from {addr}")
+            self.sock.sendto(self._build_portinfo_response(), addr)
+        elif msg_type == TYPE_PADDATA:
+            self.sock.sendto(self._build_pad_data(), addr)
     
     def _loop(self):
         """Main server loop."""
+        next_update = time.monotonic()
         while self.running:
-            self._handle_requests()
+            # Block until a request arrives or the next periodic update is due
+            timeout = max(0.0, next_update - time.monotonic())
+            if self._selector.select(timeout=timeout):
+                self._handle_requests()
+            
+            # Apply scheduled button presses/releases
+            now = time.monotonic()
+            self._apply_input_events(now)
+            
             # Send periodic updates
-            if self.client_addr:
-                try:
-                    self.sock.sendto(self._build_pad_data(), self.client_addr)
-                except Exception:
-                    pass
-            time.sleep(0.016)  # ~60 Hz
+            if now >= next_update:
+                if self.client_addr:
+                    try:
+                        self.sock.sendto(self._build_pad_data(), self.client_addr)
+                    except Exception:
+                        pass
+                next_update = now + UPDATE_INTERVAL
+    
+    def _apply_input_events(self, now: float):
+        """Set/clear button bits for every scheduled event that is due."""
+        with self._input_lock:
+            events = self._input_events
+            while events and events[0][0] <= now:
+                _, _, button, pressed = heapq.heappop(events)
+                if pressed:
+                    self.state.buttons |= button
+                else:
+                    self.state.buttons &= ~button
     
     def start(self):
         """Start server in background thread."""
@@ -238,14 +316,50 @@ class CemuhookServer:
         self.running = False
         if self._thread:
             self._thread.join(timeout=1.0)
+        self._selector.close()
         self.sock.close()
     
     # High-level input methods
     def press_button(self, button: int, duration: float = 0.25):
-        """Press a button for specified duration."""
-        self.state.buttons |= button
-        time.sleep(duration)
-        self.state.buttons &= ~button
+        """
+        Schedule a button press for specified duration and return immediately.
+        Presses are queued back to back, so consecutive calls keep their order.
+        """
+        with self._input_lock:
+            start = max(time.monotonic(), self._inputs_free_at)
+            release = start + duration
+            heapq.heappush(self._input_events, (start, next(self._input_seq), button, True))
+            heapq.heappush(self._input_events, (release, next(self._input_seq), button, False))
+            self._inputs_free_at = release + self.PRESS_GAP
+            self._inputs_done_at = release
+    
+    def press_sequence(self, buttons: List[str], interval: float = 0.3, duration: float = 0.25):
+        """
+        Schedule a whole sequence of named presses (e.g. ['a', 'a', 'down'])
+        in one go, starting `interval` seconds apart, and return immediately.
+        The server loop plays them from the schedule; use wait_for_inputs()
+        to block until the last one is released.
+        """
+        # Each press must be released (for PRESS_GAP) before the next one starts
+        interval = max(interval, duration + self.PRESS_GAP)
+        with self._input_lock:
+            start = max(time.monotonic(), self._inputs_free_at)
+            for name in buttons:
+                button = self.BUTTON_NAMES.get(name)
+                if not button:
+                    continue
+                release = start + duration
+                heapq.heappush(self._input_events, (start, next(self._input_seq), button, True))
+                heapq.heappush(self._input_events, (release, next(self._input_seq), button, False))
+                self._inputs_done_at = release
+                start += interval
+            self._inputs_free_at = max(self._inputs_free_at, self._inputs_done_at + self.PRESS_GAP)
+    
+    def wait_for_inputs(self):
+        """Block until every scheduled press has been released and sent."""
+        remaining = self._inputs_done_at - time.monotonic()
+        if remaining > 0:
+            time.sleep(remaining + UPDATE_INTERVAL)
     
     def press_a(self):
         self.press_button(self.SWITCH_A)
@@ -261,23 +375,22 @@ class CemuhookServer:
     
     def press_dpad(self, direction: str):
         """Press d-pad: 'up', 'down', 'left', 'right'."""
-        mapping = {
-            'up': self.SWITCH_DPAD_UP,
-            'down': self.SWITCH_DPAD_DOWN,
-            'left': self.SWITCH_DPAD_LEFT,
-            'right': self.SWITCH_DPAD_RIGHT,
-        }
-        if direction in mapping:
-            self.press_button(mapping[direction])
+        button = self.DPAD_BUTTONS.get(direction)
+        if button:
+            self.press_button(button)
+    
+    def tap_dpad(self, direction: str, count: int = 1):
+        """Tap a d-pad direction `count` times using short cursor taps."""
+        button = self.DPAD_BUTTONS.get(direction)
+        if not button:
+            return
+        for _ in range(count):
+            self.press_button(button, self.CURSOR_TAP_DURATION)
     
     def move_cursor(self, dx: int, dy: int):
         """Move cursor by delta. Positive = right/down."""
-        for _ in range(abs(dx)):
-            self.press_dpad('right' if dx > 0 else 'left')
-            time.sleep(0.05)
-        for _ in range(abs(dy)):
-            self.press_dpad('down' if dy > 0 else 'up')
-            time.sleep(0.05)
+        self.tap_dpad('right' if dx > 0 else 'left', abs(dx))
+        self.tap_dpad('down' if dy > 0 else 'up', abs(dy))
 
 
 if __name__ == "__main__":
@@ -3,9 +3,11 @@ Visual Feedback Learner for FFT Agent.
 Captures before/after screenshots of button presses and uses LLM to analyze effects.
 """
 import os
+import re
 import time
+from collections import OrderedDict
 from typing import Optional, Tuple
-from dataclasses import dataclass
+from dataclasses import dataclass, replace
 import base64
 import io
 
@@ -16,7 +18,38 @@ try:
 except ImportError:
     HAS_PIL = False
 
-from knowledge_store import KnowledgeStore, ActionLearning
+try:
+    import cv2
+    HAS_CV2 = True
+except ImportError:
+    HAS_CV2 = False
+
+try:
+    from numba import njit, prange
+    HAS_NUMBA = True
+except ImportError:
+    HAS_NUMBA = False
+
+from knowledge_store import KnowledgeStore, ActionLearning, HAS_CHROMADB
+
+
+# "CONTEXT: ...", "EFFECT: ...", "LEARNING: ..." lines in the LLM analysis
+_RESPONSE_FIELD_RE = re.compile(r'^[^\S\n]*(CONTEXT|EFFECT|LEARNING):[^\S\n]*(.*?)[^\S\n]*$', re.MULTILINE | re.IGNORECASE)
+
+
+if HAS_NUMBA:
+    @njit(cache=True, parallel=True)
+    def _count_changed(a, b, level):
+        """Pixels of two (h, w, c) uint8 frames where any channel differs by more than `level`."""
+        flat_a = a.reshape(-1, a.shape[-1])
+        flat_b = b.reshape(-1, b.shape[-1])
+        total = 0
+        for i in prange(flat_a.shape[0]):
+            for c in range(flat_a.shape[1]):
+                if abs(np.int32(flat_a[i, c]) - np.int32(flat_b[i, c])) > level:
+                    total += 1
+                    break
+        return total
 
 
 @dataclass
@@ -35,6 +68,16 @@ class FeedbackLearner:
     Uses LLM vision to analyze before/after screenshots.
     """
     
+    # A pixel counts as changed when a channel moves by more than this (ignores
+    # capture noise); a press with at most NO_CHANGE_PIXELS changed pixels had
+    # no visible effect. A cursor moving one menu row changes far more.
+    PIXEL_CHANGE_LEVEL = 16
+    NO_CHANGE_PIXELS = 64
+    # Side length of the average-hash grid used to key the analysis cache
+    FRAME_HASH_SIZE = 16
+    # Max remembered (button, phase, before, after) analyses
+    ANALYSIS_CACHE_SIZE = 256
+    
     def __init__(
         self,
         llm_client,
@@ -45,10 +88,13 @@ class FeedbackLearner:
     ):
         if not HAS_PIL:
             raise ImportError("Pillow required: pip install pillow")
+        if knowledge_store is None and not HAS_CHROMADB:
+            raise ImportError("chromadb required: pip install chromadb")
         
         self.llm = llm_client
         self.capture = capture_engine
-        self.knowledge = knowledge_store or KnowledgeStore()
+        # Opened on first use: ChromaDB + the embedding model take seconds to load
+        self._knowledge = knowledge_store
         self.save_frames = save_frames
         self.frames_dir = frames_dir
         
@@ -59,31 +105,65 @@ class FeedbackLearner:
         self._before_frame: Optional["np.ndarray"] = None
         self._before_phase: str = "unknown"
         self._action_start: float = 0.0
+        
+        # LRU of LLM analyses keyed by (button, phase, before hash, after hash)
+        self._analysis_cache: "OrderedDict[tuple, ActionLearning]" = OrderedDict()
+    
+    @property
+    def knowledge(self) -> KnowledgeStore:
+        if self._knowledge is None:
+            self._knowledge = KnowledgeStore()
+        return self._knowledge
     
     def capture_before(self, game_phase: str = "unknown"):
         """Capture the screen state BEFORE a button press."""
-        self._before_frame = self.capture.capture()
+        # Kept across the press and other captures: pooled capture() views would
+        # be overwritten by then, so take a frame we own
+        self._before_frame = self.capture.capture_copy()
         self._before_phase = game_phase
         self._action_start = time.time()
     
     def capture_after_and_learn(self, button: str) -> Optional[ActionLearning]:
         """
         Capture the screen state AFTER a button press and learn the effect.
-        Returns the learning or None if before wasn't captured.
+        Returns the learning, or None if before wasn't captured or the press
+        had no visible effect.
         """
         if self._before_frame is None:
             print("[FeedbackLearner] Warning: No before frame captured")
             return None
         
-        after_frame = self.capture.capture()
+        after_frame = self.capture.capture_copy()
         
-        # Analyze the difference using LLM vision
-        learning = self._analyze_and_learn(
-            button=button,
-            game_phase=self._before_phase,
-            before_frame=self._before_frame,
-            after_frame=after_frame
-        )
+        if self._changed_pixels(self._before_frame, after_frame) <= self.NO_CHANGE_PIXELS:
+            # Nothing changed on screen - skip the (expensive) vision LLM call.
+            # Not stored: "no effect" now says little about the press in general
+            print(f"[FeedbackLearner] No visible change: '{button}' in {self._before_phase}")
+            learning = None
+        else:
+            key = (
+                button,
+                self._before_phase,
+                self._frame_hash(self._before_frame),
+                self._frame_hash(after_frame),
+            )
+            cached = self._analysis_cache.get(key)
+            if cached is not None:
+                # Same visual transition seen before - reuse the analysis
+                self._analysis_cache.move_to_end(key)
+                learning = replace(cached, timestamp=time.time())
+                print(f"[FeedbackLearner] Cached: '{button}' in {self._before_phase} -> {learning.effect_description[:60]}...")
+            else:
+                # Analyze the difference using LLM vision
+                learning = self._analyze_and_learn(
+                    button=button,
+                    game_phase=self._before_phase,
+                    before_frame=self._before_frame,
+                    after_frame=after_frame
+                )
+                self._analysis_cache[key] = learning
+                if len(self._analysis_cache) > self.ANALYSIS_CACHE_SIZE:
+                    self._analysis_cache.popitem(last=False)
         
         # Reset state
         self._before_frame = None
@@ -91,8 +171,45 @@ class FeedbackLearner:
         
         return learning
     
-    def _frame_to_base64(self, frame: "np.ndarray", max_size: int = 512) -> str:
-        """Convert numpy frame to base64 JPEG string."""
+    def _changed_pixels(self, before: "np.ndarray", after: "np.ndarray") -> int:
+        """Number of pixels where any channel differs by more than PIXEL_CHANGE_LEVEL."""
+        if before.shape != after.shape:
+            return before.size
+        level = self.PIXEL_CHANGE_LEVEL
+        if HAS_CV2:
+            diff = cv2.absdiff(before, after)
+        elif HAS_NUMBA and before.ndim == 3:
+            return int(_count_changed(np.ascontiguousarray(before), np.ascontiguousarray(after), level))
+        else:
+            diff = np.abs(before.astype(np.int16) - after.astype(np.int16))
+        if diff.ndim == 3:
+            diff = diff.max(axis=2)
+        return int(np.count_nonzero(diff > level))
+    
+    def _frame_hash(self, frame: "np.ndarray") -> bytes:
+        """Average hash: downscaled grayscale frame thresholded at its mean."""
+        size = self.FRAME_HASH_SIZE
+        gray = frame.mean(axis=2) if frame.ndim == 3 else frame.astype(np.float64)
+        h, w = gray.shape
+        if h < size or w < size:
+            return gray.tobytes()
+        # Block-average down to size x size
+        gray = gray[:h - h % size, :w - w % size]
+        small = gray.reshape(size, gray.shape[0] // size, size, gray.shape[1] // size).mean(axis=(1, 3))
+        return np.packbits(small > small.mean()).tobytes()
+    
+    def _encode_frame(self, frame: "np.ndarray", max_size: int = 512) -> bytes:
+        """Downscale numpy frame and encode it as JPEG bytes."""
+        if HAS_CV2:
+            # OpenCV: SIMD area resize + JPEG encode straight from the array
+            h, w = frame.shape[:2]
+            if max(h, w) > max_size:
+                ratio = max_size / max(h, w)
+                frame = cv2.resize(frame, (int(w * ratio), int(h * ratio)), interpolation=cv2.INTER_AREA)
+            ok, buf = cv2.imencode(".jpg", cv2.cvtColor(frame, cv2.COLOR_RGB2BGR), [cv2.IMWRITE_JPEG_QUALITY, 85])
+            if ok:
+                return buf.tobytes()
+        
         img = Image.fromarray(frame)
         
         # Resize if too large
@@ -103,16 +220,16 @@ class FeedbackLearner:
         
         buffer = io.BytesIO()
         img.save(buffer, format="JPEG", quality=85)
-        return base64.b64encode(buffer.getvalue()).decode("utf-8")
+        return buffer.getvalue()
     
-    def _save_frame(self, frame: "np.ndarray", prefix: str) -> str:
-        """Save frame to disk and return path."""
+    def _save_frame(self, jpeg_bytes: bytes, prefix: str) -> str:
+        """Save encoded JPEG frame to disk and return path."""
         timestamp = int(time.time() * 1000)
         filename = f"{prefix}_{timestamp}.jpg"
         path = os.path.join(self.frames_dir, filename)
         
-        img = Image.fromarray(frame)
-        img.save(path, quality=90)
+        with open(path, "wb") as f:
+            f.write(jpeg_bytes)
         
         return path
     
@@ -125,16 +242,16 @@ class FeedbackLearner:
     ) -> ActionLearning:
         """Use LLM to analyze before/after frames and create learning."""
         
+        # Encode each frame once; the same JPEG goes to disk and to the LLM
+        before_jpeg = self._encode_frame(before_frame)
+        after_jpeg = self._encode_frame(after_frame)
+        
         # Save frames if enabled
         before_path = None
         after_path = None
         if self.save_frames:
-            before_path = self._save_frame(before_frame, f"before_{button}")
-            after_path = self._save_frame(after_frame, f"after_{button}")
-        
-        # Convert to base64 for LLM
-        before_b64 = self._frame_to_base64(before_frame)
-        after_b64 = self._frame_to_base64(after_frame)
+            before_path = self._save_frame(before_jpeg, f"before_{button}")
+            after_path = self._save_frame(after_jpeg, f"after_{button}")
         
         # Ask LLM to analyze the difference
         prompt = f"""Analyze these two game screenshots. The first is BEFORE pressing the '{button}' button, the second is AFTER.
@@ -156,12 +273,12 @@ EFFECT: <what changed>
 LEARNING: <what this button does>"""
         
         try:
-            response = self.llm.chat_with_images(
+            response = self.llm.chat_with_image_bytes(
                 prompt=prompt,
-                images=[before_b64, after_b64]
+                image_bytes=[before_jpeg, after_jpeg]
             )
         except AttributeError:
-            # Fallback: send single combined description request if chat_with_images missing
+            # Fallback: send single combined description request if chat_with_image_bytes missing
             # Only send the "after" image and ask what happened
             fallback_prompt = f"""Analyze this game screenshot which shows the state AFTER pressing '{button}'.
 Describe what you see and tell me what this button likely did to reach this state.
@@ -173,22 +290,14 @@ LEARNING: <hypothesis on what button did>"""
             
             response = self.llm.chat(
                 prompt=fallback_prompt,
-                image_data=after_b64
+                image_data=base64.b64encode(after_jpeg).decode("utf-8")
             )
         
-        # Parse response
-        context = ""
-        effect = ""
-        learning_text = ""
-        
-        for line in response.split("\n"):
-            line = line.strip()
-            if line.startswith("CONTEXT:"):
-                context = line[8:].strip()
-            elif line.startswith("EFFECT:"):
-                effect = line[7:].strip()
-            elif line.startswith("LEARNING:"):
-                learning_text = line[9:].strip()
+        # Parse response (last occurrence of each field wins)
+        fields = {m.group(1).upper(): m.group(2) for m in _RESPONSE_FIELD_RE.finditer(response)}
+        context = fields.get("CONTEXT", "")
+        effect = fields.get("EFFECT", "")
+        learning_text = fields.get("LEARNING", "")
         
         # Create learning object
         learning = ActionLearning(
@@ -2,8 +2,11 @@
 Frame capture from Eden emulator using direct memory capture via Quartz.
 No disk I/O - captures directly to numpy array.
 """
+import io
 import os
-from typing import Optional
+import threading
+import urllib.request
+from typing import List, Optional
 
 try:
     from PIL import Image
@@ -12,6 +15,24 @@ except ImportError:
     Image = None
     np = None
 
+try:
+    import cv2
+    HAS_CV2 = True
+except ImportError:
+    HAS_CV2 = False
+
+try:
+    from numba import njit, prange
+    HAS_NUMBA = True
+except ImportError:
+    HAS_NUMBA = False
+
+try:
+    from turbojpeg import TurboJPEG, TJPF_RGB
+    HAS_TURBOJPEG = True
+except ImportError:
+    HAS_TURBOJPEG = False
+
 try:
     import Quartz
     from Quartz import CGWindowListCopyWindowInfo, CGWindowListCreateImage
@@ -23,12 +44,36 @@ except ImportError:
     HAS_QUARTZ = False
 
 
+# Window owners never treated as the emulator, even if a title mentions it
+_TERMINAL_OWNERS = frozenset({'terminal', 'iterm2', 'iterm', 'warp', 'kitty', 'alacritty'})
+
+
+if HAS_NUMBA:
+    @njit(cache=True, parallel=True, boundscheck=False)
+    def _bgra_to_rgb_crop(src, dst, top):
+        """Rows top.. of a (row-padded) BGRA view into RGB dst, in one parallel pass."""
+        for y in prange(dst.shape[0]):
+            row = src[y + top]
+            out = dst[y]
+            for x in range(dst.shape[1]):
+                out[x, 0] = row[x, 2]
+                out[x, 1] = row[x, 1]
+                out[x, 2] = row[x, 0]
+
+
 class FrameCapture:
     """
     Capture frames from the emulator directly to memory using Quartz.
     Works even when Eden is in the background.
+    
+    Frames are written into a small ring of reused buffers: a frame returned by
+    capture() stays valid for the next OUTPUT_POOL_SIZE - 1 captures. Use
+    capture_copy() to keep a frame longer.
     """
     
+    OUTPUT_POOL_SIZE = 3
+    TITLE_BAR_HEIGHT = 40
+    
     def __init__(self, window_name: str = "eden"):
         if Image is None or np is None:
             raise ImportError("Pillow and numpy required: pip install pillow numpy")
@@ -37,6 +82,15 @@ class FrameCapture:
         
         self.window_name = window_name.lower()
         self._window_id: Optional[int] = None
+        self._out_pool: List["np.ndarray"] = []
+        self._out_index = 0
+        # Capture geometry the current converter was specialized for
+        self._geometry: Optional[tuple] = None
+        self._out_shape: Optional[tuple] = None
+        self._convert = None
+        # The main loop and the input worker (feedback learner) both capture:
+        # one capture at a time, so two threads never get the same ring buffer
+        self._capture_lock = threading.Lock()
         self._find_window()
     
     def _find_window(self) -> Optional[int]:
@@ -47,21 +101,28 @@ class FrameCapture:
                 kCGNullWindowID
             )
             
+            window_name = self.window_name
             for window in window_list:
-                owner = window.get('kCGWindowOwnerName', '') or ''
-                name = window.get('kCGWindowName', '') or ''
+                owner = window.get('kCGWindowOwnerName') or ''
                 owner_lower = owner.lower()
                 
                 # Match Eden app specifically - owner must be "eden" not just contain it
                 # Avoid matching Terminal/iTerm that might have "eden" in the window title
-                is_terminal = owner_lower in ['terminal', 'iterm2', 'iterm', 'warp', 'kitty', 'alacritty']
+                if owner_lower in _TERMINAL_OWNERS:
+                    continue
                 
-                if self.window_name in owner_lower or self.window_name in name.lower():
-                    # Double check it's not a terminal if the name is generic
-                    if not is_terminal:
-                        self._window_id = window.get('kCGWindowNumber')
-                        print(f"Found Window: {owner} - {name} (ID: {self._window_id})")
-                        return self._window_id
+                # Owner match first; only read the window title when it misses
+                name = None
+                if window_name not in owner_lower:
+                    name = window.get('kCGWindowName') or ''
+                    if window_name not in name.lower():
+                        continue
+                
+                self._window_id = window.get('kCGWindowNumber')
+                if name is None:
+                    name = window.get('kCGWindowName') or ''
+                print(f"Found Window: {owner} - {name} (ID: {self._window_id})")
+                return self._window_id
                     
         except Exception as e:
             print(f"Window search failed: {e}")
@@ -69,26 +130,88 @@ class FrameCapture:
         print(f"Warning: Eden window not found. Make sure Eden is running.")
         return None
     
-    def _cgimage_to_numpy(self, cg_image) -> "np.ndarray":
-        """Convert CGImage to numpy array (RGB)."""
+    def _next_output_buffer(self, height: int, width: int) -> "np.ndarray":
+        """Return the next pooled RGB buffer, reallocating the pool if the size changed."""
+        if not self._out_pool or self._out_pool[0].shape != (height, width, 3):
+            self._out_pool = [
+                np.empty((height, width, 3), dtype=np.uint8)
+                for _ in range(self.OUTPUT_POOL_SIZE)
+            ]
+        self._out_index = (self._out_index + 1) % len(self._out_pool)
+        return self._out_pool[self._out_index]
+    
+    def _specialize(self, width: int, height: int, bytes_per_row: int, crop_top: int):
+        """
+        Build the per-frame converter for one capture geometry.
+        
+        Geometry only changes when the window is resized, so shape, strides,
+        crop and the conversion backend are decided once and closed over.
+        """
+        shape = (height, width, 4)
+        # Rows may be padded past width*4: keep the physical row stride so the
+        # padding is skipped by the view itself rather than by a trim copy
+        strides = (bytes_per_row, 4, 1)
+        
+        if HAS_CV2:
+            def convert(data, rgb):
+                # SIMD channel shuffle in a single pass; cropped rows are never touched
+                arr = np.ndarray(shape, np.uint8, data, 0, strides)
+                return cv2.cvtColor(arr[crop_top:], cv2.COLOR_BGRA2RGB, dst=rgb)
+        elif HAS_NUMBA:
+            def convert(data, rgb):
+                # Fused crop + shuffle, row-parallel without the GIL
+                _bgra_to_rgb_crop(np.ndarray(shape, np.uint8, data, 0, strides), rgb, crop_top)
+                return rgb
+        else:
+            def convert(data, rgb):
+                # Per-channel copies instead of a fancy-index gather
+                src = np.ndarray(shape, np.uint8, data, 0, strides)[crop_top:]
+                rgb[:, :, 0] = src[:, :, 2]
+                rgb[:, :, 1] = src[:, :, 1]
+                rgb[:, :, 2] = src[:, :, 0]
+                return rgb
+        
+        self._geometry = (width, height, bytes_per_row, crop_top)
+        self._out_shape = (height - crop_top, width, 3)
+        self._convert = convert
+    
+    def _cgimage_to_numpy(self, cg_image, crop_title_bar: bool = False, owned: bool = False) -> "np.ndarray":
+        """
+        Convert CGImage to numpy array (RGB), optionally without the title bar.
+        owned=True converts into a fresh array instead of the next pooled buffer.
+        """
         width = Quartz.CGImageGetWidth(cg_image)
         height = Quartz.CGImageGetHeight(cg_image)
         bytes_per_row = Quartz.CGImageGetBytesPerRow(cg_image)
         
-        # Get pixel data
-        data_provider = Quartz.CGImageGetDataProvider(cg_image)
-        data = Quartz.CGDataProviderCopyData(data_provider)
-        
-        # Convert to numpy - data is BGRA format
-        arr = np.frombuffer(data, dtype=np.uint8)
-        arr = arr.reshape((height, bytes_per_row // 4, 4))
-        arr = arr[:, :width, :]  # Trim padding
+        # Heuristic: Title bar is usually top ~28-40px on macOS
+        # Eden content starts below valid content
+        crop_top = self.TITLE_BAR_HEIGHT if crop_title_bar and height > 100 else 0
+        if (width, height, bytes_per_row, crop_top) != self._geometry:
+            self._specialize(width, height, bytes_per_row, crop_top)
         
-        # Convert BGRA to RGB
-        return arr[:, :, [2, 1, 0]]  # Swap B and R channels
+        # Get pixel data - BGRA format
+        # CGDataProviderCopyData is the only public accessor for the bitmap; its
+        # CFData exposes the buffer protocol via PyObjC, so the ndarray views the
+        # Quartz-owned bytes without a second copy (the array's base keeps it alive)
+        data = Quartz.CGDataProviderCopyData(Quartz.CGImageGetDataProvider(cg_image))
+        if owned:
+            rgb = np.empty(self._out_shape, dtype=np.uint8)
+        else:
+            rgb = self._next_output_buffer(*self._out_shape[:2])
+        return self._convert(data, rgb)
     
     def capture(self) -> "np.ndarray":
         """Capture current frame as numpy array (H, W, 3) RGB."""
+        with self._capture_lock:
+            return self._capture(owned=False)
+    
+    def capture_copy(self) -> "np.ndarray":
+        """Capture a frame the caller owns (not backed by the reused buffer pool)."""
+        with self._capture_lock:
+            return self._capture(owned=True)
+    
+    def _capture(self, owned: bool) -> "np.ndarray":
         try:
             # Refresh window ID if not found
             if self._window_id is None:
@@ -104,13 +227,8 @@ class FrameCapture:
                 )
                 
                 if cg_image:
-                    frame = self._cgimage_to_numpy(cg_image)
                     # Crop title bar if it looks like a window capture
-                    if self._window_id and frame.shape[0] > 100:
-                         # Heuristic: Title bar is usually top ~28-40px on macOS
-                         # Eden content starts below valid content
-                         return frame[40:, :, :]
-                    return frame
+                    return self._cgimage_to_numpy(cg_image, crop_title_bar=True, owned=owned)
             
             # Fallback: capture entire screen
             cg_image = Quartz.CGWindowListCreateImage(
@@ -121,7 +239,7 @@ class FrameCapture:
             )
             
             if cg_image:
-                return self._cgimage_to_numpy(cg_image)
+                return self._cgimage_to_numpy(cg_image, owned=owned)
                 
         except Exception as e:
             print(f"Capture failed: {e}")
@@ -136,15 +254,30 @@ class FrameCapture:
 
 
 class MockFrameCapture:
-    """Mock capture for testing without emulator."""
+    """
+    Mock capture for testing without emulator.
+    
+    Blank frames are shared and read-only; capture_copy() returns a writable one.
+    """
+    
+    _blanks = {}  # (h, w) -> shared read-only zero frame
+    
+    def _blank(self, height: int, width: int) -> "np.ndarray":
+        frame = self._blanks.get((height, width))
+        if frame is None:
+            frame = np.zeros((height, width, 3), dtype=np.uint8)
+            frame.flags.writeable = False
+            self._blanks[(height, width)] = frame
+        return frame
     
     def capture(self) -> "np.ndarray":
-        import numpy as np
-        return np.zeros((720, 1280, 3), dtype=np.uint8)
+        return self._blank(720, 1280)
+    
+    def capture_copy(self) -> "np.ndarray":
+        return self.capture().copy()
     
     def capture_region(self, x: int, y: int, w: int, h: int) -> "np.ndarray":
-        import numpy as np
-        return np.zeros((h, w, 3), dtype=np.uint8)
+        return self._blank(h, w)
 
 
 class MJPEGStreamCapture:
@@ -152,62 +285,149 @@ class MJPEGStreamCapture:
     Capture frames from Eden's built-in MJPEG stream.
     Requires the Eden video streaming mod to be applied.
     Falls back to FrameCapture if stream unavailable.
+    
+    A single HTTP response is held open and read by a background thread that
+    keeps only the newest complete JPEG, so capture() never pays a connection
+    setup and never returns frames that queued up while the agent was busy.
     """
     
+    JPEG_SOI = b'\xff\xd8'
+    JPEG_EOI = b'\xff\xd9'
+    READ_BUFFER_SIZE = 1 << 20  # Grows if a single frame is larger
+    
     def __init__(self, stream_url: str = "http://localhost:8765", window_name: str = "eden"):
         self.stream_url = stream_url
         self._fallback = None
         self._window_name = window_name
         self._stream = None
-        self._bytes_buffer = b''
+        self._reader: Optional[threading.Thread] = None
+        self._latest_jpeg: Optional[bytes] = None
+        self._jpeg_lock = threading.Lock()
+        self._frame_ready = threading.Event()
+        
+        # libjpeg-turbo decoder (SIMD IDCT + colour conversion straight to RGB)
+        self._tj = None
+        if HAS_TURBOJPEG:
+            try:
+                self._tj = TurboJPEG()
+            except Exception as e:
+                print(f"[FrameCapture] libjpeg-turbo unavailable: {e}")
         
         try:
-            import urllib.request
-            # Test connection
-            urllib.request.urlopen(stream_url, timeout=1)
+            # Long-lived connection, read continuously by the reader thread
+            self._stream = urllib.request.urlopen(stream_url, timeout=2)
+            self._reader = threading.Thread(target=self._read_loop, daemon=True)
+            self._reader.start()
             print(f"[FrameCapture] Connected to MJPEG stream at {stream_url}")
         except:
             print(f"[FrameCapture] MJPEG stream unavailable, using screen capture fallback")
             self._fallback = FrameCapture(window_name)
     
+    def _read_loop(self):
+        """Read the multipart stream, publishing each complete JPEG as it arrives."""
+        buf = bytearray(self.READ_BUFFER_SIZE)
+        view = memoryview(buf)
+        filled = 0     # Bytes of buf holding unconsumed stream data
+        scan_from = 0  # Where to resume the EOI search so each byte is scanned once
+        
+        # A plain (unchunked, unsized) multipart body can be read straight into
+        # buf from the socket file; otherwise go through the response decoder
+        stream = self._stream
+        readinto1 = None
+        if not stream.chunked and stream.length is None:
+            readinto1 = stream.fp.readinto1
+        
+        try:
+            while True:
+                if filled == len(buf):
+                    # Frame larger than the buffer: grow it (the view must be released first)
+                    view.release()
+                    buf.extend(bytes(len(buf)))
+                    view = memoryview(buf)
+                
+                if readinto1 is not None:
+                    got = readinto1(view[filled:])
+                else:
+                    chunk = stream.read1(len(buf) - filled)
+                    got = len(chunk)
+                    view[filled:filled + got] = chunk
+                if not got:
+                    break
+                filled += got
+                
+                consumed = 0
+                while True:
+                    start = buf.find(self.JPEG_SOI, consumed, filled)
+                    if start == -1:
+                        # Keep a trailing 0xff in case a marker straddles reads
+                        consumed = max(consumed, filled - 1)
+                        scan_from = 0
+                        break
+                    
+                    end = buf.find(self.JPEG_EOI, max(start + 2, scan_from), filled)
+                    if end == -1:
+                        consumed = start
+                        scan_from = max(start + 2, filled - 1)
+                        break
+                    
+                    jpeg = bytes(view[start:end + 2])
+                    consumed = end + 2
+                    scan_from = 0
+                    with self._jpeg_lock:
+                        self._latest_jpeg = jpeg
+                    self._frame_ready.set()
+                
+                # Move the partial next frame to the front (memoryview copies overlap-safely)
+                if consumed:
+                    remaining = filled - consumed
+                    view[:remaining] = view[consumed:filled]
+                    filled = remaining
+                    scan_from = max(0, scan_from - consumed)
+        except Exception as e:
+            print(f"[FrameCapture] Stream error: {e}")
+        finally:
+            view.release()
+            stream.close()
+    
+    def _decode_jpeg(self, jpeg_data: bytes) -> "np.ndarray":
+        """Decode JPEG bytes to an RGB numpy array."""
+        if self._tj is not None:
+            return self._tj.decode(jpeg_data, pixel_format=TJPF_RGB)
+        if HAS_CV2:
+            bgr = cv2.imdecode(np.frombuffer(jpeg_data, dtype=np.uint8), cv2.IMREAD_COLOR)
+            if bgr is not None:
+                return cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB)
+        img = Image.open(io.BytesIO(jpeg_data))
+        return np.array(img)
+    
     def capture(self) -> "np.ndarray":
         """Capture frame from MJPEG stream."""
         if self._fallback:
             return self._fallback.capture()
         
         try:
-            import urllib.request
-            import io
+            # Wait for the first frame; afterwards the newest one is always at hand
+            if not self._frame_ready.wait(timeout=2) or not self._reader.is_alive():
+                raise ConnectionError("MJPEG stream stopped delivering frames")
             
-            # Open stream and read one frame
-            with urllib.request.urlopen(self.stream_url, timeout=2) as response:
-                # Read until we find JPEG markers
-                data = b''
-                while True:
-                    chunk = response.read(4096)
-                    if not chunk:
-                        break
-                    data += chunk
-                    
-                    # Find JPEG start and end markers
-                    start = data.find(b'\xff\xd8')
-                    end = data.find(b'\xff\xd9')
-                    
-                    if start != -1 and end != -1 and end > start:
-                        jpeg_data = data[start:end+2]
-                        
-                        # Decode JPEG to numpy
-                        img = Image.open(io.BytesIO(jpeg_data))
-                        return np.array(img)
+            with self._jpeg_lock:
+                jpeg_data = self._latest_jpeg
+            
+            # Decode JPEG to numpy
+            return self._decode_jpeg(jpeg_data)
             
         except Exception as e:
             print(f"[FrameCapture] Stream error: {e}, falling back")
             if not self._fallback:
                 self._fallback = FrameCapture(self._window_name)
             return self._fallback.capture()
-        
-        # Return blank on failure
-        return np.zeros((720, 1280, 3), dtype=np.uint8)
+    
+    def capture_copy(self) -> "np.ndarray":
+        """Capture a frame the caller owns (the screen-capture fallback reuses buffers)."""
+        if self._fallback:
+            return self._fallback.capture_copy()
+        frame = self.capture()  # Decoded stream frames are already fresh arrays
+        return frame if self._fallback is None else frame.copy()
     
     def capture_region(self, x: int, y: int, w: int, h: int) -> "np.ndarray":
         """Capture specific region."""
@@ -3,6 +3,11 @@ Knowledge Store for Visual Feedback Learning.
 Uses ChromaDB for vector storage and LM Studio for embeddings.
 """
 import os
+import re
+import atexit
+import hashlib
+import platform
+from collections import OrderedDict
 from typing import Optional, List, Dict, Any
 from dataclasses import dataclass
 import json
@@ -22,6 +27,11 @@ try:
 except ImportError:
     HAS_SENTENCE_TRANSFORMERS = False
 
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
 try:
     import httpx
     HAS_HTTPX = True
@@ -29,54 +39,221 @@ except ImportError:
     HAS_HTTPX = False
 
 
+_WORD_SPAN_RE = re.compile(r'\S+')
+
+
+# Keep-alive HTTP client shared by every EmbeddingClient (several stores may
+# exist at once), created on first API use
+_http_client = None
+
+
+def _get_http_client():
+    global _http_client
+    if _http_client is None:
+        _http_client = httpx.Client(
+            timeout=30.0,
+            limits=httpx.Limits(max_keepalive_connections=4, keepalive_expiry=30.0)
+        )
+        atexit.register(_http_client.close)
+    return _http_client
+
+
 class EmbeddingClient:
     """
     Embedding client with sentence-transformers as default.
     Falls back to LM Studio API if sentence-transformers unavailable.
+    
+    Embeddings are memoized in a small LRU keyed by a hash of the text, since
+    the same "Button: ... | Phase: ..." strings are embedded over and over.
     """
     
+    CACHE_SIZE = 4096
+    
     def __init__(
         self,
         use_local: bool = True,
         local_model: str = "all-MiniLM-L6-v2",  # Fast & good quality
         api_base_url: str = "http://localhost:1234/v1",
-        api_model: str = "text-embedding-nomic-embed-text-v1.5"
+        api_model: str = "text-embedding-nomic-embed-text-v1.5",
+        quantize: bool = True,
+        cache_path: Optional[str] = None
     ):
         self.use_local = use_local and HAS_SENTENCE_TRANSFORMERS
         
         if self.use_local:
             print(f"[Embeddings] Using local sentence-transformers: {local_model}")
-            self.model = SentenceTransformer(local_model)
+            self.model, variant = self._load_local_model(local_model, quantize)
+            # int8/FP16/FP32 weights give slightly different vectors
+            self._model_id = f"local:{local_model}:{variant}"
         elif HAS_HTTPX:
             print(f"[Embeddings] Using LM Studio API: {api_base_url}")
             self.api_url = api_base_url.rstrip("/")
             self.api_model = api_model
+            self._http = _get_http_client()
+            self._model_id = f"api:{api_model}"
         else:
             raise ImportError("Either sentence-transformers or httpx required")
+        
+        # blake2b(text) -> unit-length float32 embedding
+        self._cache: "OrderedDict[bytes, np.ndarray]" = OrderedDict()
+        
+        # Optional on-disk copy of the cache so restarts don't re-embed the
+        # same queries; only valid for the model that produced it
+        self._cache_path = cache_path
+        if cache_path:
+            self._cache.update(self._read_cache_file())
+            if self._cache:
+                print(f"[Embeddings] Loaded {len(self._cache)} cached embeddings")
+            atexit.register(self.save_cache)
     
-    def embed(self, text: str) -> List[float]:
-        """Get embedding vector for text."""
-        if self.use_local:
-            return self.model.encode(text).tolist()
-        else:
-            return self._embed_via_api(text)
+    def _read_cache_file(self) -> "OrderedDict[bytes, np.ndarray]":
+        """Entries from cache_path (oldest first), or empty if missing/stale."""
+        entries = OrderedDict()
+        if not os.path.exists(self._cache_path):
+            return entries
+        try:
+            with np.load(self._cache_path) as data:
+                if str(data["model"]) != self._model_id:
+                    return entries
+                # Caches saved by an FP16 model hold float16 vectors
+                vectors = data["vectors"].astype(np.float32, copy=False)
+                for key, vector in zip(data["keys"], vectors):
+                    entries[key.tobytes()] = vector
+        except (OSError, KeyError, ValueError) as e:
+            print(f"[Embeddings] Ignoring unreadable cache {self._cache_path}: {e}")
+        return entries
     
-    def embed_batch(self, texts: List[str]) -> List[List[float]]:
-        """Get embeddings for multiple texts."""
-        if self.use_local:
-            return [e.tolist() for e in self.model.encode(texts)]
+    def save_cache(self):
+        """Write the cache to cache_path, merged with entries other clients saved."""
+        if not self._cache_path or not self._cache:
+            return
+        entries = self._read_cache_file()
+        entries.update(self._cache)
+        while len(entries) > self.CACHE_SIZE:
+            entries.popitem(last=False)
+        
+        keys = np.frombuffer(b"".join(entries), dtype="V16")
+        tmp_path = self._cache_path + ".tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                np.savez(f, model=np.array(self._model_id), keys=keys,
+                         vectors=np.stack(list(entries.values())).astype(np.float32))
+            os.replace(tmp_path, self._cache_path)
+        except OSError as e:
+            print(f"[Embeddings] Could not save cache: {e}")
+    
+    @staticmethod
+    def _load_local_model(local_model: str, quantize: bool):
+        """
+        Load the sentence-transformers model, preferring reduced precision.
+        
+        With quantize set, the int8 ONNX export shipped in the model repo is
+        tried first (needs sentence-transformers[onnx]); otherwise the FP32
+        model is loaded and halved to FP16 when it landed on a GPU (CUDA/MPS).
+        Returns the model and the weight variant loaded (ONNX file, fp16, fp32).
+        """
+        if quantize:
+            arm = platform.machine().lower() in ("arm64", "aarch64")
+            onnx_file = "onnx/model_qint8_arm64.onnx" if arm else "onnx/model_quint8_avx2.onnx"
+            try:
+                model = SentenceTransformer(local_model, backend="onnx", model_kwargs={"file_name": onnx_file})
+                print(f"[Embeddings] Using int8 ONNX weights: {onnx_file}")
+                return model, onnx_file
+            except Exception as e:
+                print(f"[Embeddings] int8 ONNX model unavailable ({e}), using PyTorch weights")
+        
+        model = SentenceTransformer(local_model)
+        if quantize and model.device.type in ("cuda", "mps"):
+            model.half()
+            print(f"[Embeddings] Using FP16 weights on {model.device.type}")
+            return model, "fp16"
+        return model, "fp32"
+    
+    @staticmethod
+    def _text_key(text: str) -> bytes:
+        """Fixed-size cache key so long guide texts are not retained as keys."""
+        return hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+    
+    def _cache_put(self, key: bytes, vector: "np.ndarray"):
+        self._cache[key] = vector
+        if len(self._cache) > self.CACHE_SIZE:
+            self._cache.popitem(last=False)
+    
+    @staticmethod
+    def _normalize(vectors: "np.ndarray") -> "np.ndarray":
+        """Float32 rows scaled to unit length (API embeddings may not be; FP16 models return float16)."""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+    
+    def embed(self, text: str) -> "np.ndarray":
+        """Get unit-length float32 embedding vector for text."""
+        key = self._text_key(text)
+        vector = self._cache.get(key)
+        if vector is not None:
+            self._cache.move_to_end(key)
         else:
-            return [self._embed_via_api(t) for t in texts]
+            if self.use_local:
+                # FP16 models encode to float16: back to unit-length float32
+                vector = self._normalize(self.model.encode(text, convert_to_numpy=True, normalize_embeddings=True))
+            else:
+                vector = self._normalize(self._embed_via_api(text))
+            self._cache_put(key, vector)
+        
+        return vector
+    
+    def embed_batch(self, texts: List[str]) -> "np.ndarray":
+        """Get embeddings for multiple texts as an (N, dim) float32 array."""
+        keys = [self._text_key(t) for t in texts]
+        resolved = {}  # key -> embedding for this batch
+        missing = {}   # key -> text, unseen texts in first-seen order
+        for k, t in zip(keys, texts):
+            if k in resolved or k in missing:
+                continue
+            vector = self._cache.get(k)
+            if vector is not None:
+                self._cache.move_to_end(k)
+                resolved[k] = vector
+            else:
+                missing[k] = t
+        
+        # Only embed texts we have not seen, in one batch
+        if missing:
+            if self.use_local:
+                fresh = self._normalize(self.model.encode(
+                    list(missing.values()), batch_size=64,
+                    convert_to_numpy=True, normalize_embeddings=True
+                ))
+            else:
+                fresh = self._normalize(self._embed_via_api_batch(list(missing.values())))
+            for k, vector in zip(missing, fresh):
+                resolved[k] = vector
+                self._cache_put(k, vector)
+        
+        if not keys:
+            return np.empty((0, 0), dtype=np.float32)
+        return np.stack([resolved[k] for k in keys])
     
     def _embed_via_api(self, text: str) -> List[float]:
         """Fallback: Get embedding via LM Studio API."""
-        with httpx.Client(timeout=30.0) as client:
-            response = client.post(
-                f"{self.api_url}/embeddings",
-                json={"model": self.api_model, "input": text}
-            )
-            response.raise_for_status()
-            return response.json()["data"][0]["embedding"]
+        response = self._http.post(
+            f"{self.api_url}/embeddings",
+            json={"model": self.api_model, "input": text}
+        )
+        response.raise_for_status()
+        return response.json()["data"][0]["embedding"]
+    
+    def _embed_via_api_batch(self, texts: List[str]) -> List[List[float]]:
+        """Embed several texts in one request (OpenAI-style list input)."""
+        response = self._http.post(
+            f"{self.api_url}/embeddings",
+            json={"model": self.api_model, "input": texts}
+        )
+        response.raise_for_status()
+        data = response.json()["data"]
+        # Servers may return items out of order; each carries its input index
+        data.sort(key=lambda d: d.get("index", 0))
+        return [d["embedding"] for d in data]
 
 
 @dataclass
@@ -91,12 +268,93 @@ class ActionLearning:
     timestamp: float = 0.0
 
 
+class _LearningIndex:
+    """
+    In-memory column mirror of the action_learnings metadata.
+    
+    Button and phase names are interned to int32 IDs held in parallel arrays,
+    so exact-match lookups are a vectorized mask instead of a Chroma
+    metadata scan. Chroma stays the source of truth.
+    """
+    
+    def __init__(self, capacity: int = 64):
+        self.size = 0
+        self.rows: Dict[str, int] = {}  # Chroma doc ID -> row
+        self.buttons = np.empty(capacity, dtype=np.int32)
+        self.phases = np.empty(capacity, dtype=np.int32)
+        self.contexts: List[str] = []
+        self.effects: List[str] = []
+        self._button_vocab: Dict[str, int] = {}
+        self._phase_vocab: Dict[str, int] = {}
+        self._phase_names: List[str] = []
+    
+    def _phase_id(self, phase: str) -> int:
+        phase_id = self._phase_vocab.get(phase)
+        if phase_id is None:
+            phase_id = self._phase_vocab[phase] = len(self._phase_names)
+            self._phase_names.append(phase)
+        return phase_id
+    
+    def upsert(self, doc_id: str, button: str, phase: str, context: str, effect: str):
+        """Add a record, or overwrite the row already holding doc_id."""
+        button_id = self._button_vocab.setdefault(button, len(self._button_vocab))
+        phase_id = self._phase_id(phase)
+        
+        row = self.rows.get(doc_id)
+        if row is not None:
+            self.buttons[row] = button_id
+            self.phases[row] = phase_id
+            self.contexts[row] = context
+            self.effects[row] = effect
+            return
+        
+        if self.size == len(self.buttons):
+            # Double capacity: amortized O(1) appends
+            self.buttons = np.resize(self.buttons, 2 * self.size)
+            self.phases = np.resize(self.phases, 2 * self.size)
+        
+        self.rows[doc_id] = self.size
+        self.buttons[self.size] = button_id
+        self.phases[self.size] = phase_id
+        self.contexts.append(context)
+        self.effects.append(effect)
+        self.size += 1
+    
+    def select(self, button: str, phase: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Records matching button (and phase, if given), in insertion order."""
+        button_id = self._button_vocab.get(button)
+        if button_id is None:
+            return []
+        mask = self.buttons[:self.size] == button_id
+        
+        if phase:
+            phase_id = self._phase_vocab.get(phase)
+            if phase_id is None:
+                return []
+            mask &= self.phases[:self.size] == phase_id
+        
+        return [
+            {
+                "button": button,
+                "game_phase": self._phase_names[self.phases[i]],
+                "context": self.contexts[i],
+                "effect": self.effects[i]
+            }
+            for i in np.flatnonzero(mask)
+        ]
+
+
 class KnowledgeStore:
     """
     Vector store for action-effect learnings using ChromaDB.
     Stores what happens when buttons are pressed in different contexts.
     """
     
+    # Strategy guides are embedded in windows of ~256 model tokens, 50% overlap
+    GUIDE_CHUNK_WORDS = 180
+    GUIDE_CHUNK_OVERLAP = 90
+    GUIDE_QUERY_FANOUT = 4
+    
     def __init__(
         self,
         persist_directory: str = "./knowledge_db",
@@ -106,50 +364,106 @@ class KnowledgeStore:
             raise ImportError("chromadb required: pip install chromadb")
         
         self.persist_dir = persist_directory
-        self.embedding_client = EmbeddingClient(use_local=use_local_embeddings)
+        self.embedding_client = EmbeddingClient(
+            use_local=use_local_embeddings,
+            cache_path=os.path.join(persist_directory, "embedding_cache.npz")
+        )
         
         # Initialize ChromaDB with persistence
         self.client = chromadb.PersistentClient(path=persist_directory)
         
         # Create or get the action learnings collection
-        self.collection = self.client.get_or_create_collection(
-            name="action_learnings",
-            metadata={"description": "Button press effects learned from visual feedback"}
+        self.collection = self._open_collection(
+            "action_learnings",
+            "Button press effects learned from visual feedback"
         )
 
         # Create or get the strategy guides collection
-        self.strategy_collection = self.client.get_or_create_collection(
-            name="strategy_guides",
-            metadata={"description": "Game strategy guides, job classes, and tactics"}
+        self.strategy_collection = self._open_collection(
+            "strategy_guides",
+            "Game strategy guides, job classes, and tactics"
         )
         
+        # Exact-match mirror of the learnings, built on first use
+        self._learning_index: Optional[_LearningIndex] = None
+        
         print(f"[KnowledgeStore] Initialized with {self.collection.count()} learnings")
     
+    def _open_collection(self, name: str, description: str):
+        """
+        Get a collection, creating it with a cosine HNSW index if missing.
+        
+        Embeddings are unit length, so cosine distance is a plain dot product.
+        Existing collections are opened as-is: Chroma cannot change the
+        distance function of a persisted index. The embedding model id is
+        recorded at creation so vectors from other weights are reported.
+        """
+        model_id = self.embedding_client._model_id
+        try:
+            collection = self.client.get_collection(name=name)
+        except Exception:
+            return self.client.create_collection(
+                name=name,
+                metadata={
+                    "description": description,
+                    "embedding_model": model_id,
+                    "hnsw:space": "cosine",
+                    "hnsw:M": 32,
+                    # Callers want top-3; a short candidate list ends the graph walk sooner
+                    "hnsw:search_ef": 32,
+                }
+            )
+        stored_id = (collection.metadata or {}).get("embedding_model")
+        if stored_id is not None and stored_id != model_id:
+            print(f"[KnowledgeStore] Warning: '{name}' was embedded with {stored_id}, "
+                  f"now using {model_id}; similarities may be off")
+        return collection
+    
+    @staticmethod
+    def _similarity(collection, distance: float) -> float:
+        """Cosine similarity from a Chroma distance between unit vectors."""
+        if (collection.metadata or {}).get("hnsw:space") == "cosine":
+            return 1 - distance
+        # Legacy L2 collections report squared distance: |a-b|^2 = 2 - 2cos
+        return 1 - distance / 2
+    
     def store_learning(self, learning: ActionLearning) -> str:
         """Store a new action-effect learning."""
         # Create searchable text from the learning
         search_text = f"Button: {learning.button} | Phase: {learning.game_phase} | Context: {learning.context_description}"
         
-        # Get embedding
-        embedding = self.embedding_client.embed(search_text)
+        # Content-addressed ID: the same (button, phase, context) is one record,
+        # and IDs cannot collide the way millisecond timestamps did
+        doc_id = "learn_" + hashlib.blake2b(search_text.encode("utf-8"), digest_size=8).hexdigest()
+        metadata = {
+            "button": learning.button,
+            "game_phase": learning.game_phase,
+            "context": learning.context_description,
+            "effect": learning.effect_description,
+            "before_frame": learning.before_frame_path or "",
+            "after_frame": learning.after_frame_path or "",
+            "timestamp": learning.timestamp
+        }
         
-        # Generate unique ID
-        doc_id = f"learn_{int(learning.timestamp * 1000)}"
+        index = self._get_learning_index()
+        if doc_id in index.rows:
+            # Seen before: refresh the metadata, the stored embedding is unchanged
+            self.collection.update(ids=[doc_id], metadatas=[metadata])
+        else:
+            # Get embedding
+            embedding = self.embedding_client.embed(search_text)
+            
+            # Store in ChromaDB
+            self.collection.upsert(
+                ids=[doc_id],
+                embeddings=embedding.reshape(1, -1),
+                documents=[search_text],
+                metadatas=[metadata]
+            )
         
-        # Store in ChromaDB
-        self.collection.add(
-            ids=[doc_id],
-            embeddings=[embedding],
-            documents=[search_text],
-            metadatas=[{
-                "button": learning.button,
-                "game_phase": learning.game_phase,
-                "context": learning.context_description,
-                "effect": learning.effect_description,
-                "before_frame": learning.before_frame_path or "",
-                "after_frame": learning.after_frame_path or "",
-                "timestamp": learning.timestamp
-            }]
+        index.upsert(
+            doc_id, learning.button, learning.game_phase,
+            learning.context_description, learning.effect_description
         )
         
         print(f"[KnowledgeStore] Stored learning: {learning.button} in {learning.game_phase} -> {learning.effect_description[:50]}...")
@@ -171,9 +485,9 @@ class KnowledgeStore:
         
         # Query ChromaDB
         results = self.collection.query(
-            query_embeddings=[embedding],
+            query_embeddings=embedding.reshape(1, -1),
             n_results=n_results,
-            include=["documents", "metadatas", "distances"]
+            include=["metadatas", "distances"]  # Only metadata fields are returned
         )
         
         # Format results
@@ -185,73 +499,123 @@ class KnowledgeStore:
                     "game_phase": meta["game_phase"],
                     "context": meta["context"],
                     "effect": meta["effect"],
-                    "similarity": 1 - results["distances"][0][i] if results["distances"] else 0
+                    "similarity": self._similarity(self.collection, results["distances"][0][i]) if results["distances"] else 0
                 })
         
         return learnings
     
+    def _get_learning_index(self) -> _LearningIndex:
+        """Return the learning index, rebuilding it if the collection changed."""
+        index = self._learning_index
+        # Another KnowledgeStore may share the collection; a count mismatch means
+        # records were added behind our back
+        if index is None or index.size != self.collection.count():
+            results = self.collection.get(include=["metadatas"])
+            index = _LearningIndex(max(64, len(results["ids"])))
+            for doc_id, meta in zip(results["ids"], results["metadatas"] or []):
+                index.upsert(doc_id, meta["button"], meta["game_phase"], meta["context"], meta["effect"])
+            self._learning_index = index
+        return index
+    
     def get_button_knowledge(self, button: str, game_phase: Optional[str] = None) -> List[Dict[str, Any]]:
         """Get all learnings for a specific button (optionally filtered by phase)."""
-        where_filter = {"button": button}
-        if game_phase:
-            where_filter = {"$and": [{"button": button}, {"game_phase": game_phase}]}
-        
-        results = self.collection.get(
-            where=where_filter,
-            include=["documents", "metadatas"]
-        )
-        
-        learnings = []
-        if results and results["metadatas"]:
-            for meta in results["metadatas"]:
-                learnings.append({
-                    "button": meta["button"],
-                    "game_phase": meta["game_phase"],
-                    "context": meta["context"],
-                    "effect": meta["effect"]
-                })
-        
-        return learnings
+        return self._get_learning_index().select(button, game_phase)
     
     def count(self) -> int:
         """Return total number of learnings stored."""
         return self.collection.count()
 
+    @classmethod
+    def _chunk_guide(cls, content: str) -> List[str]:
+        """
+        Split a guide into overlapping word windows that fit the embedding model.
+        
+        Slices keep the original text (newlines, markdown) between the first
+        and last word of each window.
+        """
+        words = [m.span() for m in _WORD_SPAN_RE.finditer(content)]
+        if len(words) <= cls.GUIDE_CHUNK_WORDS:
+            return [content.strip()] if words else []
+        
+        step = cls.GUIDE_CHUNK_WORDS - cls.GUIDE_CHUNK_OVERLAP
+        chunks = []
+        for start in range(0, len(words) - cls.GUIDE_CHUNK_OVERLAP, step):
+            end = min(start + cls.GUIDE_CHUNK_WORDS, len(words))
+            chunks.append(content[words[start][0]:words[end - 1][1]])
+        return chunks
+
     def store_strategy_guide(self, title: str, content: str, tags: List[str] = []) -> str:
-        """Store a strategy guide or wiki page."""
-        embedding = self.embedding_client.embed(content)
-        doc_id = f"guide_{int(time.time() * 1000)}"
+        """
+        Store a strategy guide or wiki page as overlapping chunks.
         
+        Chunk IDs are content hashes, so chunks already in the collection
+        (re-scraped pages, re-seeded guides) are not embedded again.
+        """
+        guide_id = f"guide_{hashlib.blake2b(content.encode('utf-8'), digest_size=16).hexdigest()}"
+        chunks = self._chunk_guide(content)
+        chunk_ids = [
+            f"chunk_{hashlib.blake2b(c.encode('utf-8'), digest_size=16).hexdigest()}"
+            for c in chunks
+        ]
+        
+        # Skip chunks already stored (by this or any other guide)
+        # (Chroma rejects duplicate IDs, and a guide can repeat a passage)
+        lookup_ids = list(dict.fromkeys(chunk_ids))
+        existing = set(self.strategy_collection.get(ids=lookup_ids, include=[])["ids"]) if lookup_ids else set()
+        new = []
+        for i, (chunk_id, chunk) in enumerate(zip(chunk_ids, chunks)):
+            if chunk_id not in existing:
+                existing.add(chunk_id)  # Also drops repeats within this guide
+                new.append((i, chunk_id, chunk))
+        
+        if not new:
+            print(f"[KnowledgeStore] Guide already stored: {title}")
+            return guide_id
+        
+        embeddings = self.embedding_client.embed_batch([chunk for _, _, chunk in new])
+        now = time.time()
         self.strategy_collection.add(
-            ids=[doc_id],
-            embeddings=[embedding],
-            documents=[content],
+            ids=[chunk_id for _, chunk_id, _ in new],
+            embeddings=embeddings,
+            documents=[chunk for _, _, chunk in new],
             metadatas=[{
+                "guide_id": guide_id,
+                "chunk_idx": i,
                 "title": title,
                 "tags": ",".join(tags),
-                "timestamp": time.time()
-            }]
+                "timestamp": now
+            } for i, _, _ in new]
         )
-        print(f"[KnowledgeStore] Stored guide: {title}")
-        return doc_id
+        print(f"[KnowledgeStore] Stored guide: {title} ({len(new)}/{len(chunks)} new chunks)")
+        return guide_id
 
     def query_strategy(self, query: str, n_results: int = 3) -> List[Dict[str, Any]]:
-        """Query strategy guides."""
+        """Query strategy guides (best-matching chunk per guide)."""
         embedding = self.embedding_client.embed(query)
+        # Over-fetch chunks: several may belong to the same guide
         results = self.strategy_collection.query(
-            query_embeddings=[embedding],
-            n_results=n_results,
+            query_embeddings=embedding.reshape(1, -1),
+            n_results=n_results * self.GUIDE_QUERY_FANOUT,
             include=["documents", "metadatas", "distances"]
         )
         
         guides = []
+        seen = set()
         if results and results["metadatas"]:
             for i, meta in enumerate(results["metadatas"][0]):
+                # Results are nearest-first, so the first chunk of a guide is its best
+                # Guides stored before chunking have no guide_id and stand alone
+                guide_id = meta.get("guide_id") or results["ids"][0][i]
+                if guide_id in seen:
+                    continue
+                seen.add(guide_id)
                 guides.append({
                     "title": meta["title"],
                     "content": results["documents"][0][i],
-                    "similarity": 1 - results["distances"][0][i] if results["distances"] else 0
+                    "similarity": self._similarity(self.strategy_collection, results["distances"][0][i]) if results["distances"] else 0
                 })
+                if len(guides) == n_results:
+                    break
         return guides
 
 
@@ -3,8 +3,18 @@ LLM Client with OpenAI-compatible endpoint support.
 Works with: OpenAI, Azure OpenAI, Ollama, LM Studio, vLLM, etc.
 """
 import os
+import asyncio
+import base64
+import hashlib
+import random
+import sqlite3
+import threading
+import weakref
+import time
+from collections import OrderedDict
 from dataclasses import dataclass
-from typing import Optional
+from email.utils import parsedate_to_datetime
+from typing import Iterator, Optional, List, Union
 import json
 
 try:
@@ -12,6 +22,45 @@ try:
 except ImportError:
     httpx = None
 
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+try:
+    import h2  # httpx's optional HTTP/2 support (pip install httpx[http2])
+    HAS_HTTP2 = True
+except ImportError:
+    HAS_HTTP2 = False
+
+try:
+    import zstandard  # Compresses persistent-cache entries
+    HAS_ZSTD = True
+except ImportError:
+    HAS_ZSTD = False
+
+_ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+try:
+    import orjson  # C JSON codec: much faster on base64-heavy image payloads
+    HAS_ORJSON = True
+except ImportError:
+    HAS_ORJSON = False
+
+
+def _json_dumps(obj, sort_keys: bool = False) -> bytes:
+    """Serialize to UTF-8 JSON bytes (orjson when available)."""
+    if HAS_ORJSON:
+        return orjson.dumps(obj, option=orjson.OPT_SORT_KEYS if sort_keys else 0)
+    return json.dumps(obj, sort_keys=sort_keys).encode("utf-8")
+
+
+def _json_loads(data):
+    """Parse JSON from bytes/str (orjson when available)."""
+    if HAS_ORJSON:
+        return orjson.loads(data)
+    return json.loads(data)
+
 
 @dataclass
 class LLMConfig:
@@ -20,6 +69,26 @@ class LLMConfig:
     model: str = "llama3"
     temperature: float = 0.7
     max_tokens: int = 500
+    # Read timeout per request (reasoning models can think for minutes);
+    # connecting is capped separately so a dead endpoint fails fast
+    timeout: float = 60.0
+    max_concurrency: int = 8  # In-flight requests for the async API
+    # Identical requests reuse the previous reply, but only when sampling is
+    # near-deterministic (at higher temperatures a repeat should differ)
+    cache_max_temperature: float = 0.3
+    cache_ttl: float = 1800.0
+    cache_size: int = 1024
+    # Reuse replies to paraphrased text-only prompts whose embedding cosine
+    # similarity is at least this (e.g. 0.92); None disables the semantic cache
+    semantic_cache_threshold: Optional[float] = None
+    # SQLite file that keeps exact-match replies across runs and processes
+    # (e.g. "~/.eden_fft/llm_cache.db"); None keeps the cache in memory only
+    cache_db_path: Optional[str] = None
+    # Provider-side prompt caching of the (stable) system prompt prefix.
+    # OpenAI-style servers cache prefixes automatically; "anthropic" needs an
+    # explicit cache_control breakpoint on the system message
+    provider: str = "openai"
+    enable_prefix_cache: bool = True
 
 
 class LLMClient:
@@ -33,120 +102,465 @@ class LLMClient:
     - vLLM: base_url="http://localhost:8000/v1"
     """
     
+    MAX_RETRY_DELAY = 60.0  # Seconds; also caps the server's Retry-After
+    CONNECT_TIMEOUT = 10.0
+    
     def __init__(self, config: Optional[LLMConfig] = None):
         if httpx is None:
             raise ImportError("httpx required: pip install httpx")
         
         self.config = config or LLMConfig()
-        self.client = httpx.Client(timeout=60.0)
+        # One pooled client for the session: keep-alive reuses the TCP/TLS
+        # connection, and HTTP/2 (when available) multiplexes requests over it
+        self.client = httpx.Client(
+            timeout=httpx.Timeout(self.config.timeout, connect=self.CONNECT_TIMEOUT),
+            http2=HAS_HTTP2,
+            limits=httpx.Limits(max_keepalive_connections=8, max_connections=32, keepalive_expiry=60.0)
+        )
         
-    def chat(self, prompt: str, system_prompt: Optional[str] = None, image_data: Optional[str] = None) -> str:
-        """
-        Send chat request.
-        image_data: Base64 encoded image string (optional)
-        """
-        import time
+        # Request constants, built once
+        self._post = self.client.post
+        self._system_messages = {}  # system prompt -> prebuilt message dict
+        self._url = f"{self.config.base_url}/chat/completions"
+        self._headers = {
+            "Authorization": f"Bearer {self.config.api_key}",
+            "Content-Type": "application/json",
+        }
         
-        messages = []
-        if system_prompt:
-            messages.append({"role": "system", "content": system_prompt})
-            
-        if image_data:
-            # Multimodal request
-            content = [
-                {"type": "text", "text": prompt},
-                {"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{image_data}"}}
-            ]
-            messages.append({"role": "user", "content": content})
+        # Event loop -> (async client, concurrency limit), created lazily: pooled
+        # connections belong to the loop that opened them. Each loop closes its
+        # own client with aclose() before it finishes
+        self._aclients: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+        
+        # sha256(request) -> (expiry time, reply), least recently used first.
+        # Used from the main loop, the context pool and the input worker
+        self._response_cache: "OrderedDict[str, tuple]" = OrderedDict()
+        self._cache_lock = threading.Lock()
+        
+        # Semantic cache: ring of unit prompt embeddings with parallel entries
+        self._embedder = None
+        self._sem_vecs = None                 # (cache_size, dim) float32
+        self._sem_contexts = None             # int32 context ID per slot
+        self._sem_entries: List[tuple] = []   # (expiry time, reply) per slot
+        self._sem_next = 0
+        self._sem_context_ids = {}
+        
+        # Persistent exact-match cache, behind the in-memory one
+        self._db = None
+        if self.config.cache_db_path:
+            self._open_cache_db(os.path.expanduser(self.config.cache_db_path))
+    
+    def _open_cache_db(self, path: str):
+        try:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            db = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+            # WAL: readers in other agent processes don't block our writes
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            db.execute("CREATE TABLE IF NOT EXISTS cache(k BLOB PRIMARY KEY, v BLOB, expires REAL)")
+            db.execute("DELETE FROM cache WHERE expires < ?", (time.time(),))
+        except (OSError, sqlite3.Error) as e:
+            print(f"[LLM] Persistent cache disabled ({path}): {e}")
+            return
+        self._db = db
+        self._zstd_c = zstandard.ZstdCompressor(level=3) if HAS_ZSTD else None
+        self._zstd_d = zstandard.ZstdDecompressor() if HAS_ZSTD else None
+    
+    def _db_get(self, key: str) -> Optional[tuple]:
+        """(seconds left, reply) from the persistent cache, or None."""
+        try:
+            row = self._db.execute("SELECT v, expires FROM cache WHERE k = ?",
+                                   (bytes.fromhex(key),)).fetchone()
+        except sqlite3.Error:
+            return None
+        if row is None:
+            return None
+        value, expires = row
+        remaining = expires - time.time()
+        if remaining <= 0:
+            return None
+        if value[:4] == _ZSTD_MAGIC:
+            if self._zstd_d is None:
+                return None  # Written by a process with zstandard installed
+            value = self._zstd_d.decompress(value)
+        return remaining, value.decode("utf-8")
+    
+    def _db_put(self, key: str, content: str):
+        value = content.encode("utf-8")
+        if self._zstd_c is not None:
+            value = self._zstd_c.compress(value)
+        try:
+            self._db.execute("INSERT OR REPLACE INTO cache(k, v, expires) VALUES (?, ?, ?)",
+                             (bytes.fromhex(key), value, time.time() + self.config.cache_ttl))
+        except sqlite3.Error as e:
+            print(f"[LLM] Persistent cache write failed: {e}")
+    
+    def _cacheable(self, cache: Optional[bool]) -> bool:
+        """Per-call override, else cache only near-deterministic sampling."""
+        if cache is not None:
+            return cache
+        return self.config.temperature <= self.config.cache_max_temperature
+    
+    def _cache_key(self, messages: list, cache: Optional[bool] = None) -> Optional[str]:
+        """Response-cache key for a request, or None if caching is off for it."""
+        if not self._cacheable(cache):
+            return None
+        request = _json_dumps({
+            "m": self.config.model,
+            "msg": messages,
+            "t": self.config.temperature,
+            "mt": self.config.max_tokens,
+        }, sort_keys=True)
+        return hashlib.sha256(request).hexdigest()
+    
+    def _cache_get(self, key: Optional[str]) -> Optional[str]:
+        if key is None:
+            return None
+        with self._cache_lock:
+            entry = self._response_cache.get(key)
+            if entry is not None:
+                expires, content = entry
+                if expires < time.monotonic():
+                    del self._response_cache[key]
+                    return None
+                self._response_cache.move_to_end(key)
+                return content
+        
+        if self._db is None:
+            return None
+        stored = self._db_get(key)
+        if stored is None:
+            return None
+        # Promote to memory with the same remaining lifetime
+        remaining, content = stored
+        with self._cache_lock:
+            self._response_cache[key] = (time.monotonic() + remaining, content)
+            if len(self._response_cache) > self.config.cache_size:
+                self._response_cache.popitem(last=False)
+        return content
+    
+    def _cache_put(self, key: Optional[str], content: str):
+        if key is None:
+            return
+        with self._cache_lock:
+            self._response_cache[key] = (time.monotonic() + self.config.cache_ttl, content)
+            self._response_cache.move_to_end(key)
+            if len(self._response_cache) > self.config.cache_size:
+                self._response_cache.popitem(last=False)
+        if self._db is not None:
+            self._db_put(key, content)
+        
+    def _semantic_key(self, messages: list, cache: Optional[bool] = None) -> Optional[tuple]:
+        """(context ID, prompt embedding) for a text-only request, else None."""
+        if self.config.semantic_cache_threshold is None or not self._cacheable(cache):
+            return None
+        prompt = messages[-1]["content"]
+        if not isinstance(prompt, str):
+            return None  # Image requests: similar text says nothing about the frames
+        
+        if self._embedder is None:
+            # Imported on first use: loads the embedding model only when enabled
+            from knowledge_store import EmbeddingClient
+            self._embedder = EmbeddingClient()
+        
+        # Only replies for the same system prompt and sampling settings are reusable
+        context = json.dumps([self.config.model, self.config.temperature,
+                              self.config.max_tokens, messages[:-1]], sort_keys=True)
+        context_id = self._sem_context_ids.setdefault(context, len(self._sem_context_ids))
+        return context_id, self._embedder.embed(prompt)
+    
+    def _semantic_get(self, key: Optional[tuple]) -> Optional[str]:
+        if key is None or not self._sem_entries:
+            return None
+        context_id, vector = key
+        count = len(self._sem_entries)
+        scores = self._sem_vecs[:count] @ vector
+        scores[self._sem_contexts[:count] != context_id] = -1.0
+        best = int(scores.argmax())
+        expires, content = self._sem_entries[best]
+        if scores[best] >= self.config.semantic_cache_threshold and expires >= time.monotonic():
+            return content
+        return None
+    
+    def _semantic_put(self, key: Optional[tuple], content: str):
+        if key is None:
+            return
+        context_id, vector = key
+        if self._sem_vecs is None:
+            self._sem_vecs = np.zeros((self.config.cache_size, vector.shape[0]), dtype=np.float32)
+            self._sem_contexts = np.full(self.config.cache_size, -1, dtype=np.int32)
+        
+        # Overwrite the oldest slot once the ring is full
+        slot = self._sem_next
+        self._sem_vecs[slot] = vector
+        self._sem_contexts[slot] = context_id
+        entry = (time.monotonic() + self.config.cache_ttl, content)
+        if slot < len(self._sem_entries):
+            self._sem_entries[slot] = entry
         else:
-            # Text-only request
-            messages.append({"role": "user", "content": prompt})
+            self._sem_entries.append(entry)
+        self._sem_next = (slot + 1) % self.config.cache_size
+    
+    @classmethod
+    def _retry_delay(cls, response: "httpx.Response", attempt: int, base_delay: float) -> float:
+        """Seconds to wait before retrying a 429: the server's Retry-After, else jittered backoff."""
+        retry_after = response.headers.get("Retry-After")
+        if retry_after:
+            try:
+                delay = float(retry_after)
+            except ValueError:
+                try:
+                    delay = parsedate_to_datetime(retry_after).timestamp() - time.time()
+                except (TypeError, ValueError):
+                    delay = None
+            if delay is not None:
+                return min(max(delay, 0.0), cls.MAX_RETRY_DELAY)
+        # Jitter keeps concurrent workers from retrying in lockstep
+        delay = base_delay * (2 ** attempt) * random.uniform(0.5, 1.5)
+        return min(delay, cls.MAX_RETRY_DELAY)
+    
+    def _post_chat(self, messages: list, cache: Optional[bool] = None) -> str:
+        """POST a chat completion (cached, with 429 retries) and return the reply text."""
+        cache_key = self._cache_key(messages, cache)
+        cached = self._cache_get(cache_key)
+        if cached is not None:
+            return cached
+        semantic_key = self._semantic_key(messages, cache)
+        cached = self._semantic_get(semantic_key)
+        if cached is not None:
+            return cached
         
         max_retries = 3
         base_delay = 2.0
+        # Image requests carry megabytes of base64: serialize them once, not per attempt
+        body = self._encode_body(messages)
         
         for attempt in range(max_retries + 1):
             try:
-                response = self.client.post(
-                    f"{self.config.base_url}/chat/completions",
-                    headers={
-                        "Authorization": f"Bearer {self.config.api_key}",
-                        "Content-Type": "application/json",
-                    },
-                    json={
-                        "model": self.config.model,
-                        "messages": messages,
-                        "temperature": self.config.temperature,
-                        "max_tokens": self.config.max_tokens,
-                    },
-                )
+                response = self._post(self._url, headers=self._headers, content=body)
                 
                 response.raise_for_status()
-                data = response.json()
-                return data["choices"][0]["message"]["content"]
+                data = _json_loads(response.content)
+                content = data["choices"][0]["message"]["content"]
+                self._cache_put(cache_key, content)
+                self._semantic_put(semantic_key, content)
+                return content
                 
             except httpx.HTTPStatusError as e:
                 if e.response.status_code == 429:
                     if attempt < max_retries:
-                        delay = base_delay * (2 ** attempt)
-                        print(f"Warning: Rate limited (429). Retrying in {delay}s...")
+                        delay = self._retry_delay(e.response, attempt, base_delay)
+                        print(f"Warning: Rate limited (429). Retrying in {delay:.1f}s...")
                         time.sleep(delay)
                         continue
+                raise
+    
+    def _encode_body(self, messages: list, stream: bool = False) -> bytes:
+        """Serialized chat-completions request body (encoded once, reused across retries)."""
+        payload = {
+            "model": self.config.model,
+            "messages": messages,
+            "temperature": self.config.temperature,
+            "max_tokens": self.config.max_tokens,
+        }
+        if stream:
+            payload["stream"] = True
+        return _json_dumps(payload)
+    
+    def chat(self, prompt: str, system_prompt: Optional[str] = None, image_data: Optional[str] = None,
+             cache: Optional[bool] = None) -> str:
+        """
+        Send chat request.
+        image_data: Base64 encoded image string (optional)
+        cache: True/False forces reply caching on/off; None caches only at low temperature
+        """
+        images = [image_data] if image_data else None
+        return self._post_chat(self._build_messages(prompt, system_prompt, images), cache)
+    
     def chat_with_images(self, prompt: str, images: list, system_prompt: Optional[str] = None) -> str:
         """
         Send chat request with multiple images.
         images: List of base64 encoded image strings
         """
-        import time
+        return self._post_chat(self._build_messages(prompt, system_prompt, images))
+    
+    def chat_with_image_bytes(self, prompt: str, image_bytes: Union[bytes, List[bytes]],
+                              system_prompt: Optional[str] = None) -> str:
+        """
+        Send chat request with raw JPEG bytes (one image or a list).
+        Callers skip their own base64 step; each image is encoded exactly once here.
+        """
+        if isinstance(image_bytes, (bytes, bytearray, memoryview)):
+            image_bytes = [image_bytes]
+        images = [base64.b64encode(b).decode("ascii") for b in image_bytes]
+        return self._post_chat(self._build_messages(prompt, system_prompt, images))
+    
+    def chat_stream(self, prompt: str, system_prompt: Optional[str] = None, image_data: Optional[str] = None,
+                    image_bytes: Optional[bytes] = None) -> Iterator[str]:
+        """
+        Stream a chat reply, yielding text deltas as the server generates them.
+        image_data: Base64 encoded image string (optional)
+        image_bytes: Raw JPEG bytes, encoded here (optional alternative to image_data)
+        """
+        if image_bytes is not None:
+            image_data = base64.b64encode(image_bytes).decode("ascii")
+        images = [image_data] if image_data else None
+        messages = self._build_messages(prompt, system_prompt, images)
+        cache_key = self._cache_key(messages)
+        cached = self._cache_get(cache_key)
+        if cached is not None:
+            yield cached
+            return
+        
+        max_retries = 3
+        base_delay = 2.0
+        body = self._encode_body(messages, stream=True)
+        
+        for attempt in range(max_retries + 1):
+            with self.client.stream("POST", self._url, headers=self._headers, content=body) as response:
+                if response.status_code == 429 and attempt < max_retries:
+                    delay = self._retry_delay(response, attempt, base_delay)
+                    print(f"Warning: Rate limited (429). Retrying in {delay:.1f}s...")
+                    time.sleep(delay)
+                    continue
+                if response.is_error:
+                    response.read()  # Body is needed for the error message
+                response.raise_for_status()
+                
+                # OpenAI-style SSE: "data: {json}" lines, terminated by "data: [DONE]"
+                parts = []
+                for line in response.iter_lines():
+                    if not line.startswith("data:"):
+                        continue
+                    data = line[5:].strip()
+                    if data == "[DONE]":
+                        break
+                    choices = _json_loads(data).get("choices")
+                    delta = choices[0].get("delta", {}).get("content") if choices else None
+                    if delta:
+                        parts.append(delta)
+                        yield delta
+                if parts:
+                    self._cache_put(cache_key, "".join(parts))
+                return
+    
+    def _system_message(self, system_prompt: str) -> dict:
+        """Prebuilt system message; agents reuse a handful of fixed system prompts."""
+        message = self._system_messages.get(system_prompt)
+        if message is None:
+            if self.config.enable_prefix_cache and self.config.provider == "anthropic":
+                message = {"role": "system", "content": [{
+                    "type": "text",
+                    "text": system_prompt,
+                    "cache_control": {"type": "ephemeral"},
+                }]}
+            else:
+                # Kept first and byte-identical across calls so server prefix caches hit
+                message = {"role": "system", "content": system_prompt}
+            if len(self._system_messages) < 64:  # Don't grow without bound on dynamic prompts
+                self._system_messages[system_prompt] = message
+        return message
+    
+    def _build_messages(self, prompt: str, system_prompt: Optional[str] = None, images: Optional[list] = None) -> list:
+        """Build the chat messages list; images are base64 JPEG strings."""
+        if not images:
+            # Common case: text-only request
+            user = {"role": "user", "content": prompt}
+            return [self._system_message(system_prompt), user] if system_prompt else [user]
         
         messages = []
         if system_prompt:
-            messages.append({"role": "system", "content": system_prompt})
+            messages.append(self._system_message(system_prompt))
         
-        # Build content with multiple images
+        # Multimodal request
         content = [{"type": "text", "text": prompt}]
         for img_b64 in images:
             content.append({
                 "type": "image_url",
                 "image_url": {"url": f"data:image/jpeg;base64,{img_b64}"}
             })
-        
         messages.append({"role": "user", "content": content})
+        return messages
+    
+    def _get_aclient(self) -> tuple:
+        """(async client, request semaphore) for the running event loop."""
+        loop = asyncio.get_running_loop()
+        entry = self._aclients.get(loop)
+        if entry is None:
+            client = httpx.AsyncClient(
+                timeout=httpx.Timeout(self.config.timeout, connect=self.CONNECT_TIMEOUT),
+                http2=HAS_HTTP2,
+                limits=httpx.Limits(
+                    max_connections=self.config.max_concurrency,
+                    max_keepalive_connections=self.config.max_concurrency
+                )
+            )
+            entry = self._aclients[loop] = (client, asyncio.Semaphore(self.config.max_concurrency))
+        return entry
+    
+    async def _apost_chat(self, messages: list) -> str:
+        """POST a chat completion without blocking the event loop (429 retries included)."""
+        cache_key = self._cache_key(messages)
+        cached = self._cache_get(cache_key)
+        if cached is not None:
+            return cached
+        semantic_key = self._semantic_key(messages)
+        cached = self._semantic_get(semantic_key)
+        if cached is not None:
+            return cached
         
+        client, semaphore = self._get_aclient()
         max_retries = 3
         base_delay = 2.0
+        body = self._encode_body(messages)
         
         for attempt in range(max_retries + 1):
             try:
-                response = self.client.post(
-                    f"{self.config.base_url}/chat/completions",
-                    headers={
-                        "Authorization": f"Bearer {self.config.api_key}",
-                        "Content-Type": "application/json",
-                    },
-                    json={
-                        "model": self.config.model,
-                        "messages": messages,
-                        "temperature": self.config.temperature,
-                        "max_tokens": self.config.max_tokens,
-                    },
-                )
+                async with semaphore:
+                    response = await client.post(self._url, headers=self._headers, content=body)
                 
                 response.raise_for_status()
-                data = response.json()
-                return data["choices"][0]["message"]["content"]
+                data = _json_loads(response.content)
+                content = data["choices"][0]["message"]["content"]
+                self._cache_put(cache_key, content)
+                self._semantic_put(semantic_key, content)
+                return content
                 
             except httpx.HTTPStatusError as e:
                 if e.response.status_code == 429:
                     if attempt < max_retries:
-                        delay = base_delay * (2 ** attempt)
-                        print(f"Warning: Rate limited (429). Retrying in {delay}s...")
-                        time.sleep(delay)
+                        delay = self._retry_delay(e.response, attempt, base_delay)
+                        print(f"Warning: Rate limited (429). Retrying in {delay:.1f}s...")
+                        await asyncio.sleep(delay)  # Outside the semaphore: free the slot
                         continue
                 raise
     
+    async def achat(self, prompt: str, system_prompt: Optional[str] = None, image_data: Optional[str] = None) -> str:
+        """Async chat(); many calls can be awaited concurrently."""
+        images = [image_data] if image_data else None
+        return await self._apost_chat(self._build_messages(prompt, system_prompt, images))
+    
+    async def achat_with_images(self, prompt: str, images: list, system_prompt: Optional[str] = None) -> str:
+        """Async chat_with_images()."""
+        return await self._apost_chat(self._build_messages(prompt, system_prompt, images))
+    
+    async def achat_many(self, prompts: List[str], system_prompt: Optional[str] = None) -> List[str]:
+        """Run several text prompts concurrently (bounded by config.max_concurrency)."""
+        return await asyncio.gather(*(self.achat(p, system_prompt) for p in prompts))
+    
+    async def aclose(self):
+        """Close the running loop's async client; await it before that loop finishes."""
+        entry = self._aclients.pop(asyncio.get_running_loop(), None)
+        if entry is not None:
+            await entry[0].aclose()
+    
     def close(self):
         self.client.close()
+        if len(self._aclients):
+            print(f"[LLM] Warning: {len(self._aclients)} async client(s) left open; await aclose() on their loops")
+        if self._db is not None:
+            self._db.close()
+            self._db = None
 
 
 # Convenience function
@@ -156,6 +570,7 @@ def create_client_from_env() -> LLMClient:
         base_url=os.getenv("LLM_BASE_URL", "http://localhost:11434/v1"),
         api_key=os.getenv("LLM_API_KEY", "ollama"),
         model=os.getenv("LLM_MODEL", "llama3"),
+        provider=os.getenv("LLM_PROVIDER", "openai"),
     )
     return LLMClient(config)
 
@@ -5,6 +5,8 @@ Complete the entire game from start to finish.
 import time
 import sys
 import os
+import json
+from concurrent.futures import ThreadPoolExecutor
 from typing import Optional
 from dataclasses import dataclass, field
 from enum import Enum, auto
@@ -15,13 +17,19 @@ from cemuhook_server import CemuhookServer
 from frame_capture import FrameCapture
 # Note: OCR removed - using Vision LLM for all text understanding
 from prompt_builder import GameState, Unit, build_prompt, SYSTEM_PROMPT
-from action_parser import parse_llm_response, action_to_inputs, InputExecutor
+from action_parser import parse_llm_response, action_fields_complete, action_to_inputs, InputExecutor
 
 # Vision dependencies
-import base64
 import io
+import numpy as np
 from PIL import Image
 
+try:
+    import cv2
+    HAS_CV2 = True
+except ImportError:
+    HAS_CV2 = False
+
 # Visual Feedback Learning (optional, requires chromadb)
 try:
     from feedback_learner import FeedbackLearner
@@ -42,13 +50,19 @@ except ImportError:
 
 # Memory Reading (GDB Stub)
 try:
-    from memory_reader import GDBMemoryReader, GameMemoryState
+    from memory_reader import GDBMemoryReader, GameMemoryState, MemoryPoller
     HAS_MEMORY_READER = True
 except ImportError:
     HAS_MEMORY_READER = False
-    GDBMemoryReader, GameMemoryState = None, None
+    GDBMemoryReader, GameMemoryState, MemoryPoller = None, None, None
     HAS_MEMORY_READER = False
 
+# Local phase classifier (optional, requires onnxruntime + a trained model)
+try:
+    from phase_classifier import PhaseClassifier, HAS_ONNXRUNTIME
+except ImportError:
+    PhaseClassifier, HAS_ONNXRUNTIME = None, False
+
 # Strategy Advisor module
 try:
     from strategy_advisor import StrategyAdvisor
@@ -81,6 +95,21 @@ class GamePhase(Enum):
     UNKNOWN = auto()
 
 
+# Phase names the Vision LLM may answer with
+_PHASE_NAMES = {
+    phase.name: phase
+    for phase in (
+        GamePhase.TITLE_SCREEN,
+        GamePhase.BATTLE,
+        GamePhase.BATTLE_RESULT,
+        GamePhase.CUTSCENE,
+        GamePhase.PARTY_MENU,
+        GamePhase.SHOP,
+        GamePhase.WORLD_MAP,
+    )
+}
+
+
 @dataclass
 class AgentConfig:
     """Configuration for the LLM Agent."""
@@ -88,6 +117,8 @@ class AgentConfig:
     llm_base_url: str = "https://generativelanguage.googleapis.com/v1beta/openai"
     llm_api_key: str = field(default_factory=lambda: os.getenv("OPENAI_API_KEY", ""))
     llm_model: str = "gemini-2.0-flash"
+    llm_provider: str = "openai"  # "anthropic" enables explicit prompt caching
+    llm_timeout: float = 120.0  # Per-request read timeout (thinking models are slow)
     
     # Game settings
     difficulty: str = "hard"  # Easy, Normal, Hard
@@ -96,7 +127,7 @@ class AgentConfig:
     
     # Timing
     action_delay: float = 0.2  # Delay between actions
-    think_time: float = 3.0   # Min time to "think" per turn
+    think_time: float = 3.0   # Max wait for the screen to react to an action's last input
     
     # Debug
     verbose: bool = True
@@ -105,6 +136,7 @@ class AgentConfig:
     
     # Capture
     window_title: str = "Eden"
+    phase_detect_resolution: int = 384  # Longest side of phase/turn query images
     
     # GDB Memory Reading
     gdb_enabled: bool = True
@@ -114,7 +146,6 @@ class AgentConfig:
 
 def load_config_from_file() -> AgentConfig:
     """Load configuration from config.toml if available."""
-    import os
     try:
         import tomli
         config_path = os.path.join(os.path.dirname(__file__), "config.toml")
@@ -129,8 +160,11 @@ def load_config_from_file() -> AgentConfig:
                 llm_base_url=llm.get("base_url", AgentConfig.llm_base_url),
                 llm_api_key=llm.get("api_key", AgentConfig.llm_api_key),
                 llm_model=llm.get("model", AgentConfig.llm_model),
+                llm_provider=llm.get("provider", AgentConfig.llm_provider),
+                llm_timeout=llm.get("timeout", AgentConfig.llm_timeout),
                 difficulty=game.get("difficulty", "hard"),
                 window_title=capture.get("window_title", "Eden"),
+                phase_detect_resolution=capture.get("phase_detect_resolution", AgentConfig.phase_detect_resolution),
                 gdb_enabled=gdb.get("enabled", True),
                 gdb_host=gdb.get("host", "127.0.0.1"),
                 gdb_port=gdb.get("port", 6543),
@@ -145,6 +179,24 @@ class FFTAgent:
     LLM-powered agent that plays FFT from start to finish.
     """
     
+    # Local phase classifier: 8x8 average hashes of frames the Vision LLM has
+    # already labeled. A new frame within PHASE_MATCH_BITS (Hamming distance)
+    # of a known hash reuses that label instead of a round-trip.
+    PHASE_HASH_SIZE = 8
+    PHASE_MATCH_BITS = 5
+    # Looser match for the phase a scripted action is expected to lead to
+    PHASE_HINT_MATCH_BITS = 10
+    PHASE_REFS_PER_PHASE = 64
+    PHASE_REFS_FILE = os.path.join("phase_refs", "gallery.json")
+    SCREEN_POLL_INTERVAL = 1 / 30    # Post-action screen-change polling (~30 Hz)
+    
+    # Optional int8 ONNX classifier, consulted after the gallery and before the LLM
+    PHASE_MODEL_FILE = os.path.join("phase_refs", "phases_int8.onnx")
+    
+    # Phase/turn queries only tell a handful of UI layouts apart: small
+    # low-quality grayscale JPEGs are enough and cut upload size and image tokens
+    PHASE_JPEG_QUALITY = 50
+    
     def __init__(self, config: Optional[AgentConfig] = None):
         self.config = config or AgentConfig()
         
@@ -153,6 +205,8 @@ class FFTAgent:
             base_url=self.config.llm_base_url,
             api_key=self.config.llm_api_key,
             model=self.config.llm_model,
+            provider=self.config.llm_provider,
+            timeout=self.config.llm_timeout,
         ))
         
         # Try to start controller, or connect to existing one
@@ -196,14 +250,15 @@ class FFTAgent:
         self.knowledge_retriever = None
         if HAS_KNOWLEDGE_RETRIEVAL:
             try:
-                wiki_store = WikiKnowledgeStore()
-                self.knowledge_retriever = SmartKnowledgeRetriever(knowledge_store=wiki_store)
+                # The wiki store is opened on the first battle query, not at startup
+                self.knowledge_retriever = SmartKnowledgeRetriever(knowledge_store_factory=WikiKnowledgeStore)
                 print(f"[Agent] Knowledge Retrieval enabled (RAG + Web Search)")
             except Exception as e:
                 print(f"[Agent] Knowledge Retrieval disabled: {e}")
         
         # Memory Reader (GDB Stub)
         self.memory_reader = None
+        self._memory_poller = None
         if HAS_MEMORY_READER and self.config.gdb_enabled:
             try:
                 self.memory_reader = GDBMemoryReader(
@@ -214,6 +269,9 @@ class FFTAgent:
                     print(f"[Agent] Memory Reader enabled (GDB @ {self.config.gdb_host}:{self.config.gdb_port})")
                 else:
                     print(f"[Agent] Memory Reader: Could not connect to GDB stub (will retry)")
+                # The poller owns the socket; everything else reads its snapshot
+                self._memory_poller = MemoryPoller(self.memory_reader)
+                self._memory_poller.start()
             except Exception as e:
                 print(f"[Agent] Memory Reader error: {e}")
         
@@ -229,6 +287,41 @@ class FFTAgent:
             self.strategy_learner = StrategyLearner()
             print(f"[Agent] Strategy Learner enabled")
         
+        # Phase a scripted handler expects next (e.g. title screen -> cutscene)
+        self._expected_next_phase: Optional[GamePhase] = None
+        
+        # Turn status from detect_phase's combined query, consumed by extract_battle_state
+        self._our_turn_hint: Optional[bool] = None
+        
+        # Downscaled copies and JPEG encodings of the most recent frame,
+        # shared by the vision queries
+        self._jpeg_frame = None
+        self._scaled_cache: dict = {}
+        self._jpeg_cache: dict = {}
+        
+        # Phase hash gallery: hash -> GamePhase (insertion order = age)
+        self._phase_gallery: dict = {}
+        self._load_phase_gallery()
+        
+        self._phase_classifier = None
+        if HAS_ONNXRUNTIME and os.path.exists(self.PHASE_MODEL_FILE):
+            try:
+                self._phase_classifier = PhaseClassifier(self.PHASE_MODEL_FILE)
+                print(f"[Agent] Local phase classifier enabled ({self.PHASE_MODEL_FILE})")
+            except Exception as e:
+                print(f"[Agent] Local phase classifier disabled: {e}")
+        
+        # map name -> retrieved knowledge context, cleared when a battle ends
+        self._knowledge_cache: dict = {}
+        
+        # Background worker for per-turn prompt context (knowledge retrieval)
+        self._context_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="context")
+        
+        # Battle action inputs play back here while the reply finishes streaming
+        # and the screen-change wait runs; the next tick waits for them before capturing
+        self._input_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="input")
+        self._pending_inputs = None
+        
         # State
         self.current_phase = GamePhase.UNKNOWN
         self.battle_count = 0
@@ -256,16 +349,22 @@ class FFTAgent:
         """Stop the agent."""
         self.running = False
         self.controller.stop()
+        if self._memory_poller:
+            self._memory_poller.stop()
+        self._input_pool.shutdown(wait=False, cancel_futures=True)
+        self._context_pool.shutdown(wait=False)
         self.llm.close()
     
     def main_loop(self):
         """Main game loop."""
         while self.running:
-            # 1. Capture screen
-            frame = self.capture.capture()
+            # 1. Capture screen (once the previous action has finished playing)
+            self._wait_for_inputs()
+            frame = self._capture()
             
             # 2. Detect game phase
-            self.current_phase = self.detect_phase(frame)
+            hint, self._expected_next_phase = self._expected_next_phase, None
+            self.current_phase = self.detect_phase(frame, hint=hint)
             
             # 3. Handle based on phase
             if self.current_phase == GamePhase.TITLE_SCREEN:
@@ -288,21 +387,169 @@ class FFTAgent:
             
             time.sleep(self.config.action_delay)
     
-    def detect_phase(self, frame) -> GamePhase:
-        """Detect current game phase using Vision LLM."""
-        # Encode frame for vision
-        
+    def _load_phase_gallery(self):
+        """Load previously labeled phase hashes from disk."""
+        if not os.path.exists(self.PHASE_REFS_FILE):
+            return
+        try:
+            with open(self.PHASE_REFS_FILE, "r") as f:
+                data = json.load(f)
+            self._phase_gallery = {int(h, 16): GamePhase[name] for h, name in data.items()}
+            print(f"[Vision] Loaded {len(self._phase_gallery)} phase references")
+        except (OSError, ValueError, KeyError) as e:
+            print(f"[Vision] Could not load phase references: {e}")
+    
+    def _save_phase_gallery(self):
+        try:
+            os.makedirs(os.path.dirname(self.PHASE_REFS_FILE), exist_ok=True)
+            with open(self.PHASE_REFS_FILE, "w") as f:
+                json.dump({f"{h:016x}": phase.name for h, phase in self._phase_gallery.items()}, f)
+        except OSError as e:
+            print(f"[Vision] Could not save phase references: {e}")
+    
+    def _phase_hash(self, frame) -> int:
+        """64-bit average hash: 8x8 grayscale thumbnail thresholded at its mean."""
+        size = self.PHASE_HASH_SIZE
+        if HAS_CV2:
+            gray = cv2.cvtColor(frame, cv2.COLOR_RGB2GRAY)
+            small = cv2.resize(gray, (size, size), interpolation=cv2.INTER_AREA).astype(np.float32)
+        else:
+            h, w = frame.shape[:2]
+            gray = frame[:h - h % size, :w - w % size].mean(axis=2)
+            small = gray.reshape(size, gray.shape[0] // size, size, gray.shape[1] // size).mean(axis=(1, 3))
+        bits = np.packbits(small > small.mean())
+        return int.from_bytes(bits.tobytes(), "big")
+    
+    def _match_phase(self, frame_hash: int) -> Optional[GamePhase]:
+        """Closest labeled phase within PHASE_MATCH_BITS, or None."""
+        best_phase, best_dist = None, self.PHASE_MATCH_BITS + 1
+        for ref_hash, phase in self._phase_gallery.items():
+            dist = (ref_hash ^ frame_hash).bit_count()
+            if dist < best_dist:
+                best_phase, best_dist = phase, dist
+                if dist == 0:
+                    break
+        return best_phase
+    
+    def _near_phase(self, frame_hash: int, phase: GamePhase) -> bool:
+        """Whether any reference of this phase is within PHASE_HINT_MATCH_BITS."""
+        return any(
+            (ref_hash ^ frame_hash).bit_count() <= self.PHASE_HINT_MATCH_BITS
+            for ref_hash, ref_phase in self._phase_gallery.items() if ref_phase is phase
+        )
+    
+    def _remember_phase(self, frame_hash: int, phase: GamePhase):
+        """Add an LLM-labeled hash to the gallery, evicting that phase's oldest."""
+        self._phase_gallery[frame_hash] = phase
+        same = [h for h, p in self._phase_gallery.items() if p is phase]
+        if len(same) > self.PHASE_REFS_PER_PHASE:
+            del self._phase_gallery[same[0]]
+        self._save_phase_gallery()
+    
+    @staticmethod
+    def _downscale(frame, max_size: int):
+        """Shrink a frame so its longest side fits max_size (no-op if it already does)."""
+        h, w = frame.shape[:2]
+        if max(h, w) <= max_size:
+            return frame
+        ratio = max_size / max(h, w)
+        size = (int(w * ratio), int(h * ratio))
+        if HAS_CV2:
+            # SIMD area resize; contiguous input keeps OpenCV on its fast path
+            return cv2.resize(np.ascontiguousarray(frame), size, interpolation=cv2.INTER_AREA)
+        return np.asarray(Image.fromarray(frame).resize(size, Image.BILINEAR))
+    
+    @staticmethod
+    def _encode_jpeg(frame, quality: int, gray: bool = False) -> bytes:
+        """JPEG-encode an (already downscaled) RGB frame, optionally as grayscale."""
+        if HAS_CV2:
+            code = cv2.COLOR_RGB2GRAY if gray else cv2.COLOR_RGB2BGR
+            ok, buf = cv2.imencode(".jpg", cv2.cvtColor(frame, code), [cv2.IMWRITE_JPEG_QUALITY, quality])
+            if ok:
+                return buf.tobytes()
         pil_img = Image.fromarray(frame)
-        if pil_img.width > 512:
-            pil_img.thumbnail((512, 512))
+        if gray:
+            pil_img = pil_img.convert("L")
         buf = io.BytesIO()
-        pil_img.save(buf, format="JPEG", quality=70)
-        img_b64 = base64.b64encode(buf.getvalue()).decode('utf-8')
+        pil_img.save(buf, format="JPEG", quality=quality)
+        return buf.getvalue()
+    
+    def _memory_snapshot(self) -> Optional["GameMemoryState"]:
+        """Latest game state published by the memory poller (None until first read)."""
+        if self._memory_poller:
+            return self._memory_poller.latest
+        return None
+    
+    def _capture(self):
+        """Capture a frame and invalidate the encodings of the previous one."""
+        # FrameCapture recycles its output buffers, so identity alone can't tell frames apart
+        self._jpeg_frame = None
+        return self.capture.capture()
+    
+    def _scaled_frame(self, frame, max_size: int):
+        """Frame downscaled to max_size, resized at most once per capture."""
+        scaled = self._scaled_cache.get(max_size)
+        if scaled is None:
+            # Shrink from the smallest copy that is still large enough
+            # (e.g. 512 from an existing 1024) instead of the full frame
+            larger = [size for size in self._scaled_cache if size > max_size]
+            source = self._scaled_cache[min(larger)] if larger else frame
+            scaled = self._downscale(source, max_size)
+            self._scaled_cache[max_size] = scaled
+        return scaled
+    
+    def _frame_jpeg(self, frame, max_size: int, quality: int, gray: bool = False) -> bytes:
+        """JPEG of the frame, encoded at most once per (frame, size, quality, gray)."""
+        if frame is not self._jpeg_frame:
+            # New capture: drop resizes and encodings of the previous frame
+            self._jpeg_frame = frame
+            self._scaled_cache = {}
+            self._jpeg_cache = {}
+        key = (max_size, quality, gray)
+        jpeg = self._jpeg_cache.get(key)
+        if jpeg is None:
+            jpeg = self._encode_jpeg(self._scaled_frame(frame, max_size), quality, gray)
+            self._jpeg_cache[key] = jpeg
+        return jpeg
+    
+    def _phase_jpeg(self, frame) -> bytes:
+        """Small grayscale JPEG for the phase/turn queries."""
+        return self._frame_jpeg(frame, self.config.phase_detect_resolution, self.PHASE_JPEG_QUALITY, gray=True)
+    
+    def detect_phase(self, frame, hint: Optional[GamePhase] = None) -> GamePhase:
+        """
+        Detect current game phase: hash gallery, then local classifier, then Vision LLM.
+        
+        hint is the phase the previous action should have led to; it is accepted
+        if the frame is within PHASE_HINT_MATCH_BITS of a reference of that phase.
+        """
+        self._our_turn_hint = None
+        frame_hash = self._phase_hash(frame)
+        phase = self._match_phase(frame_hash)
+        if phase is None and hint is not None and self._near_phase(frame_hash, hint):
+            phase = hint
+        if phase is not None:
+            if self.config.verbose:
+                print(f"[Vision] Detected phase (local): {phase.name}")
+            return phase
+        
+        prediction = self._classify_frame(frame)
+        if prediction is not None:
+            phase, is_our_turn = prediction
+            if self.config.verbose:
+                print(f"[Vision] Detected phase (classifier): {phase.name}")
+            if phase is GamePhase.BATTLE:
+                self._our_turn_hint = is_our_turn
+            return phase
+        
+        # Encode frame for vision
+        jpeg = self._phase_jpeg(frame)
         
-        # Ask LLM to identify the current game phase
-        prompt = """Look at this Final Fantasy Tactics screenshot and identify the current game phase.
+        # One query answers both the phase and, for battles, whose turn it is,
+        # so extract_battle_state() can skip its own YES/NO round-trip
+        prompt = """Look at this Final Fantasy Tactics screenshot.
 
-Respond with ONLY ONE of these phases:
+1. Identify the current game phase, ONE of:
 - TITLE_SCREEN (title menu, new game, continue, difficulty selection)
 - BATTLE (combat, tactical view, turn-based battle with HP/MP visible)
 - BATTLE_RESULT (victory, defeat, level up, exp gained)
@@ -312,31 +559,65 @@ Respond with ONLY ONE of these phases:
 - WORLD_MAP (ivalice map, location selection)
 - UNKNOWN (cannot determine)
 
-Just respond with the phase name, nothing else."""
+2. If the phase is BATTLE, is it the player's turn? Look for:
+- Command menu visible (Move, Act, Wait, Status)
+- HP/MP display for active unit
+- Cursor/hand indicator
+
+Respond with ONLY this JSON object, nothing else:
+{"phase": "<PHASE_NAME>", "is_our_turn": <true|false>}"""
 
         try:
-            response = self.llm.chat(prompt, image_data=img_b64)
-            phase_str = response.strip().upper().replace(" ", "_")
+            response = self.llm.chat_with_image_bytes(prompt, jpeg)
+            phase, is_our_turn = self._parse_phase_reply(response)
             
             if self.config.verbose:
-                print(f"[Vision] Detected phase: {phase_str}")
+                print(f"[Vision] Detected phase: {phase.name}")
             
-            # Map to GamePhase enum
-            phase_map = {
-                "TITLE_SCREEN": GamePhase.TITLE_SCREEN,
-                "BATTLE": GamePhase.BATTLE,
-                "BATTLE_RESULT": GamePhase.BATTLE_RESULT,
-                "CUTSCENE": GamePhase.CUTSCENE,
-                "PARTY_MENU": GamePhase.PARTY_MENU,
-                "SHOP": GamePhase.SHOP,
-                "WORLD_MAP": GamePhase.WORLD_MAP,
-            }
-            return phase_map.get(phase_str, GamePhase.UNKNOWN)
+            if phase is GamePhase.BATTLE:
+                self._our_turn_hint = is_our_turn
+            if phase is not GamePhase.UNKNOWN:
+                self._remember_phase(frame_hash, phase)
+            return phase
             
         except Exception as e:
             print(f"[Vision] Phase detection error: {e}")
             return GamePhase.UNKNOWN
     
+    def _classify_frame(self, frame):
+        """(GamePhase, is_our_turn or None) from the local classifier, None if unsure/unavailable."""
+        if self._phase_classifier is None:
+            return None
+        try:
+            prediction = self._phase_classifier.classify(frame)
+        except Exception as e:
+            print(f"[Vision] Phase classifier error: {e}")
+            return None
+        if prediction is None:
+            return None
+        name, is_our_turn = prediction
+        return _PHASE_NAMES.get(name, GamePhase.UNKNOWN), is_our_turn
+    
+    @staticmethod
+    def _parse_phase_reply(response: str):
+        """(GamePhase, is_our_turn or None) from the combined vision reply."""
+        start, end = response.find("{"), response.rfind("}")
+        if start != -1 and end > start:
+            try:
+                data = json.loads(response[start:end + 1])
+                phase_str = str(data.get("phase", "")).strip().upper().replace(" ", "_")
+                is_our_turn = data.get("is_our_turn")
+                if isinstance(is_our_turn, str):
+                    is_our_turn = is_our_turn.strip().lower() in ("true", "yes")
+                elif not isinstance(is_our_turn, bool):
+                    is_our_turn = None
+                return _PHASE_NAMES.get(phase_str, GamePhase.UNKNOWN), is_our_turn
+            except (ValueError, AttributeError):
+                pass
+        # Model ignored the JSON format: accept a bare phase name
+        phase_str = response.strip().upper().replace(" ", "_")
+        return _PHASE_NAMES.get(phase_str, GamePhase.UNKNOWN), None
+    
     def handle_title_screen(self):
         """Handle title screen - start new game or continue."""
         print("At title screen - starting new game...")
@@ -357,6 +638,7 @@ Just respond with the phase name, nothing else."""
             self.controller.press_dpad('down')
             
         self.controller.press_a()
+        self._expected_next_phase = GamePhase.CUTSCENE  # New game opens on a cutscene
     
     def handle_cutscene(self):
         """Handle cutscenes - skip or advance dialogue."""
@@ -388,7 +670,8 @@ Just respond with the phase name, nothing else."""
         REASON: <your reasoning>
         """
         
-        response = self.llm.chat(prompt, SYSTEM_PROMPT)
+        # Fixed menu prompt: reuse the previous reply rather than a new round-trip
+        response = self.llm.chat(prompt, SYSTEM_PROMPT, cache=True)
         parsed = parse_llm_response(response)
         
         if self.config.verbose:
@@ -406,10 +689,11 @@ Just respond with the phase name, nothing else."""
         if self.strategy_learner and self.current_battle_record is None:
             # Get party composition from memory if available
             party_comp = []
-            if self.memory_reader:
-                mem_state = self.memory_reader.read_game_state()
-                party_comp = [{"unit_id": u.unit_id, "hp": u.hp, "max_hp": u.max_hp} 
-                              for u in mem_state.units if u.max_hp > 0]
+            mem_state = self._memory_snapshot()
+            if mem_state:
+                table = mem_state.unit_table
+                party = table[table["max_hp"] > 0]
+                party_comp = [dict(zip(party.dtype.names, row)) for row in party.tolist()]
             
             self.current_battle_record = self.strategy_learner.start_battle(
                 map_name=f"Battle_{self.battle_count + 1}",  # Would get from screen
@@ -424,6 +708,16 @@ Just respond with the phase name, nothing else."""
             time.sleep(0.5)
             return
         
+        # Retrieved knowledge only depends on the map: fetch it once per battle,
+        # in the background so it overlaps the pre-visualization inputs
+        knowledge_context = self._knowledge_cache.get(state.map_name)
+        knowledge_future = None
+        if self.knowledge_retriever and knowledge_context is None:
+            battle_query = f"battle strategy {state.map_name}"
+            knowledge_future = self._context_pool.submit(
+                self.knowledge_retriever.get_knowledge_for_prompt, battle_query
+            )
+        
         # Pre-Visualization: Enter Move Mode to show Grid for Screenshot
         if self.config.use_vision:
             # 1. Enter Move Mode (Press A shows grid directly)
@@ -435,7 +729,7 @@ Just respond with the phase name, nothing else."""
             self.executor.execute(viz_inputs)
             
             # 2. Capture new frame with Grid visible
-            frame = self.capture.capture()
+            frame = self._capture()
             
             # 3. Reset state (Back to Menu)
             # Press B (Cancel) to back out of Move mode
@@ -445,28 +739,34 @@ Just respond with the phase name, nothing else."""
         # Build prompt and ask LLM
         prompt = build_prompt(state)
         
-        # Query knowledge base for relevant strategies (wiki + web)
-        knowledge_context = ""
-        if self.knowledge_retriever:
-            battle_query = f"battle strategy {state.map_name}"
-            knowledge_context = self.knowledge_retriever.get_knowledge_for_prompt(battle_query)
-            if knowledge_context:
-                prompt = knowledge_context + "\n\n" + prompt
-        
         # Add self-learned button knowledge (from visual feedback)
+        # Looked up here, not in the pool: the pre-visualization presses above
+        # write to the same store
+        learned_context = ""
         if self.feedback_learner:
             # Get learnings relevant to current phase
             phase_name = "battle_menu"  # or detect from OCR
             learned_context = self.feedback_learner.get_relevant_knowledge(
                 button="a", game_phase=phase_name, context="selecting action in battle"
             )
-            if learned_context:
-                prompt = prompt + "\n\n" + learned_context
+        
+        # Query knowledge base for relevant strategies (wiki + web)
+        if knowledge_future:
+            try:
+                knowledge_context = knowledge_future.result()
+                self._knowledge_cache[state.map_name] = knowledge_context
+            except Exception as e:
+                print(f"[Agent] Knowledge retrieval failed: {e}")
+        if knowledge_context:
+            prompt = knowledge_context + "\n\n" + prompt
+        
+        if learned_context:
+            prompt = prompt + "\n\n" + learned_context
         
         # Add live memory state (HP, MP, stats from GDB)
-        if self.memory_reader:
+        mem_state = self._memory_snapshot()
+        if mem_state:
             try:
-                mem_state = self.memory_reader.read_game_state()
                 memory_context = self.memory_reader.format_for_llm(mem_state)
                 if memory_context:
                     prompt = prompt + "\n\n" + memory_context
@@ -482,55 +782,84 @@ Just respond with the phase name, nothing else."""
         if self.config.log_prompts:
             print(f"=== Prompt ===\n{prompt}")
         
-        # Encode frame for Multimodal LLM if enabled
-        img_b64 = None
-        if self.config.use_vision:
-            import base64
-            import io
-            from PIL import Image
-            
-            # Convert numpy to PIL
-            pil_img = Image.fromarray(frame)
-            if pil_img.width > 1024:
-                pil_img.thumbnail((1024, 1024))
-                
-            buf = io.BytesIO()
-            pil_img.save(buf, format="JPEG", quality=80)
-            img_b64 = base64.b64encode(buf.getvalue()).decode('utf-8')
-        
-        response = self.llm.chat(prompt, SYSTEM_PROMPT, image_data=img_b64)
+        # Stream the reply (with the frame for Multimodal LLM if enabled) and
+        # execute as soon as ACTION/TARGET are complete; REASON keeps
+        # streaming in the meantime
+        image = self._frame_jpeg(frame, 1024, 80) if self.config.use_vision else None
+        chunks = []
+        parsed = None
+        stream = self.llm.chat_stream(prompt, SYSTEM_PROMPT, image_bytes=image)
+        try:
+            for delta in stream:
+                chunks.append(delta)
+                if parsed is None and ("\n" in delta or ":" in delta):
+                    partial = "".join(chunks)
+                    if action_fields_complete(partial):
+                        parsed = self._execute_battle_action(partial, state)
+                if not self.running:
+                    break  # Agent stopping: abandon the rest of the reply
+        finally:
+            stream.close()
+        response = "".join(chunks)
         
         if self.config.log_prompts:
             print(f"=== LLM Response ===\n{response}")
         
-        # Parse and execute action
+        if parsed is None:
+            parsed = self._execute_battle_action(response, state)
+        
+        # Let the action finish playing, then give the game up to think_time
+        # to react to its last input before the next tick captures
+        self._wait_for_inputs()
+        self._wait_for_screen_change(self._phase_hash(self._capture()), self.config.think_time)
+    
+    def _execute_battle_action(self, response: str, state: GameState):
+        """Parse an (at least ACTION/TARGET-complete) reply, play its inputs and log it."""
         parsed = parse_llm_response(response)
         current_pos = (state.current_unit.x, state.current_unit.y)
         inputs = action_to_inputs(parsed, current_pos)
         
-        print(f"Executing: {parsed.action} -> {parsed.target}")
-        self.executor.execute(inputs)
+        # One description serves both the console and the learning log
+        action_str = "%s -> %s" % (parsed.action, parsed.target)
+        print("Executing: " + action_str)
+        self._wait_for_inputs()
+        self._pending_inputs = self._input_pool.submit(self.executor.execute, inputs)
         
         # Log action for learning
         if self.strategy_learner and self.current_battle_record:
-            action_str = f"{parsed.action} -> {parsed.target}"
             self.strategy_learner.log_action(self.current_battle_record, action_str)
-        
-        time.sleep(self.config.think_time)
+        return parsed
+    
+    def _wait_for_screen_change(self, before_hash: int, timeout: float):
+        """Poll the screen until it differs from before_hash, for at most timeout seconds."""
+        deadline = time.monotonic() + timeout
+        while self.running and time.monotonic() < deadline:
+            frame_hash = self._phase_hash(self._capture())
+            if (frame_hash ^ before_hash).bit_count() > self.PHASE_MATCH_BITS:
+                return  # The game accepted the input and moved on
+            time.sleep(self.SCREEN_POLL_INTERVAL)
+    
+    def _wait_for_inputs(self):
+        """Block until the last submitted battle action has been played."""
+        pending, self._pending_inputs = self._pending_inputs, None
+        if pending is not None:
+            try:
+                pending.result()
+            except Exception as e:
+                print(f"[Agent] Input playback failed: {e}")
     
     def extract_battle_state(self, frame) -> GameState:
         """Extract battle state using Vision LLM."""
         # The LLM sees the full screen in handle_battle(), so we just need
         # to determine if it's our turn (command menu visible)
         
-        # For efficiency, we do a quick LLM check for turn status
-        
-        pil_img = Image.fromarray(frame)
-        if pil_img.width > 512:
-            pil_img.thumbnail((512, 512))
-        buf = io.BytesIO()
-        pil_img.save(buf, format="JPEG", quality=70)
-        img_b64 = base64.b64encode(buf.getvalue()).decode('utf-8')
+        # detect_phase() may already have answered this in its combined query, and
+        # the local classifier may know it; otherwise do a quick LLM check
+        is_our_turn, self._our_turn_hint = self._our_turn_hint, None
+        if is_our_turn is None:
+            prediction = self._classify_frame(frame)
+            if prediction is not None and prediction[0] is GamePhase.BATTLE:
+                is_our_turn = prediction[1]
         
         prompt = """Is this a player's turn in FFT? Look for:
 - Command menu visible (Move, Act, Wait, Status)
@@ -540,8 +869,9 @@ Just respond with the phase name, nothing else."""
 Respond with ONLY: YES or NO"""
 
         try:
-            response = self.llm.chat(prompt, image_data=img_b64)
-            is_our_turn = "YES" in response.upper()
+            if is_our_turn is None:
+                response = self.llm.chat_with_image_bytes(prompt, self._phase_jpeg(frame))
+                is_our_turn = "YES" in response.upper()
             
             if not is_our_turn:
                 return GameState(current_unit=None, valid_actions=[])
@@ -567,6 +897,7 @@ Respond with ONLY: YES or NO"""
         """Handle battle victory/defeat screen."""
         print("Battle ended!")
         self.battle_count += 1
+        self._knowledge_cache.clear()  # Next battle may be on a new map
         
         # Record battle outcome if learning is enabled
         if self.strategy_learner and self.current_battle_record:
@@ -576,12 +907,10 @@ Respond with ONLY: YES or NO"""
             
             # Count units lost from memory
             units_lost = 0
-            if self.memory_reader:
-                try:
-                    mem_state = self.memory_reader.read_game_state()
-                    units_lost = sum(1 for u in mem_state.units if u.max_hp > 0 and u.hp == 0)
-                except:
-                    pass
+            mem_state = self._memory_snapshot()
+            if mem_state:
+                table = mem_state.unit_table
+                units_lost = int(np.count_nonzero((table["max_hp"] > 0) & (table["hp"] == 0)))
             
             self.strategy_learner.end_battle(
                 self.current_battle_record, 
@@ -591,25 +920,20 @@ Respond with ONLY: YES or NO"""
             )
             self.current_battle_record = None
         
-        # Press A to advance through results
-        for _ in range(5):
-            self.controller.press_a()
-            time.sleep(0.3)
+        # Press A to advance through results (one pre-timed sequence)
+        self.controller.press_sequence(["a"] * 5, interval=0.3)
         
         # Auto-save if enabled
         if self.config.auto_save and self.battle_count % self.config.save_interval == 0:
             print(f"Auto-saving after {self.battle_count} battles...")
+        
+        # Don't re-detect the results screen while the presses are still playing
+        self.controller.wait_for_inputs()
     
     def _detect_battle_outcome(self) -> bool:
         """Use Vision LLM to detect if we won or lost the battle."""
         try:
-            frame = self.capture.capture()
-            pil_img = Image.fromarray(frame)
-            if pil_img.width > 512:
-                pil_img.thumbnail((512, 512))
-            buf = io.BytesIO()
-            pil_img.save(buf, format="JPEG", quality=70)
-            img_b64 = base64.b64encode(buf.getvalue()).decode('utf-8')
+            frame = self._capture()
             
             prompt = """Look at this Final Fantasy Tactics battle result screen.
 Did we WIN or LOSE the battle?
@@ -621,7 +945,7 @@ Look for:
 
 Respond with only: WIN or LOSE"""
 
-            response = self.llm.chat(prompt, image_data=img_b64)
+            response = self.llm.chat_with_image_bytes(prompt, self._frame_jpeg(frame, 512, 70))
             result = response.strip().upper()
             
             victory = "WIN" in result
@@ -647,7 +971,7 @@ Respond with only: WIN or LOSE"""
         REASON: <why>
         """
         
-        response = self.llm.chat(prompt, SYSTEM_PROMPT)
+        response = self.llm.chat(prompt, SYSTEM_PROMPT, cache=True)
         parsed = parse_llm_response(response)
         
         if self.config.verbose:
@@ -675,7 +999,7 @@ Respond with only: WIN or LOSE"""
         REASON: <why>
         """
         
-        response = self.llm.chat(prompt, SYSTEM_PROMPT)
+        response = self.llm.chat(prompt, SYSTEM_PROMPT, cache=True)
         parsed = parse_llm_response(response)
         
         if parsed.action == "exit":
@@ -2,12 +2,17 @@
 Memory Reader for Eden Emulator via GDB Stub.
 Reads game state (HP, MP, stats) directly from emulator memory.
 """
+import asyncio
 import socket
+import threading
+from collections import OrderedDict, deque
 from dataclasses import dataclass, field
-from typing import Optional, List, Dict
+from typing import Optional, List, Dict, Tuple
 
+import numpy as np
 
-@dataclass
+
+@dataclass(slots=True)
 class UnitStats:
     """Stats for a single unit in battle."""
     unit_id: int
@@ -35,10 +40,15 @@ class UnitStats:
     skill_fly: bool = False  # Walk in the sky
     
 
-@dataclass 
+# Structure-of-arrays view of the unit table, for vectorized filtering
+UNIT_DTYPE = np.dtype([("unit_id", "i4"), ("hp", "i4"), ("max_hp", "i4")])
+
+
+@dataclass(slots=True)
 class GameMemoryState:
     """Complete game state read from memory."""
     units: List[UnitStats] = field(default_factory=list)
+    unit_table: np.ndarray = field(default_factory=lambda: np.empty(0, UNIT_DTYPE))
     gil: int = 0
     connected: bool = False
     error: Optional[str] = None
@@ -72,6 +82,33 @@ OFFSETS = {
     "magic_ready": 0x1DD, # Note: 0x1DD seems far? 0x010475DD - 0x01047400 = 0x1DD. Correct.
 }
 
+# Width in bytes of each decoded unit field
+FIELD_SIZES = {
+    "brave": 1, "faith": 1, "speed": 1, "move_count": 1, "magic_ready": 1,
+    "hp": 2, "mp": 2, "max_hp": 2, "max_mp": 2, "attack": 2, "attack2": 2,
+    "max_moves": 2, "status_shield_1": 2, "status_shield_2": 2,
+    "skill_poaching": 2, "skill_xp_hp_move": 2, "skill_fly": 2,
+    "attack_power": 4,
+}
+
+# Every field sits in one window of the unit struct (0x7A..0x1DD), so a unit
+# is fetched with a single memory read instead of one round-trip per field
+UNIT_BLOCK_START = min(OFFSETS.values())
+UNIT_BLOCK_SIZE = max(OFFSETS[name] + FIELD_SIZES[name] for name in OFFSETS) - UNIT_BLOCK_START
+
+# Record layout of one stat window: every field at its offset, little-endian.
+# Concatenated windows decode with a single np.frombuffer.
+UNIT_BLOCK_DTYPE = np.dtype({
+    "names": list(OFFSETS),
+    "formats": [f"<u{FIELD_SIZES[name]}" for name in OFFSETS],
+    "offsets": [OFFSETS[name] - UNIT_BLOCK_START for name in OFFSETS],
+    "itemsize": UNIT_BLOCK_SIZE,
+})
+# UnitStats fields copied as integers / as flags (non-zero = set)
+INT_FIELDS = ("hp", "mp", "max_hp", "max_mp", "brave", "faith", "speed", "attack", "attack2",
+              "move_count", "max_moves", "status_shield_1", "status_shield_2")
+FLAG_FIELDS = ("skill_poaching", "skill_xp_hp_move", "skill_fly")
+
 # Generate addresses for all 5 units
 UNIT_ADDRESSES = {}
 for i in range(5):
@@ -86,6 +123,8 @@ RAMZA_ADDRESSES = {
     "job_id": 0x0104C4BA,
     "ability2_id": 0x0104C4BF,
 }
+RAMZA_BLOCK_START = min(RAMZA_ADDRESSES.values())
+RAMZA_BLOCK_SIZE = max(RAMZA_ADDRESSES.values()) + 1 - RAMZA_BLOCK_START
 
 # Job ID mappings
 JOB_NAMES = {
@@ -115,6 +154,60 @@ ABILITY_NAMES = {
 }
 
 
+# Two hex digits (either case) -> byte value
+_HEX_DIGITS = "0123456789abcdefABCDEF"
+HEX_BYTE = {hi + lo: int(hi + lo, 16) for hi in _HEX_DIGITS for lo in _HEX_DIGITS}
+
+
+class _AckTracker:
+    """
+    Matches the acks and replies of one pipelined batch to its packets.
+    
+    The stub answers each packet with '+' (accepted) or '-' (bad packet, send
+    it again), then replies to accepted packets in acceptance order, so a
+    retransmitted packet's reply can arrive after later ones. A reply with no
+    ack in front of it counts as the oldest packet's ack (stubs that skip acks).
+    """
+    
+    def __init__(self, count: int, max_retries: int):
+        self.replies: List[Optional[str]] = [None] * count
+        self.pending = count
+        self._unacked = deque(range(count))  # Sent, no '+'/'-' seen yet
+        self._accepted = deque()             # Acked, reply not seen yet
+        self._retries_left = max_retries * count
+    
+    def ack(self):
+        if self._unacked:
+            self._accepted.append(self._unacked.popleft())
+    
+    def nack(self) -> Optional[int]:
+        """Index of the packet the stub rejected (to resend), if any is unacked."""
+        if not self._unacked:
+            return None
+        self._spend_retry()
+        index = self._unacked.popleft()
+        self._unacked.append(index)
+        return index
+    
+    def reply(self, data: bytes, checksum: bytes) -> bool:
+        """Record a reply; False if its checksum is bad (answer '-' for a resend)."""
+        if checksum.lower() != GDBMemoryReader._checksum(data):
+            self._spend_retry()
+            return False
+        if not self._accepted:
+            self.ack()
+        if not self._accepted:
+            raise ConnectionError("Unexpected reply from GDB stub")
+        self.replies[self._accepted.popleft()] = data.decode('ascii', errors='ignore')
+        self.pending -= 1
+        return True
+    
+    def _spend_retry(self):
+        self._retries_left -= 1
+        if self._retries_left < 0:
+            raise ConnectionError("Too many retransmissions")
+
+
 class GDBMemoryReader:
     """
     Reads memory from Eden emulator via GDB Remote Serial Protocol.
@@ -125,19 +218,44 @@ class GDBMemoryReader:
     - Response is hex-encoded bytes
     """
     
+    READ_BUFFER_SIZE = 65536
+    # Retransmissions allowed per packet ('-' from the stub, or a corrupted reply)
+    MAX_RETRIES = 3
+    FORMAT_CACHE_SIZE = 8
+    
     def __init__(self, host: str = "127.0.0.1", port: int = 6543, timeout: float = 2.0):
         self.host = host
         self.port = port
         self.timeout = timeout
         self._socket: Optional[socket.socket] = None
+        # Buffered reader over the socket: replies are framed from its buffer,
+        # and bytes past the current reply stay there for the next one
+        self._rfile = None
         self._connected = False
+        # One request/response in flight at a time (poller thread + callers)
+        self._lock = threading.Lock()
+        # unit_id -> (raw stat window, raw Ramza block, decoded UnitStats):
+        # unchanged memory reuses the previous (never mutated) UnitStats
+        self._unit_cache: Dict[int, tuple] = {}
+        self._last_table: Optional[tuple] = None  # (units, unit_table)
+        # LRU of format_for_llm text keyed by the identities of the state's
+        # UnitStats (unchanged memory -> same objects); the value holds the
+        # units too, so their ids can't be reused while cached
+        self._format_cache: "OrderedDict[tuple, tuple]" = OrderedDict()
+    
+    @property
+    def is_connected(self) -> bool:
+        return self._connected
     
     def connect(self) -> bool:
         """Connect to Eden's GDB stub."""
         try:
             self._socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            # Packets are tiny request/response pairs: don't let Nagle hold them back
+            self._socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
             self._socket.settimeout(self.timeout)
             self._socket.connect((self.host, self.port))
+            self._rfile = self._socket.makefile('rb', buffering=self.READ_BUFFER_SIZE)
             self._connected = True
             print(f"[MemoryReader] Connected to GDB stub at {self.host}:{self.port}")
             return True
@@ -148,56 +266,168 @@ class GDBMemoryReader:
     
     def disconnect(self):
         """Disconnect from GDB stub."""
+        if self._rfile:
+            try:
+                self._rfile.close()
+            except:
+                pass
         if self._socket:
             try:
                 self._socket.close()
             except:
                 pass
+        self._rfile = None
         self._socket = None
         self._connected = False
     
-    def _checksum(self, data: str) -> str:
-        """Calculate GDB packet checksum."""
-        return f"{sum(ord(c) for c in data) % 256:02x}"
+    @staticmethod
+    def _checksum(data: bytes) -> bytes:
+        """Calculate GDB packet checksum (two hex digits)."""
+        return b"%02x" % (sum(data) & 0xFF)
+    
+    @classmethod
+    def _packet(cls, command: str) -> bytes:
+        """Frame a command as $<command>#<checksum>."""
+        body = command.encode('ascii')
+        return b"$" + body + b"#" + cls._checksum(body)
     
     def _send_packet(self, command: str) -> Optional[str]:
         """Send a GDB packet and receive response."""
+        return self._send_framed(self._packet(command))
+    
+    def _send_framed(self, packet: bytes) -> Optional[str]:
+        """Send an already framed packet and receive response."""
         if not self._socket or not self._connected:
             return None
         
-        # Build packet: $<command>#<checksum>
-        packet = f"${command}#{self._checksum(command)}"
-        
+        with self._lock:
+            return self._exchange(packet)
+    
+    def _exchange(self, packet: bytes) -> Optional[str]:
+        """Send one packet and read its reply (caller holds the lock)."""
         try:
-            self._socket.sendall(packet.encode('ascii'))
-            
-            # Receive response
-            response = b""
-            while True:
-                chunk = self._socket.recv(1024)
-                if not chunk:
-                    break
-                response += chunk
-                # GDB responses end with #XX
-                if b"#" in response and len(response) >= response.index(b"#") + 3:
-                    break
-            
-            # Parse response: +$<data>#<checksum>
-            resp_str = response.decode('ascii', errors='ignore')
-            if '$' in resp_str and '#' in resp_str:
-                start = resp_str.index('$') + 1
-                end = resp_str.rindex('#')
-                return resp_str[start:end]
-            
-            return resp_str
-            
+            self._socket.sendall(packet)
+            return self._recv_replies([packet])[0]
         except socket.timeout:
             print("[MemoryReader] Timeout waiting for response")
+            # A timed-out buffered reader is in an undefined state (and the
+            # late reply would be paired with the next request): reconnect
+            self._connected = False
             return None
         except Exception as e:
             print(f"[MemoryReader] Send error: {e}")
+            self._connected = False  # Socket is unusable; reconnect on next read
             return None
     
+    @staticmethod
+    def _read_command(address: int, size: int) -> str:
+        # GDB read memory command: m<addr>,<len> (both hex)
+        return f"m{address:x},{size:x}"
+    
+    @classmethod
+    def _read_packet(cls, address: int, size: int) -> bytes:
+        """Framed 'm' packet, prebuilt for the fixed game addresses."""
+        packet = PREBUILT_PACKETS.get((address, size))
+        if packet is None:
+            packet = cls._packet(cls._read_command(address, size))
+        return packet
+    
+    @staticmethod
+    def _decode_read(response: Optional[str], size: int) -> Optional[bytes]:
+        """Raw bytes from an 'm' reply, or None for an error/short reply."""
+        # Errors come back as "Exx"; data is 2 hex chars per byte
+        is_error = len(response or "") == 3 and response[0] == "E"
+        if response and not is_error and len(response) >= size * 2:
+            try:
+                return bytes.fromhex(response[:size * 2])
+            except ValueError:
+                pass
+        return None
+    
+    @classmethod
+    def _decode_int(cls, response: Optional[str], size: int) -> Optional[int]:
+        """Little-endian (ARM) integer from an 'm' reply, or None for an error/short reply."""
+        if size not in (1, 2):
+            data = cls._decode_read(response, size)
+            return None if data is None else int.from_bytes(data, byteorder='little')
+        # 1/2-byte reads (most fields): look the hex digit pairs up directly
+        # instead of going through a bytes object
+        if not response or len(response) < size * 2 or (len(response) == 3 and response[0] == "E"):
+            return None
+        low = HEX_BYTE.get(response[:2])
+        if size == 1 or low is None:
+            return low
+        high = HEX_BYTE.get(response[2:4])
+        return None if high is None else low | (high << 8)
+    
+    def _send_packets(self, commands: List[str]) -> List[Optional[str]]:
+        """
+        Pipeline several packets: one sendall for all of them, then read the
+        replies in order (the stub answers packets in the order received).
+        Failed exchanges yield None for every command.
+        """
+        return self._send_batch([self._packet(command) for command in commands])
+    
+    def _send_batch(self, packets: List[bytes], payload: Optional[bytes] = None) -> List[Optional[str]]:
+        """_send_packets for already framed packets (`payload`: them pre-joined)."""
+        count = len(packets)
+        if not self._socket or not self._connected:
+            return [None] * count
+        
+        with self._lock:
+            try:
+                self._socket.sendall(payload or b"".join(packets))
+                return self._recv_replies(packets)
+            except socket.timeout:
+                print("[MemoryReader] Timeout waiting for pipelined responses")
+            except Exception as e:
+                print(f"[MemoryReader] Send error: {e}")
+            # Replies may still be in flight: drop the connection rather than
+            # risk pairing them with the next request
+            self._connected = False
+            return [None] * count
+    
+    def _read_until(self, delim: bytes) -> bytes:
+        """Read up to and including `delim` from the buffered reader."""
+        out = bytearray()
+        while True:
+            # peek() returns what is buffered (one recv when empty) without consuming it
+            chunk = self._rfile.peek(1)
+            if not chunk:
+                raise ConnectionError("GDB stub closed the connection")
+            idx = chunk.find(delim)
+            if idx >= 0:
+                out += self._rfile.read(idx + 1)
+                return bytes(out)
+            out += self._rfile.read(len(chunk))
+    
+    def _recv_replies(self, packets: List[bytes]) -> List[str]:
+        """
+        Read the $<data>#XX reply to each sent packet. Follows the ack protocol:
+        resends packets the stub answers with '-', and acks each reply with '+'
+        (or '-' when its checksum is wrong, so the stub sends it again).
+        """
+        tracker = _AckTracker(len(packets), self.MAX_RETRIES)
+        while tracker.pending:
+            token = self._rfile.read(1)
+            if not token:
+                raise ConnectionError("GDB stub closed the connection")
+            if token == b"+":
+                tracker.ack()
+            elif token == b"-":
+                index = tracker.nack()
+                if index is not None:
+                    self._socket.sendall(packets[index])
+            elif token == b"$":
+                data = self._read_until(b"#")[:-1]
+                ok = tracker.reply(data, self._rfile.read(2))
+                self._socket.sendall(b"+" if ok else b"-")
+        return tracker.replies
+    
+    def read_memory_block(self, address: int, size: int) -> Optional[bytes]:
+        """Read `size` raw bytes at address with a single 'm' packet (None on failure)."""
+        return self._decode_read(self._send_framed(self._read_packet(address, size)), size)
+    
     def read_memory(self, address: int, size: int = 4) -> Optional[int]:
         """
         Read memory at address.
@@ -209,24 +439,7 @@ class GDBMemoryReader:
         Returns:
             Integer value at address, or None on failure
         """
-        # GDB read memory command: m<addr>,<len>
-        command = f"m{address:x},{size}"
-        response = self._send_packet(command)
-        
-        if response and response != "E00" and len(response) >= size * 2:
-            try:
-                # Response is hex-encoded bytes (little-endian on ARM)
-                hex_bytes = response[:size * 2]
-                # Convert from little-endian hex
-                value = int.from_bytes(
-                    bytes.fromhex(hex_bytes), 
-                    byteorder='little'
-                )
-                return value
-            except ValueError:
-                pass
-        
-        return None
+        return self._decode_int(self._send_framed(self._read_packet(address, size)), size)
     
     def write_memory(self, address: int, value: int, size: int = 4) -> bool:
         """
@@ -240,18 +453,30 @@ class GDBMemoryReader:
         Returns:
             True if write succeeded, False otherwise
         """
-        # Convert value to little-endian hex string
-        value_bytes = value.to_bytes(size, byteorder='little')
-        hex_data = value_bytes.hex()
-        
-        # GDB write memory command: M<addr>,<len>:<hex_data>
-        command = f"M{address:x},{size}:{hex_data}"
-        response = self._send_packet(command)
-        
+        response = self._send_packet(self._write_command(address, value, size))
+        self.on_write(address)
+        return self._write_ok(address, response)
+    
+    def write_memory_batch(self, writes: List[Tuple[int, int, int]]) -> List[bool]:
+        """
+        Pipeline several writes: (address, value, size) each, one sendall for
+        all packets. Returns per-write success, in order.
+        """
+        responses = self._send_packets([self._write_command(*write) for write in writes])
+        for address, _, _ in writes:
+            self.on_write(address)
+        return [self._write_ok(address, response) for (address, _, _), response in zip(writes, responses)]
+    
+    @staticmethod
+    def _write_command(address: int, value: int, size: int) -> str:
+        # GDB write memory command: M<addr>,<len>:<hex_data> (value little-endian)
+        return f"M{address:x},{size}:{value.to_bytes(size, byteorder='little').hex()}"
+    
+    @staticmethod
+    def _write_ok(address: int, response: Optional[str]) -> bool:
         # "OK" means success
         if response and response.upper() == "OK":
             return True
-        
         print(f"[MemoryReader] Write failed at {address:#x}: {response}")
         return False
 
@@ -261,109 +486,76 @@ class GDBMemoryReader:
         if unit_id not in UNIT_ADDRESSES:
             return None
         
-        addrs = UNIT_ADDRESSES[unit_id]
-        stats = UnitStats(unit_id=unit_id)
-        
-        # Read each stat
-        if "hp" in addrs:
-            val = self.read_memory(addrs["hp"], 2)
-            if val is not None:
-                stats.hp = val & 0xFFFF  # Lower 16 bits
-        
-        if "mp" in addrs:
-            val = self.read_memory(addrs["mp"], 2)
-            if val is not None:
-                stats.mp = val & 0xFFFF
-        
-        if "max_hp" in addrs:
-            val = self.read_memory(addrs["max_hp"], 2)
-            if val is not None:
-                stats.max_hp = val & 0xFFFF
-        
-        if "max_mp" in addrs:
-            val = self.read_memory(addrs["max_mp"], 2)
-            if val is not None:
-                stats.max_mp = val & 0xFFFF
-        
-        if "brave" in addrs:
-            val = self.read_memory(addrs["brave"], 1)
-            if val is not None:
-                stats.brave = val
-        
-        if "faith" in addrs:
-            val = self.read_memory(addrs["faith"], 1)
-            if val is not None:
-                stats.faith = val
-        
-        if "speed" in addrs:
-            val = self.read_memory(addrs["speed"], 1)
-            if val is not None:
-                stats.speed = val
-        
-        if "attack" in addrs:
-            val = self.read_memory(addrs["attack"], 2)
-            if val is not None:
-                stats.attack = val
-        
-        if "attack2" in addrs:
-            val = self.read_memory(addrs["attack2"], 2)
-            if val is not None:
-                stats.attack2 = val
-        
-        if "move_count" in addrs:
-            val = self.read_memory(addrs["move_count"], 1)
-            if val is not None:
-                stats.move_count = val
-        
-        if "max_moves" in addrs:
-            val = self.read_memory(addrs["max_moves"], 2)
-            if val is not None:
-                stats.max_moves = val
-        
-        # Status shields (bitfields)
-        if "status_shield_1" in addrs:
-            val = self.read_memory(addrs["status_shield_1"], 2)
-            if val is not None:
-                stats.status_shield_1 = val
-        
-        if "status_shield_2" in addrs:
-            val = self.read_memory(addrs["status_shield_2"], 2)
-            if val is not None:
-                stats.status_shield_2 = val
-        
-        # Magic ready
-        if "magic_ready" in addrs:
-            val = self.read_memory(addrs["magic_ready"], 1)
-            if val is not None:
-                stats.magic_ready = val == 1
-        
-        # Skills (check if enabled)
-        if "skill_poaching" in addrs:
-            val = self.read_memory(addrs["skill_poaching"], 2)
-            if val is not None:
-                stats.skill_poaching = val != 0
-        
-        if "skill_xp_hp_move" in addrs:
-            val = self.read_memory(addrs["skill_xp_hp_move"], 2)
-            if val is not None:
-                stats.skill_xp_hp_move = val != 0
-        
-        if "skill_fly" in addrs:
-            val = self.read_memory(addrs["skill_fly"], 2)
-            if val is not None:
-                stats.skill_fly = val != 0
-        
-        # Ramza-specific: Job and Ability2 (only for unit 1)
-        if unit_id == 1:
-            job_val = self.read_memory(RAMZA_ADDRESSES["job_id"], 1)
-            if job_val is not None:
-                stats.job_id = job_val
-            
-            ability_val = self.read_memory(RAMZA_ADDRESSES["ability2_id"], 1)
-            if ability_val is not None:
-                stats.ability2_id = ability_val
-        
-        return stats
+        # One 'm' packet for the whole stat window, decoded locally
+        buf = self.read_memory_block(self._unit_block_address(unit_id), UNIT_BLOCK_SIZE)
+        # Ramza-specific: Job and Ability2 (only for unit 1), one small block
+        ramza = self.read_memory_block(RAMZA_BLOCK_START, RAMZA_BLOCK_SIZE) if unit_id == 1 else None
+        return self._cached_unit(unit_id, buf, ramza)
+    
+    @staticmethod
+    def _unit_block_address(unit_id: int) -> int:
+        return UNIT_BASE_ADDR + (unit_id - 1) * UNIT_OFFSET + UNIT_BLOCK_START
+    
+    def _cached_unit(self, unit_id: int, buf: Optional[bytes], ramza: Optional[bytes]) -> UnitStats:
+        """Decode a unit, or return the last UnitStats if its raw bytes are unchanged."""
+        return self._cached_units([unit_id], [buf], [ramza])[0]
+    
+    def _cached_units(self, unit_ids: List[int], bufs: List[Optional[bytes]],
+                      ramzas: List[Optional[bytes]]) -> List[UnitStats]:
+        """_cached_unit for several units; the changed ones are decoded in one batch."""
+        results: List[Optional[UnitStats]] = [None] * len(unit_ids)
+        misses = []
+        for i, (unit_id, buf, ramza) in enumerate(zip(unit_ids, bufs, ramzas)):
+            cached = self._unit_cache.get(unit_id)
+            if buf is not None and cached and cached[0] == buf and cached[1] == ramza:
+                results[i] = cached[2]
+            else:
+                misses.append(i)
+        
+        if misses:
+            decoded = self._decode_units([unit_ids[i] for i in misses], [bufs[i] for i in misses],
+                                         [ramzas[i] for i in misses])
+            for i, stats in zip(misses, decoded):
+                results[i] = stats
+                if bufs[i] is not None:
+                    self._unit_cache[unit_ids[i]] = (bufs[i], ramzas[i], stats)
+        return results
+    
+    def on_write(self, address: int):
+        """Forget the cached decode of the unit whose memory was just written."""
+        for unit_id in list(self._unit_cache):
+            start = self._unit_block_address(unit_id)
+            if start <= address < start + UNIT_BLOCK_SIZE:
+                del self._unit_cache[unit_id]
+        if RAMZA_BLOCK_START <= address < RAMZA_BLOCK_START + RAMZA_BLOCK_SIZE:
+            self._unit_cache.pop(1, None)
+    
+    @staticmethod
+    def _decode_units(unit_ids: List[int], bufs: List[Optional[bytes]],
+                      ramzas: List[Optional[bytes]]) -> List[UnitStats]:
+        """
+        UnitStats from each unit's stat window (and Ramza's job block); missing
+        blocks stay zero. All present windows are decoded as one record array.
+        """
+        present = [i for i, buf in enumerate(bufs) if buf is not None]
+        fields: List[dict] = [{} for _ in unit_ids]
+        
+        if present:
+            table = np.frombuffer(b"".join(bufs[i] for i in present), dtype=UNIT_BLOCK_DTYPE)
+            columns = {name: table[name].tolist() for name in INT_FIELDS}
+            columns["magic_ready"] = (table["magic_ready"] == 1).tolist()
+            for name in FLAG_FIELDS:
+                columns[name] = (table[name] != 0).tolist()
+            for row, i in enumerate(present):
+                fields[i] = {name: column[row] for name, column in columns.items()}
+        
+        units = []
+        for unit_id, ramza, values in zip(unit_ids, ramzas, fields):
+            if ramza is not None:
+                values["job_id"] = ramza[RAMZA_ADDRESSES["job_id"] - RAMZA_BLOCK_START]
+                values["ability2_id"] = ramza[RAMZA_ADDRESSES["ability2_id"] - RAMZA_BLOCK_START]
+            units.append(UnitStats(unit_id=unit_id, **values))
+        return units
     
     def read_game_state(self) -> GameMemoryState:
         """Read complete game state from memory."""
@@ -375,23 +567,56 @@ class GDBMemoryReader:
                 return state
         
         state.connected = True
-        
-        # Read all 5 units
-        for unit_id in range(1, 6):
-            unit = self.read_unit_stats(unit_id)
-            if unit:
-                state.units.append(unit)
-        
+        self._parse_state(state, self._send_batch(STATE_PACKETS, STATE_PAYLOAD))
         return state
     
+    @classmethod
+    def _state_commands(cls) -> List[str]:
+        """The read_game_state batch: 5 unit windows, then Ramza's job block."""
+        commands = [cls._read_command(cls._unit_block_address(u), UNIT_BLOCK_SIZE) for u in UNIT_ADDRESSES]
+        commands.append(cls._read_command(RAMZA_BLOCK_START, RAMZA_BLOCK_SIZE))
+        return commands
+    
+    def _parse_state(self, state: GameMemoryState, replies: List[Optional[str]]):
+        """Fill `state` from the replies to _state_commands()."""
+        unit_ids = list(UNIT_ADDRESSES)
+        ramza = self._decode_read(replies[len(unit_ids)], RAMZA_BLOCK_SIZE)
+        bufs = [self._decode_read(reply, UNIT_BLOCK_SIZE) for reply in replies[:len(unit_ids)]]
+        ramzas = [ramza if unit_id == 1 else None for unit_id in unit_ids]
+        state.units = self._cached_units(unit_ids, bufs, ramzas)
+        
+        # Same UnitStats objects as last time: the table is unchanged too
+        last = self._last_table
+        if last and len(last[0]) == len(state.units) and all(a is b for a, b in zip(last[0], state.units)):
+            state.unit_table = last[1]
+        else:
+            state.unit_table = np.array(
+                [(u.unit_id, u.hp, u.max_hp) for u in state.units], dtype=UNIT_DTYPE
+            )
+            self._last_table = (state.units, state.unit_table)
+    
     def format_for_llm(self, state: GameMemoryState) -> str:
         """Format game state as text for LLM prompt."""
         if not state.connected:
             return f"[Memory Read Failed: {state.error or 'Not connected'}]"
         
+        key = tuple(map(id, state.units))
+        cached = self._format_cache.get(key)
+        if cached is not None:
+            self._format_cache.move_to_end(key)
+            return cached[1]
+        
+        text = self._format_units(state.units)
+        self._format_cache[key] = (state.units, text)
+        if len(self._format_cache) > self.FORMAT_CACHE_SIZE:
+            self._format_cache.popitem(last=False)
+        return text
+    
+    @staticmethod
+    def _format_units(units: List[UnitStats]) -> str:
         lines = ["## Live Game State (from memory)"]
         
-        for unit in state.units:
+        for unit in units:
             if unit.hp > 0 or unit.max_hp > 0:  # Only show units with data
                 unit_label = f"Unit {unit.unit_id}"
                 if unit.unit_id == 1:
@@ -449,6 +674,219 @@ class GDBMemoryReader:
         return "\n".join(lines)
 
 
+# Framed 'm' packets for every fixed (address, size) read, built once at import:
+# each unit's stat window and single fields, Ramza's block and fields
+_FIXED_READS = [(GDBMemoryReader._unit_block_address(unit_id), UNIT_BLOCK_SIZE) for unit_id in UNIT_ADDRESSES]
+_FIXED_READS += [(addr, FIELD_SIZES[name]) for addresses in UNIT_ADDRESSES.values() for name, addr in addresses.items()]
+_FIXED_READS.append((RAMZA_BLOCK_START, RAMZA_BLOCK_SIZE))
+_FIXED_READS += [(addr, 1) for addr in RAMZA_ADDRESSES.values()]
+PREBUILT_PACKETS: Dict[tuple, bytes] = {
+    key: GDBMemoryReader._packet(GDBMemoryReader._read_command(*key)) for key in _FIXED_READS
+}
+
+# The whole read_game_state batch, framed and concatenated
+STATE_PACKETS = [GDBMemoryReader._packet(command) for command in GDBMemoryReader._state_commands()]
+STATE_PAYLOAD = b"".join(STATE_PACKETS)
+
+
+class MemoryPoller(threading.Thread):
+    """
+    Background thread that keeps the latest GameMemoryState.
+    
+    Each poll builds a fresh state object and publishes it with a single
+    attribute assignment, so readers get a consistent snapshot without
+    waiting on the GDB stub. Reconnects with exponential backoff.
+    """
+    
+    MAX_BACKOFF = 30.0
+    
+    def __init__(self, reader: GDBMemoryReader, interval: float = 0.2):
+        super().__init__(name="memory-poller", daemon=True)
+        self.reader = reader
+        self.interval = interval
+        self.latest: Optional[GameMemoryState] = None
+        self._stop_event = threading.Event()
+    
+    def run(self):
+        backoff = 0.0
+        while not self._stop_event.is_set():
+            try:
+                state = self.reader.read_game_state()
+            except Exception as e:
+                state = GameMemoryState(error=str(e))
+            
+            if state.connected and self.reader.is_connected:
+                self.latest = state
+                backoff = 0.0
+                delay = self.interval
+            else:
+                self.reader.disconnect()
+                backoff = min(max(backoff * 2, 1.0), self.MAX_BACKOFF)
+                delay = backoff
+            self._stop_event.wait(delay)
+    
+    def stop(self):
+        self._stop_event.set()
+
+
+class AsyncGDBMemoryReader:
+    """
+    asyncio variant of GDBMemoryReader for callers running an event loop.
+    
+    Same protocol, decoding and unit cache (through a never-connected
+    GDBMemoryReader); the I/O methods are coroutines, so waiting on the stub
+    overlaps other awaited work (OCR, LLM requests) instead of blocking the
+    thread. Not a GDBMemoryReader: sync callers (MemoryPoller, PowerManager)
+    can't be handed one by mistake.
+    """
+    
+    MAX_RETRIES = GDBMemoryReader.MAX_RETRIES
+    READ_BUFFER_SIZE = GDBMemoryReader.READ_BUFFER_SIZE
+    
+    def __init__(self, host: str = "127.0.0.1", port: int = 6543, timeout: float = 2.0):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self._connected = False
+        # Decoding, unit cache and LLM formatting; never opens a socket
+        self._codec = GDBMemoryReader(host=host, port=port, timeout=timeout)
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        # One batch in flight at a time; replies are matched by order
+        self._async_lock = asyncio.Lock()
+    
+    async def connect(self) -> bool:
+        """Connect to Eden's GDB stub."""
+        try:
+            self._reader, self._writer = await asyncio.wait_for(
+                asyncio.open_connection(self.host, self.port, limit=self.READ_BUFFER_SIZE),
+                self.timeout,
+            )
+            sock = self._writer.get_extra_info('socket')
+            if sock is not None:
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            self._connected = True
+            print(f"[MemoryReader] Connected to GDB stub at {self.host}:{self.port} (async)")
+            return True
+        except Exception as e:
+            print(f"[MemoryReader] Connection failed: {e}")
+            self._connected = False
+            return False
+    
+    async def disconnect(self):
+        """Disconnect from GDB stub."""
+        if self._writer:
+            try:
+                self._writer.close()
+                await self._writer.wait_closed()
+            except:
+                pass
+        self._reader = None
+        self._writer = None
+        self._connected = False
+    
+    def is_connected(self) -> bool:
+        return self._connected
+    
+    async def _send_packet(self, command: str) -> Optional[str]:
+        """Send a GDB packet and receive response."""
+        return (await self._send_batch([GDBMemoryReader._packet(command)]))[0]
+    
+    async def _send_framed(self, packet: bytes) -> Optional[str]:
+        """Send an already framed packet and receive response."""
+        return (await self._send_batch([packet]))[0]
+    
+    async def _send_packets(self, commands: List[str]) -> List[Optional[str]]:
+        """Pipelined send of all packets, then their replies in order (None for all on failure)."""
+        return await self._send_batch([GDBMemoryReader._packet(command) for command in commands])
+    
+    async def _send_batch(self, packets: List[bytes], payload: Optional[bytes] = None) -> List[Optional[str]]:
+        """_send_packets for already framed packets (`payload`: them pre-joined)."""
+        count = len(packets)
+        if not self._writer or not self._connected:
+            return [None] * count
+        
+        async with self._async_lock:
+            try:
+                self._writer.write(payload or b"".join(packets))
+                await self._writer.drain()
+                return await asyncio.wait_for(self._recv_replies(packets), self.timeout)
+            except asyncio.TimeoutError:
+                print("[MemoryReader] Timeout waiting for response")
+            except Exception as e:
+                print(f"[MemoryReader] Send error: {e}")
+            # Late replies would be paired with the next request: reconnect
+            self._connected = False
+            return [None] * count
+    
+    async def _recv_replies(self, packets: List[bytes]) -> List[str]:
+        """Read each packet's reply, following the ack protocol (see GDBMemoryReader)."""
+        tracker = _AckTracker(len(packets), self.MAX_RETRIES)
+        while tracker.pending:
+            token = await self._reader.readexactly(1)
+            if token == b"+":
+                tracker.ack()
+            elif token == b"-":
+                index = tracker.nack()
+                if index is not None:
+                    self._writer.write(packets[index])
+            elif token == b"$":
+                data = (await self._reader.readuntil(b"#"))[:-1]
+                ok = tracker.reply(data, await self._reader.readexactly(2))
+                self._writer.write(b"+" if ok else b"-")
+        return tracker.replies
+    
+    async def read_memory_block(self, address: int, size: int) -> Optional[bytes]:
+        """Read `size` raw bytes at address with a single 'm' packet (None on failure)."""
+        return GDBMemoryReader._decode_read(await self._send_framed(GDBMemoryReader._read_packet(address, size)), size)
+    
+    async def read_memory(self, address: int, size: int = 4) -> Optional[int]:
+        """Read a little-endian integer at address (None on failure)."""
+        return GDBMemoryReader._decode_int(await self._send_framed(GDBMemoryReader._read_packet(address, size)), size)
+    
+    async def write_memory(self, address: int, value: int, size: int = 4) -> bool:
+        """Write value to memory at address; True if the stub answered OK."""
+        response = await self._send_packet(GDBMemoryReader._write_command(address, value, size))
+        self._codec.on_write(address)
+        return GDBMemoryReader._write_ok(address, response)
+    
+    async def write_memory_batch(self, writes: List[Tuple[int, int, int]]) -> List[bool]:
+        """Pipelined (address, value, size) writes; per-write success, in order."""
+        responses = await self._send_packets([GDBMemoryReader._write_command(*write) for write in writes])
+        for address, _, _ in writes:
+            self._codec.on_write(address)
+        return [GDBMemoryReader._write_ok(address, response) for (address, _, _), response in zip(writes, responses)]
+    
+    async def read_unit_stats(self, unit_id: int) -> Optional[UnitStats]:
+        """Read stats for a specific unit."""
+        if unit_id not in UNIT_ADDRESSES:
+            return None
+        packets = [GDBMemoryReader._read_packet(GDBMemoryReader._unit_block_address(unit_id), UNIT_BLOCK_SIZE)]
+        if unit_id == 1:
+            packets.append(GDBMemoryReader._read_packet(RAMZA_BLOCK_START, RAMZA_BLOCK_SIZE))
+        replies = await self._send_batch(packets)
+        buf = GDBMemoryReader._decode_read(replies[0], UNIT_BLOCK_SIZE)
+        ramza = GDBMemoryReader._decode_read(replies[1], RAMZA_BLOCK_SIZE) if unit_id == 1 else None
+        return self._codec._cached_unit(unit_id, buf, ramza)
+    
+    async def read_game_state(self) -> GameMemoryState:
+        """Read complete game state from memory (one pipelined batch)."""
+        state = GameMemoryState()
+        
+        if not self._connected:
+            if not await self.connect():
+                state.error = "Failed to connect to GDB stub"
+                return state
+        
+        state.connected = True
+        self._codec._parse_state(state, await self._send_batch(STATE_PACKETS, STATE_PAYLOAD))
+        return state
+    
+    def format_for_llm(self, state: GameMemoryState) -> str:
+        """Format game state as text for LLM prompt."""
+        return self._codec.format_for_llm(state)
+
+
 # Singleton instance for easy access
 _reader: Optional[GDBMemoryReader] = None
 
@@ -1,7 +1,9 @@
 """
 OCR Engine for extracting text/numbers from FFT UI.
 """
+import asyncio
 import re
+import threading
 from typing import Dict, Optional, List, Tuple
 
 try:
@@ -11,50 +13,239 @@ except ImportError:
     Image = None
     np = None
 
+try:
+    import cv2
+except ImportError:
+    cv2 = None
+
 try:
     import pytesseract
 except ImportError:
     pytesseract = None
 
+try:
+    import tesserocr  # libtesseract bindings: one long-lived engine, no process per call
+except ImportError:
+    tesserocr = None
+
+try:
+    from numba import njit, prange
+    HAS_NUMBA = True
+except ImportError:
+    HAS_NUMBA = False
+
+
+# OCR parsing patterns, compiled once
+_NUM_RE = re.compile(r'\d+')
+# "HP 153/153", "HP: 153", "MP ae (24/24" -> label, non-digits (lazy), number
+_STAT_RE = {
+    label: re.compile(rf'{label}\D*?(\d+)', re.IGNORECASE)
+    for label in ('HP', 'MP', 'CT')
+}
+# Max value after the slash: label, non-digits, number, non-digits (inc slash), number
+_MAX_STAT_RE = {
+    label: re.compile(rf'{label}\D*?\d+\D*?/\D*?(\d+)', re.IGNORECASE)
+    for label in ('HP', 'MP')
+}
+# 'HP: 150' style patterns for extract_labeled_value, compiled per label on first use
+_LABEL_RE: Dict[str, "re.Pattern"] = {}
+
+
+def _label_pattern(label: str) -> "re.Pattern":
+    pattern = _LABEL_RE.get(label)
+    if pattern is None:
+        pattern = _LABEL_RE[label] = re.compile(rf'{label}\s*[:\-]?\s*(\d+)', re.IGNORECASE)
+    return pattern
+
+
+# OpenCV's fixed-point RGB2GRAY weights (Q15), so every binarize path sees the same gray
+_GRAY_R, _GRAY_G, _GRAY_B, _GRAY_SHIFT = 9798, 19235, 3735, 15
+_FLT_EPSILON = 1.1920929e-07
+
+
+def _otsu_threshold(hist):
+    """
+    Otsu threshold of a 256-bin gray histogram, step for step as OpenCV's
+    THRESH_OTSU computes it (pixels > threshold become white).
+    """
+    total = 0.0
+    mu = 0.0
+    for i in range(256):
+        total += hist[i]
+        mu += i * float(hist[i])
+    if total == 0:
+        return 0
+    scale = 1.0 / total
+    mu *= scale
+    mu1 = 0.0
+    q1 = 0.0
+    max_sigma = 0.0
+    max_val = 0
+    for i in range(256):
+        p_i = hist[i] * scale
+        mu1 *= q1
+        q1 += p_i
+        q2 = 1.0 - q1
+        if min(q1, q2) < _FLT_EPSILON or max(q1, q2) > 1.0 - _FLT_EPSILON:
+            continue
+        mu1 = (mu1 + i * p_i) / q1
+        mu2 = (mu - q1 * mu1) / q2
+        sigma = q1 * q2 * (mu1 - mu2) * (mu1 - mu2)
+        if sigma > max_sigma:
+            max_sigma = sigma
+            max_val = i
+    return max_val
+
+
+if HAS_NUMBA:
+    _otsu_threshold_jit = njit(cache=True)(_otsu_threshold)
+
+    @njit(cache=True, parallel=True)
+    def _tile_regions(frame, regions, tops, out):
+        """
+        Binarize each (x, y, w, h) region of an RGB frame into its row band of
+        `out` (starting at tops[i]), with the same gray + per-region Otsu rule
+        as OCREngine._binarize.
+        """
+        for r in range(regions.shape[0]):
+            x, y, w, h = regions[r, 0], regions[r, 1], regions[r, 2], regions[r, 3]
+            if w <= 0 or h <= 0:
+                continue
+            top = tops[r]
+            for i in prange(h):
+                for j in range(w):
+                    px = frame[y + i, x + j]
+                    out[top + i, j] = (np.int32(px[0]) * _GRAY_R + np.int32(px[1]) * _GRAY_G
+                                       + np.int32(px[2]) * _GRAY_B
+                                       + (1 << (_GRAY_SHIFT - 1))) >> _GRAY_SHIFT
+            hist = np.zeros(256, dtype=np.int64)
+            for i in range(h):
+                for j in range(w):
+                    hist[out[top + i, j]] += 1
+            threshold = _otsu_threshold_jit(hist)
+            for i in prange(h):
+                for j in range(w):
+                    out[top + i, j] = 255 if out[top + i, j] > threshold else 0
+
 
 class OCREngine:
     """
     Extract text and numbers from game screen.
     Uses Tesseract OCR (pytesseract).
     """
+
+    # Tesseract configs: uniform text block, restricted charset
+    NUMBER_CONFIG = '--psm 6 -c tessedit_char_whitelist=0123456789/'
+    STAT_CONFIG = '--psm 6 -c tessedit_char_whitelist=0123456789HPMCT:/'
     
     def __init__(self):
-        if pytesseract is None:
-            raise ImportError("pytesseract required: pip install pytesseract")
+        if pytesseract is None and tesserocr is None:
+            raise ImportError("pytesseract required: pip install pytesseract (or tesserocr)")
         if Image is None:
             raise ImportError("Pillow required: pip install pillow")
+        
+        # With tesserocr, one engine is kept for the process lifetime so the
+        # language models load once; pytesseract spawns tesseract per call
+        self.api = tesserocr.PyTessBaseAPI() if tesserocr is not None else None
+        self._api_lock = threading.Lock()  # The engine isn't thread-safe
+        self._api_config: Optional[str] = None
+    
+    def close(self):
+        """Release the tesserocr engine."""
+        if self.api is not None:
+            self.api.End()
+            self.api = None
+    
+    def _configure_api(self, config: str):
+        """Apply a pytesseract-style config (--psm N, -c tessedit_char_whitelist=...) to the engine."""
+        if config == self._api_config:
+            return
+        psm = tesserocr.PSM.AUTO  # tesseract's default
+        whitelist = ''
+        args = config.split()
+        for flag, value in zip(args, args[1:]):
+            if flag == '--psm':
+                psm = int(value)
+            elif flag == '-c' and value.startswith('tessedit_char_whitelist='):
+                whitelist = value.split('=', 1)[1]
+        self.api.SetPageSegMode(psm)
+        self.api.SetVariable('tessedit_char_whitelist', whitelist)
+        self._api_config = config
     
-    def extract_text(self, image: "np.ndarray", region: Optional[Tuple[int,int,int,int]] = None) -> str:
+    @staticmethod
+    def _binarize(image: "np.ndarray") -> "np.ndarray":
+        """Grayscale + threshold: a 1-channel image PNG-encodes far smaller for Tesseract."""
+        if cv2 is not None:
+            # Otsu picks the threshold per crop, so light-on-dark text survives too
+            gray = np.ascontiguousarray(image)
+            if gray.ndim == 3:
+                gray = cv2.cvtColor(gray, cv2.COLOR_RGB2GRAY)
+            _, bw = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)
+            return bw
+        # Same gray + Otsu rule as cv2 (and the tiled numba path), just slower
+        if image.ndim == 3:
+            rgb = image.astype(np.int32)
+            image = ((rgb[..., 0] * _GRAY_R + rgb[..., 1] * _GRAY_G + rgb[..., 2] * _GRAY_B
+                      + (1 << (_GRAY_SHIFT - 1))) >> _GRAY_SHIFT).astype(np.uint8)
+        threshold = _otsu_threshold(np.bincount(image.ravel(), minlength=256))
+        return np.where(image > threshold, 255, 0).astype(np.uint8)
+
+    def extract_text(self, image: "np.ndarray", region: Optional[Tuple[int,int,int,int]] = None,
+                     config: str = '') -> str:
         """
         Extract text from image or region.
         Region: (x, y, width, height)
+        Config: extra Tesseract options (page segmentation mode, char whitelist)
         """
         if region:
             x, y, w, h = region
             image = image[y:y+h, x:x+w]
         
-        pil_img = Image.fromarray(image)
-        text = pytesseract.image_to_string(pil_img)
+        pil_img = Image.fromarray(self._binarize(image))
+        if self.api is not None:
+            with self._api_lock:
+                self._configure_api(config)
+                self.api.SetImage(pil_img)
+                text = self.api.GetUTF8Text()
+        else:
+            text = pytesseract.image_to_string(pil_img, config=config)
         return text.strip()
     
+    async def extract_text_async(self, image: "np.ndarray", region: Optional[Tuple[int,int,int,int]] = None,
+                                 config: str = '') -> str:
+        """extract_text on a worker thread, so the Tesseract subprocess overlaps other I/O."""
+        return await asyncio.to_thread(self.extract_text, image, region, config)
+
+    def _ocr_words(self, image: "np.ndarray", config: str = '') -> List[Tuple[str, int]]:
+        """(word, vertical center) of each recognized word, in reading order."""
+        pil_img = Image.fromarray(image)
+        if self.api is not None:
+            level = tesserocr.RIL.WORD
+            words = []
+            with self._api_lock:
+                self._configure_api(config)
+                self.api.SetImage(pil_img)
+                self.api.Recognize()
+                for word in tesserocr.iterate_level(self.api.GetIterator(), level):
+                    text, box = word.GetUTF8Text(level), word.BoundingBox(level)
+                    if text and box:
+                        words.append((text, (box[1] + box[3]) // 2))
+            return words
+        data = pytesseract.image_to_data(pil_img, config=config, output_type=pytesseract.Output.DICT)
+        return [(text, top + height // 2)
+                for text, top, height in zip(data['text'], data['top'], data['height']) if text.strip()]
+    
     def extract_numbers(self, image: "np.ndarray", region: Optional[Tuple[int,int,int,int]] = None) -> List[int]:
         """Extract all numbers from image."""
-        text = self.extract_text(image, region)
-        numbers = re.findall(r'\d+', text)
-        return [int(n) for n in numbers]
+        text = self.extract_text(image, region, config=self.NUMBER_CONFIG)
+        return [int(n) for n in _NUM_RE.findall(text)]
     
     def extract_labeled_value(self, image: "np.ndarray", label: str, region: Optional[Tuple[int,int,int,int]] = None) -> Optional[int]:
         """
         Extract value for a label like 'HP: 150' -> 150
         """
         text = self.extract_text(image, region)
-        pattern = rf'{label}\s*[:\-]?\s*(\d+)'
-        match = re.search(pattern, text, re.IGNORECASE)
+        match = _label_pattern(label).search(text)
         if match:
             return int(match.group(1))
         return None
@@ -78,47 +269,70 @@ class FFTOCREngine(OCREngine):
     def extract_unit_stats(self, frame: "np.ndarray") -> Dict[str, Optional[int]]:
         """Extract unit stats from the full frame (robust to UI position)."""
         # Scan full frame for now as UI position varies
-        text = self.extract_text(frame)
+        text = self.extract_text(frame, config=self.STAT_CONFIG)
         
-        # Helper to find values like "HP 153/153" or "HP: 153"
-        def find_stat(label: str):
-            # Regex: Label followed by any non-digit chars (lazy), then the number
-            # Handles "MP ae (24/24" -> finds 24
-            pattern = rf'{label}\D*?(\d+)'
-            match = re.search(pattern, text, re.IGNORECASE)
+        # Values like "HP 153/153" or "HP: 153" (see _STAT_RE / _MAX_STAT_RE)
+        def find(pattern: "re.Pattern"):
+            match = pattern.search(text)
             if match:
                 return int(match.group(1))
             return None
-            
-        def find_max_stat(label: str):
-             # Find max value after slash: "HP ... 153 / 153"
-             # Label, non-digits, number, non-digits (inc slash), number
-             pattern = rf'{label}\D*?\d+\D*?/\D*?(\d+)'
-             match = re.search(pattern, text, re.IGNORECASE)
-             if match:
-                 return int(match.group(1))
-             return None
 
         return {
-            'hp': find_stat('HP'),
-            'max_hp': find_max_stat('HP'),
-            'mp': find_stat('MP'),
-            'max_mp': find_max_stat('MP'),
-            'ct': find_stat('CT'),
+            'hp': find(_STAT_RE['HP']),
+            'max_hp': find(_MAX_STAT_RE['HP']),
+            'mp': find(_STAT_RE['MP']),
+            'max_mp': find(_MAX_STAT_RE['MP']),
+            'ct': find(_STAT_RE['CT']),
         }
     
+    # Blank rows between regions in the tiled image, so Tesseract keeps them apart
+    TILE_GAP = 16
+    
     def extract_all_numbers(self, frame: "np.ndarray") -> Dict[str, List[int]]:
         """Extract numbers from all known regions."""
+        if HAS_NUMBA and frame.ndim == 3:
+            return self._extract_all_numbers_tiled(frame)
         result = {}
         for name, region in self.REGIONS.items():
             result[name] = self.extract_numbers(frame, region)
         return result
+    
+    def _extract_all_numbers_tiled(self, frame: "np.ndarray") -> Dict[str, List[int]]:
+        """
+        extract_all_numbers with one OCR call: all regions are binarized (same
+        rule as _binarize) into one vertically tiled image, and each word goes
+        back to the region whose band contains it.
+        """
+        frame_h, frame_w = frame.shape[:2]
+        names = list(self.REGIONS)
+        # Clip like numpy slicing would
+        boxes = [(x, y, max(min(w, frame_w - x), 0), max(min(h, frame_h - y), 0))
+                 for x, y, w, h in self.REGIONS.values()]
+        tops, top = [], 0
+        for _, _, _, h in boxes:
+            tops.append(top)
+            top += h + self.TILE_GAP
+        if not any(w and h for _, _, w, h in boxes):  # Every region is off-frame
+            return {name: [] for name in names}
+        
+        out = np.full((top, max(w for _, _, w, _ in boxes)), 255, dtype=np.uint8)
+        _tile_regions(np.ascontiguousarray(frame), np.array(boxes, dtype=np.int64),
+                      np.array(tops, dtype=np.int64), out)
+        
+        texts: Dict[str, List[str]] = {name: [] for name in names}
+        for text, center in self._ocr_words(out, self.NUMBER_CONFIG):
+            for name, band_top, (_, _, _, h) in zip(names, tops, boxes):
+                if band_top <= center < band_top + h:
+                    texts[name].append(text)
+                    break
+        return {name: [int(n) for n in _NUM_RE.findall(' '.join(words))] for name, words in texts.items()}
 
 
 class MockOCREngine:
     """Mock OCR for testing without Tesseract."""
     
-    def extract_text(self, image, region=None) -> str:
+    def extract_text(self, image, region=None, config='') -> str:
         return "HP: 150 MP: 45"
     
     def extract_numbers(self, image, region=None) -> List[int]:
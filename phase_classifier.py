@@ -0,0 +1,104 @@
+"""
+Local Phase Classifier for FFT Agent.
+Small int8 ONNX image model (trained offline on labeled screenshots) that
+answers "which screen is this, and is it our turn?" in a few milliseconds
+on CPU, so the Vision LLM is only asked when the model is unsure.
+"""
+import os
+import sys
+from typing import Optional, Tuple
+
+import numpy as np
+
+try:
+    import onnxruntime as ort
+    HAS_ONNXRUNTIME = True
+except ImportError:
+    HAS_ONNXRUNTIME = False
+
+try:
+    import cv2
+    HAS_CV2 = True
+except ImportError:
+    HAS_CV2 = False
+    from PIL import Image
+
+
+# Model output classes, in order: (phase name, is_our_turn).
+# BATTLE is split by whose turn it is, so one forward pass answers both
+# questions the agent asks about a frame.
+LABELS = (
+    ("TITLE_SCREEN", None),
+    ("BATTLE", True),
+    ("BATTLE", False),
+    ("BATTLE_RESULT", None),
+    ("CUTSCENE", None),
+    ("PARTY_MENU", None),
+    ("SHOP", None),
+    ("WORLD_MAP", None),
+)
+
+
+class PhaseClassifier:
+    """ONNX Runtime (CPU) wrapper around the int8 phase model."""
+
+    INPUT_SIZE = 224
+    # Below this softmax probability the caller falls back to the Vision LLM
+    MIN_CONFIDENCE = 0.85
+    # ImageNet normalization, matching the backbone the model was trained from
+    MEAN = np.array([0.485, 0.456, 0.406], dtype=np.float32) * 255
+    STD = np.array([0.229, 0.224, 0.225], dtype=np.float32) * 255
+
+    def __init__(self, model_path: str, min_confidence: float = MIN_CONFIDENCE):
+        if not HAS_ONNXRUNTIME:
+            raise ImportError("onnxruntime required: pip install onnxruntime")
+        if not os.path.exists(model_path):
+            raise FileNotFoundError(f"Phase model not found: {model_path}")
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        # Leave cores for capture, the memory poller and the HTTP client
+        options.intra_op_num_threads = 2
+        self.session = ort.InferenceSession(
+            model_path, sess_options=options, providers=["CPUExecutionProvider"]
+        )
+        self._input_name = self.session.get_inputs()[0].name
+        self.min_confidence = min_confidence
+
+    def _preprocess(self, frame: np.ndarray) -> np.ndarray:
+        """RGB uint8 frame -> normalized 1x3xHxW float32 tensor."""
+        size = (self.INPUT_SIZE, self.INPUT_SIZE)
+        if HAS_CV2:
+            small = cv2.resize(np.ascontiguousarray(frame), size, interpolation=cv2.INTER_AREA)
+        else:
+            small = np.asarray(Image.fromarray(frame).resize(size, Image.BILINEAR))
+        x = (small.astype(np.float32) - self.MEAN) / self.STD
+        return x.transpose(2, 0, 1)[np.newaxis]
+
+    def classify(self, frame: np.ndarray) -> Optional[Tuple[str, Optional[bool]]]:
+        """(phase name, is_our_turn) if the model is confident, else None."""
+        logits = self.session.run(None, {self._input_name: self._preprocess(frame)})[0][0]
+        probs = np.exp(logits - logits.max())
+        probs /= probs.sum()
+        best = int(probs.argmax())
+        if probs[best] < self.min_confidence:
+            return None
+        return LABELS[best]
+
+
+def quantize(model_path: str, output_path: str):
+    """Dynamic int8 quantization of a float32 export (weights int8, VNNI matmuls)."""
+    from onnxruntime.quantization import quantize_dynamic, QuantType
+    quantize_dynamic(model_path, output_path, weight_type=QuantType.QInt8)
+    print(f"[PhaseClassifier] Wrote {output_path} "
+          f"({os.path.getsize(model_path) // 1024} KB -> {os.path.getsize(output_path) // 1024} KB)")
+
+
+if __name__ == "__main__":
+    # Quantize an exported float model: python phase_classifier.py phases.onnx [phases_int8.onnx]
+    if len(sys.argv) < 2:
+        print("Usage: python phase_classifier.py <model.onnx> [output_int8.onnx]")
+        sys.exit(1)
+    src = sys.argv[1]
+    dst = sys.argv[2] if len(sys.argv) > 2 else os.path.splitext(src)[0] + "_int8.onnx"
+    quantize(src, dst)
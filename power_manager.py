@@ -193,20 +193,39 @@ class PowerManager:
         Returns:
             Number of power-ups applied
         """
-        assists = 0
-        
+        # Plan every revive/heal from the state already read (no reads), then
+        # send all writes in one pipelined batch
+        plan = []  # (unit, new HP, revived)
         for unit in state.units:
-            if unit.max_hp == 0:
+            if self.power_ups_used + len(plan) >= self.max_power_ups_per_battle:
+                break
+            if unit.max_hp == 0 or unit.unit_id not in UNIT_ADDRESSES:
                 continue
             
             # Revive dead units
             if unit.hp == 0:
-                if self.emergency_revive(unit.unit_id):
-                    assists += 1
+                plan.append((unit, unit.max_hp // 2, True))
             
             # Heal critical units (< 30% HP)
             elif unit.hp < unit.max_hp * 0.3:
-                if self.heal_unit(unit.unit_id):
-                    assists += 1
+                plan.append((unit, unit.max_hp, False))
+        
+        if not plan or not self.can_power_up():
+            return 0
+        
+        results = self.reader.write_memory_batch(
+            [(UNIT_ADDRESSES[unit.unit_id]["hp"], new_hp, 2) for unit, new_hp, _ in plan]
+        )
+        
+        assists = 0
+        for (unit, new_hp, revived), ok in zip(plan, results):
+            if not ok:
+                continue
+            assists += 1
+            if revived:
+                print(f"[PowerManager] Revived Unit {unit.unit_id} with {new_hp} HP")
+            else:
+                print(f"[PowerManager] Healed Unit {unit.unit_id}: {unit.hp} -> {new_hp} HP")
         
+        self.power_ups_used += assists
         return assists
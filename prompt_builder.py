@@ -3,6 +3,7 @@ Prompt Builder for FFT LLM Agent.
 Converts game state to text prompts for LLM.
 """
 from dataclasses import dataclass, field
+from string import Template
 from typing import List, Optional, Dict
 
 
@@ -61,52 +62,61 @@ REASON: <brief tactical explanation>
 """
 
 
+# Static prompt text is compiled once; build_prompt() only substitutes the
+# per-turn fields and joins the sections that apply
+BATTLE_HEADER_TEMPLATE = Template("""\
+## Battle: $map_name
+Map Size: ${width}x$height
+Turn: $turn_number
+
+**VISUAL INPUT:** A screenshot of the current battle is attached.
+- Use the image to identify unit positions, terrain, and the highlighted cursor.
+- **LEGEND:** BLUE tiles = Movement range, YELLOW tiles = Attack range.
+- Combine visual cues with the stats below.
+""")
+
+CURRENT_UNIT_TEMPLATE = Template("""\
+## Current Unit (Your Turn)
+- $name ($job) at ($x,$y) (Relative Position Only)
+  HP: $hp/$max_hp, MP: $mp/$max_mp, CT: $ct
+
+NOTE: Exact X/Y coordinates are unavailable. You MUST use relative directions.
+EXAMPLE: 'ACTION: Move', 'TARGET: Right 2'
+""")
+
+ACTIONS_TEMPLATE = Template("""\
+## Available Actions
+$actions
+
+What action should be taken?""")
+
+
 def build_prompt(state: GameState) -> str:
     """Convert game state to LLM prompt."""
-    lines = [
-        f"## Battle: {state.map_name}",
-        f"Map Size: {state.width}x{state.height}",
-        f"Turn: {state.turn_number}",
-        "",
-        "**VISUAL INPUT:** A screenshot of the current battle is attached.",
-        "- Use the image to identify unit positions, terrain, and the highlighted cursor.",
-        "- **LEGEND:** BLUE tiles = Movement range, YELLOW tiles = Attack range.",
-        "- Combine visual cues with the stats below.",
-        ""
-    ]
+    sections = [BATTLE_HEADER_TEMPLATE.substitute(
+        map_name=state.map_name,
+        width=state.width,
+        height=state.height,
+        turn_number=state.turn_number,
+    )]
     
     if state.current_unit:
         u = state.current_unit
-        lines.extend([
-            f"## Current Unit (Your Turn)",
-            f"- {u.name} ({u.job}) at ({u.x if u.x else '?'},{u.y if u.y else '?'}) (Relative Position Only)",
-            f"  HP: {u.hp}/{u.max_hp}, MP: {u.mp}/{u.max_mp}, CT: {u.ct}",
-            "",
-            "NOTE: Exact X/Y coordinates are unavailable. You MUST use relative directions.",
-            "EXAMPLE: 'ACTION: Move', 'TARGET: Right 2'",
-            ""
-        ])
+        sections.append(CURRENT_UNIT_TEMPLATE.substitute(
+            name=u.name, job=u.job,
+            x=u.x if u.x else '?', y=u.y if u.y else '?',
+            hp=u.hp, max_hp=u.max_hp, mp=u.mp, max_mp=u.max_mp, ct=u.ct,
+        ))
     
     if state.allies:
-        lines.append("## Your Units")
-        for u in state.allies:
-            lines.append(str(u))
-        lines.append("")
+        sections.append("\n".join(["## Your Units", *map(str, state.allies), ""]))
     
     if state.enemies:
-        lines.append("## Enemies")
-        for u in state.enemies:
-            lines.append(str(u))
-        lines.append("")
+        sections.append("\n".join(["## Enemies", *map(str, state.enemies), ""]))
     
-    lines.extend([
-        f"## Available Actions",
-        ", ".join(state.valid_actions),
-        "",
-        "What action should be taken?"
-    ])
+    sections.append(ACTIONS_TEMPLATE.substitute(actions=", ".join(state.valid_actions)))
     
-    return "\n".join(lines)
+    return "\n".join(sections)
 
 
 def build_move_prompt(state: GameState, reachable_tiles: List[tuple]) -> str:
@@ -0,0 +1,117 @@
+"""
+parse_llm_response checked against the original search-per-field parser.
+"""
+import re
+
+import pytest
+
+from action_parser import InputExecutor, ParsedAction, parse_llm_response
+
+
+def _baseline_parse(response: str) -> ParsedAction:
+    """parse_llm_response as it was before the regex/fast-path rewrites."""
+    action = None
+    target = None
+    target_coords = None
+    reason = None
+
+    action_match = re.search(r'ACTION:\s*(\w+)', response, re.IGNORECASE)
+    if action_match:
+        action = action_match.group(1).lower()
+
+    target_match = re.search(r'TARGET:\s*(.+?)(?:\n|$)', response, re.IGNORECASE)
+    if target_match:
+        target = target_match.group(1).strip().lower()
+        coord_match = re.search(r'\(?(\d+)\s*,\s*(\d+)\)?', target)
+        if coord_match:
+            target_coords = (int(coord_match.group(1)), int(coord_match.group(2)))
+        else:
+            dx, dy = 0, 0
+            if "left" in target: dx -= 1
+            if "right" in target: dx += 1
+            if "up" in target: dy -= 1
+            if "down" in target: dy += 1
+            amount_match = re.search(r'(\d+)', target)
+            if amount_match:
+                mult = int(amount_match.group(1))
+                dx *= mult
+                dy *= mult
+            if dx != 0 or dy != 0:
+                target_coords = (dx, dy)
+
+    reason_match = re.search(r'REASON:\s*(.+?)(?:\n|$)', response, re.IGNORECASE)
+    if reason_match:
+        reason = reason_match.group(1).strip()
+
+    return ParsedAction(action=action or "wait", target=target,
+                        target_coords=target_coords, reason=reason)
+
+
+FIELD_RESPONSES = [
+    "ACTION: Move\nTARGET: 5,3\nREASON: Moving to high ground",
+    "ACTION: Attack\nTARGET: Up 2\nREASON: avoid the reaction: counter",
+    "ACTION: Attack\nTARGET: the goblin\nREASON: weaken the target: it is low",
+    "action: wait\nreason: nothing in range",
+    "Looking at the map...\n\nACTION: Move  \nTARGET:   (4, 7)  \nREASON:  close the gap \n",
+    "**ACTION:** Move\n**TARGET:** 2,2\n**REASON:** flank",
+    "ACTION:\nMove\nTARGET: 1,1",
+    "ACTION: Move TARGET: 6,1 REASON: all on one line",
+    "ACTION: -\nACTION: Item\nTARGET: self",
+    "ACTION: Cast Fire\nTARGET: 3,4\nREASON: cluster of enemies\nACTION: Wait",
+    "I think we should wait.",
+    "",
+]
+
+
+@pytest.mark.parametrize("response", FIELD_RESPONSES)
+def test_fields_match_baseline(response):
+    assert parse_llm_response(response) == _baseline_parse(response)
+
+
+@pytest.mark.parametrize("target", [
+    "5,3", "(5,3)", "(5, 3)", "5 , 3", "05,3", "((5,3))", "(5,3", "5,3)", "1,2,3",
+    "5,-3", "-5,3", "+5,3", "1_0,3", "5,3abc", "5", "(x, y)", "12,40 near the tree",
+])
+def test_coordinate_targets_match_baseline(target):
+    response = f"ACTION: Move\nTARGET: {target}"
+    assert parse_llm_response(response) == _baseline_parse(response)
+
+
+@pytest.mark.parametrize("target", [
+    "right 2", "up", "Up 2", "left 3 then down", "down down 3", "2 left 4", "upper left",
+    "right 0", "up and right 2", "left right", "the goblin", "north 3",
+])
+def test_relative_targets_match_baseline(target):
+    response = f"ACTION: Move\nTARGET: {target}"
+    assert parse_llm_response(response) == _baseline_parse(response)
+
+
+@pytest.mark.parametrize("response", [
+    "Action: Move\nTarget: 5,3\nReason: high ground",
+    "aCtIoN:attack\ntArGeT:(3,3)\nrEaSoN:adjacent",
+    "ACTION:\tWait\nTARGET:\t\nREASON:\tend turn",
+])
+def test_label_case_and_spacing_match_baseline(response):
+    assert parse_llm_response(response) == _baseline_parse(response)
+
+
+class _RecordingController:
+    """Controller stand-in that logs the calls the executor makes."""
+
+    def __init__(self):
+        self.calls = []
+
+    def __getattr__(self, name):
+        return lambda *args: self.calls.append((name, *args))
+
+
+def test_select_queues_one_sequence():
+    controller = _RecordingController()
+    InputExecutor(controller)._do_select("wait")
+    assert controller.calls == [("press_sequence", ["up"] * 4 + ["down"] * 2 + ["a"])]
+
+
+def test_wait_starts_after_queued_inputs():
+    controller = _RecordingController()
+    InputExecutor(controller)._do_wait("0")
+    assert controller.calls == [("wait_for_inputs",)]
@@ -0,0 +1,52 @@
+"""
+Cached PadData message with patched fields and CRC, checked against a
+message built from scratch the old way.
+"""
+import struct
+import zlib
+
+import pytest
+
+from cemuhook_server import CRC_OFFSET, PAD_TIMESTAMP_OFFSET, TYPE_PADDATA, CemuhookServer
+
+
+@pytest.fixture
+def server():
+    server = CemuhookServer(port=0)  # Any free port; the loop is never started
+    yield server
+    server.sock.close()
+
+
+def _fresh_pad_data(server, timestamp: int) -> bytes:
+    """The pre-cache build: every field packed anew, CRC over the whole message."""
+    state = server.state
+    payload = server._build_port_info()
+    payload += struct.pack('<IHBBBBBB', state.packet_counter, state.buttons, 0, 0,
+                           state.left_stick_x, state.left_stick_y,
+                           state.right_stick_x, state.right_stick_y)
+    payload += b'\x00' * 24                      # analog buttons, touch pads
+    payload += struct.pack('<Q', timestamp)      # motion timestamp
+    payload += struct.pack('<6f', *[0.0] * 6)    # accelerometer, gyroscope
+    message = bytearray(server._build_header(TYPE_PADDATA, len(payload) + 4) + payload)
+    struct.pack_into('<I', message, CRC_OFFSET, zlib.crc32(bytes(message)))
+    return bytes(message)
+
+
+def test_patched_pad_data_matches_fresh_build(server):
+    # Several ticks through the same cached buffer, each with different inputs
+    a, up = CemuhookServer.SWITCH_A, CemuhookServer.SWITCH_DPAD_UP
+    for buttons, lx, ry in ((0, 128, 128), (a, 0, 255), (a | up, 77, 3)):
+        server.state.buttons = buttons
+        server.state.left_stick_x = lx
+        server.state.right_stick_y = ry
+        message = bytes(server._build_pad_data())
+        assert len(message) == 100
+        timestamp, = struct.unpack_from('<Q', message, PAD_TIMESTAMP_OFFSET)
+        assert message == _fresh_pad_data(server, timestamp)
+
+
+def test_patched_pad_data_crc(server):
+    message = bytearray(server._build_pad_data())
+    crc, = struct.unpack_from('<I', message, CRC_OFFSET)
+    struct.pack_into('<I', message, CRC_OFFSET, 0)
+    assert crc == zlib.crc32(message)
@@ -0,0 +1,58 @@
+"""
+Vision-analysis parsing checked against the original per-line parser.
+"""
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from feedback_learner import FeedbackLearner
+
+
+def _baseline_fields(response: str):
+    """CONTEXT/EFFECT/LEARNING as the original startswith loop read them."""
+    context = effect = learning_text = ""
+    for line in response.split("\n"):
+        line = line.strip()
+        if line.startswith("CONTEXT:"):
+            context = line[8:].strip()
+        elif line.startswith("EFFECT:"):
+            effect = line[7:].strip()
+        elif line.startswith("LEARNING:"):
+            learning_text = line[9:].strip()
+    return context or "Unknown context", effect or learning_text or "Unknown effect"
+
+
+def _learner(response: str):
+    stored = []
+    learner = FeedbackLearner.__new__(FeedbackLearner)
+    learner.llm = SimpleNamespace(chat_with_image_bytes=lambda prompt, image_bytes: response)
+    learner._knowledge = SimpleNamespace(store_learning=stored.append)
+    learner.save_frames = False
+    return learner, stored
+
+
+FRAME = np.zeros((8, 8, 3), dtype=np.uint8)
+
+
+@pytest.mark.parametrize("response", [
+    "CONTEXT: Battle menu, cursor on Move\nEFFECT: Cursor moved to Act\nLEARNING: Down moves the cursor",
+    "  CONTEXT:   padded  \r\nEFFECT:\tmovement grid shown\t\r\nLEARNING: A opens the grid\r\n",
+    "Sure!\n\nCONTEXT: title\nEFFECT: nothing\nEFFECT: menu opened\n",
+    "CONTEXT: menu\nLEARNING: B closes the menu",
+    "CONTEXT:no space\nEFFECT:also none: with a colon",
+    "CONTEXT:\nEFFECT:\nLEARNING:",
+    "1. CONTEXT: numbered\n2. EFFECT: numbered too",
+    "",
+])
+def test_analysis_fields_match_baseline(response):
+    learner, stored = _learner(response)
+    learning = learner._analyze_and_learn("A", "battle", FRAME, FRAME)
+    assert (learning.context_description, learning.effect_description) == _baseline_fields(response)
+    assert stored == [learning]
+
+
+def test_analysis_labels_are_case_insensitive():
+    learner, _ = _learner("Context: menu\nEffect: cursor moved")
+    learning = learner._analyze_and_learn("A", "battle", FRAME, FRAME)
+    assert (learning.context_description, learning.effect_description) == ("menu", "cursor moved")
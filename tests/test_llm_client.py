@@ -0,0 +1,105 @@
+"""
+LLM client response cache (the uncached path's replies, fewer requests) and
+async client lifetime.
+"""
+import asyncio
+import threading
+
+import httpx
+import pytest
+
+from llm_client import LLMClient, LLMConfig
+
+
+def _client(**config):
+    """LLMClient whose POSTs are answered locally: reply N for the Nth request."""
+    client = LLMClient(LLMConfig(temperature=0.0, **config))
+    client.posted = []
+
+    def post(url, headers=None, content=None):
+        client.posted.append(content)
+        body = b'{"choices": [{"message": {"content": "reply %d"}}]}' % len(client.posted)
+        return httpx.Response(200, content=body, request=httpx.Request("POST", url))
+
+    client._post = post
+    return client
+
+
+@pytest.fixture
+def client():
+    client = _client()
+    yield client
+    client.close()
+
+
+def test_identical_request_is_served_from_cache(client):
+    assert client.chat("where is the cursor?") == "reply 1"
+    assert client.chat("where is the cursor?") == "reply 1"
+    assert client.chat("where is the cursor?", system_prompt="You play FFT") == "reply 2"
+    assert len(client.posted) == 2
+
+
+def test_sampled_requests_bypass_cache(client):
+    client.config.temperature = 0.9
+    assert [client.chat("pick a move") for _ in range(2)] == ["reply 1", "reply 2"]
+    # Per-call override forces caching
+    assert client._post_chat([{"role": "user", "content": "x"}], cache=True) == "reply 3"
+    assert client._post_chat([{"role": "user", "content": "x"}], cache=True) == "reply 3"
+
+
+def test_expired_entry_is_refetched():
+    client = _client(cache_ttl=-1.0)
+    try:
+        assert [client.chat("same") for _ in range(2)] == ["reply 1", "reply 2"]
+    finally:
+        client.close()
+
+
+def test_least_recently_used_entry_is_evicted():
+    client = _client(cache_size=2)
+    try:
+        client.chat("a")
+        client.chat("b")
+        client.chat("a")          # 'a' is now the most recently used
+        client.chat("c")          # evicts 'b'
+        assert client.chat("a") == "reply 1"
+        assert client.chat("b") == "reply 4"
+        assert len(client._response_cache) == 2
+    finally:
+        client.close()
+
+
+def test_concurrent_cache_access():
+    client = _client(cache_size=8)
+    errors = []
+
+    def worker(n):
+        try:
+            for i in range(300):
+                key = client._cache_key([{"role": "user", "content": str((n * 7 + i) % 24)}])
+                if client._cache_get(key) is None:
+                    client._cache_put(key, "v")
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    client.close()
+    assert errors == []
+    assert len(client._response_cache) <= 8
+
+
+def test_each_loop_gets_its_own_async_client(client):
+    async def use():
+        first, _ = client._get_aclient()
+        assert client._get_aclient()[0] is first
+        await client.aclose()
+        return first
+
+    a, b = asyncio.run(use()), asyncio.run(use())
+    assert a is not b
+    assert a.is_closed and b.is_closed
+    assert len(client._aclients) == 0
@@ -0,0 +1,171 @@
+"""
+GDB reply framing and memory reader decoding, checked against the old
+per-field path on fixed byte strings.
+"""
+import asyncio
+import dataclasses
+import io
+
+import pytest
+
+from memory_reader import (
+    FIELD_SIZES, OFFSETS, RAMZA_ADDRESSES, RAMZA_BLOCK_SIZE, RAMZA_BLOCK_START,
+    UNIT_BLOCK_SIZE, UNIT_BLOCK_START, AsyncGDBMemoryReader, GDBMemoryReader, UnitStats,
+)
+
+
+def _unit_block() -> bytes:
+    """A stat window with every field non-zero and distinct."""
+    block = bytearray((i * 37 + 11) & 0xFF for i in range(UNIT_BLOCK_SIZE))
+    block[OFFSETS["magic_ready"] - UNIT_BLOCK_START] = 1
+    # Skill flags set by their high byte only, so a 1-byte decode would miss them
+    for name in ("skill_poaching", "skill_xp_hp_move", "skill_fly"):
+        at = OFFSETS[name] - UNIT_BLOCK_START
+        block[at:at + 2] = b"\x00\x01"
+    return bytes(block)
+
+
+UNIT_BLOCK = _unit_block()
+RAMZA_BLOCK = bytes(range(0x40, 0x40 + RAMZA_BLOCK_SIZE))
+
+
+def _per_field_unit(unit_id, block, ramza):
+    """The pre-block decode: one little-endian read per field."""
+    def read(name):
+        at = OFFSETS[name] - UNIT_BLOCK_START
+        return int.from_bytes(block[at:at + FIELD_SIZES[name]], byteorder='little')
+
+    stats = UnitStats(unit_id=unit_id)
+    for name in ("hp", "mp", "max_hp", "max_mp", "brave", "faith", "speed", "attack",
+                 "attack2", "move_count", "max_moves", "status_shield_1", "status_shield_2"):
+        setattr(stats, name, read(name))
+    stats.magic_ready = read("magic_ready") == 1
+    for name in ("skill_poaching", "skill_xp_hp_move", "skill_fly"):
+        setattr(stats, name, read(name) != 0)
+    if ramza is not None:
+        stats.job_id = ramza[RAMZA_ADDRESSES["job_id"] - RAMZA_BLOCK_START]
+        stats.ability2_id = ramza[RAMZA_ADDRESSES["ability2_id"] - RAMZA_BLOCK_START]
+    return stats
+
+
+class _ChunkedRaw(io.RawIOBase):
+    """Socket stand-in whose reads return the given chunks one recv at a time."""
+
+    def __init__(self, chunks):
+        self._chunks = list(chunks)
+
+    def readable(self):
+        return True
+
+    def readinto(self, buf):
+        if not self._chunks:
+            return 0
+        chunk = self._chunks.pop(0)
+        n = min(len(buf), len(chunk))
+        buf[:n] = chunk[:n]
+        if n < len(chunk):
+            self._chunks.insert(0, chunk[n:])
+        return n
+
+
+class _SentLog:
+    def __init__(self):
+        self.sent = []
+
+    def sendall(self, data):
+        self.sent.append(bytes(data))
+
+
+def _reader(chunks):
+    reader = GDBMemoryReader()
+    reader._rfile = io.BufferedReader(_ChunkedRaw(chunks), buffer_size=reader.READ_BUFFER_SIZE)
+    reader._socket = _SentLog()
+    return reader
+
+
+def _reply(data: bytes) -> bytes:
+    return b"$" + data + b"#" + GDBMemoryReader._checksum(data)
+
+
+def test_unit_block_matches_per_field_decode():
+    reader = GDBMemoryReader()
+    for unit_id, ramza in ((1, RAMZA_BLOCK), (3, None)):
+        stats = reader._cached_unit(unit_id, UNIT_BLOCK, ramza)
+        assert dataclasses.asdict(stats) == dataclasses.asdict(_per_field_unit(unit_id, UNIT_BLOCK, ramza))
+
+
+def test_unit_block_round_trips_from_reply():
+    # Hex 'm' reply -> raw window -> UnitStats, as read_unit_stats does
+    reader = GDBMemoryReader()
+    raw = reader._decode_read(UNIT_BLOCK.hex(), UNIT_BLOCK_SIZE)
+    assert raw == UNIT_BLOCK
+    stats = reader._cached_unit(2, raw, None)
+    assert stats == _per_field_unit(2, UNIT_BLOCK, None)
+    # Unchanged bytes hand back the cached object; a missing window stays zero
+    assert reader._cached_unit(2, bytes(raw), None) is stats
+    assert reader._cached_unit(4, None, None) == UnitStats(unit_id=4)
+
+
+@pytest.mark.parametrize("size", [1, 2, 4])
+def test_decode_int_matches_from_bytes(size):
+    data = bytes([0xA5, 0x3C, 0x7E, 0x01][:size])
+    for response in (data.hex(), data.hex().upper()):
+        assert GDBMemoryReader._decode_int(response, size) == int.from_bytes(data, byteorder='little')
+    assert GDBMemoryReader._decode_int("E01", size) is None
+    assert GDBMemoryReader._decode_int("0", size) is None
+
+
+def test_split_reply_is_framed_across_recvs():
+    body = UNIT_BLOCK.hex().encode('ascii')
+    wire = b"+" + _reply(body)
+    # '$', the data, '#' and the checksum each split over separate recvs
+    chunks = [wire[:1], wire[1:2], wire[2:40], wire[40:-4], wire[-4:-2], wire[-2:-1], wire[-1:]]
+    reader = _reader(chunks)
+    replies = reader._recv_replies([GDBMemoryReader._packet("m0,1")])
+    assert replies == [body.decode('ascii')]
+    assert reader._socket.sent == [b"+"]
+
+
+def test_pipelined_replies_split_mid_packet():
+    packets = [GDBMemoryReader._packet(f"m{addr:x},2") for addr in (0x10, 0x20)]
+    wire = b"++" + _reply(b"3412") + _reply(b"cdab")
+    reader = _reader([wire[i:i + 3] for i in range(0, len(wire), 3)])
+    replies = reader._recv_replies(packets)
+    assert [GDBMemoryReader._decode_int(r, 2) for r in replies] == [0x1234, 0xABCD]
+
+
+def test_bad_checksum_is_nacked_then_accepted():
+    good = _reply(b"ff")
+    reader = _reader([b"+", good[:-2] + b"00", good])
+    assert reader._recv_replies([GDBMemoryReader._packet("m0,1")]) == ["ff"]
+    assert reader._socket.sent == [b"-", b"+"]
+
+
+def test_async_reader_matches_per_field_decode():
+    async def serve(reader, writer):
+        # Answer 'm' reads of unit 2's stat window from UNIT_BLOCK
+        while True:
+            try:
+                await reader.readuntil(b"$")  # Skips the client's acks
+                body = (await reader.readuntil(b"#"))[:-1]
+                await reader.readexactly(2)
+            except asyncio.IncompleteReadError:
+                return
+            address, size = (int(v, 16) for v in body[1:].decode('ascii').split(","))
+            start = address - GDBMemoryReader._unit_block_address(2)
+            writer.write(b"+" + _reply(UNIT_BLOCK[start:start + size].hex().encode('ascii')))
+
+    async def run():
+        server = await asyncio.start_server(serve, "127.0.0.1", 0)
+        reader = AsyncGDBMemoryReader(port=server.sockets[0].getsockname()[1])
+        try:
+            assert await reader.connect()
+            return await reader.read_unit_stats(2)
+        finally:
+            await reader.disconnect()
+            server.close()
+            await server.wait_closed()
+
+    # Not a GDBMemoryReader: sync callers can't get coroutines from it
+    assert not isinstance(AsyncGDBMemoryReader(), GDBMemoryReader)
+    assert asyncio.run(run()) == _per_field_unit(2, UNIT_BLOCK, None)
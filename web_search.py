@@ -147,10 +147,23 @@ class SmartKnowledgeRetriever:
     Retrieves knowledge from RAG first, falls back to web search.
     """
     
-    def __init__(self, knowledge_store=None, web_searcher=None):
-        self.rag = knowledge_store
+    def __init__(self, knowledge_store=None, web_searcher=None, knowledge_store_factory=None):
+        # knowledge_store_factory defers opening the store (ChromaDB + embedding
+        # model) until the first query needs it
+        self._rag = knowledge_store
+        self._rag_factory = knowledge_store_factory
         self.web = web_searcher or WebSearcher()
-        self.min_similarity = 0.15  # Threshold for "good enough" RAG result (sentence-transformers gives lower scores)
+        self.min_similarity = 0.575  # Cosine threshold for "good enough" RAG result
+    
+    @property
+    def rag(self):
+        if self._rag is None and self._rag_factory is not None:
+            factory, self._rag_factory = self._rag_factory, None
+            try:
+                self._rag = factory()
+            except Exception as e:
+                print(f"[Knowledge] RAG disabled: {e}")
+        return self._rag
     
     def query(self, question: str, n_results: int = 3) -> Dict[str, Any]:
         """